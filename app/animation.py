@@ -0,0 +1,195 @@
+# app/animation.py
+import os
+import logging
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from PyQt5.QtCore import QObject, QSize, QTimer
+from PyQt5.QtGui import QIcon, QMovie, QImageReader
+
+from . import config
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+ANIMATED_EXTENSIONS = {".gif", ".webp"}
+FRAME_BYTES = metrics.registry.gauge("animation_frame_bytes", "动态表情已解码帧占用的内存（估算）")
+
+
+class _SharedAnimation:
+    """
+    一张动态图片的共享解码器：所有显示这张图片的按钮共用一个 QMovie，
+    每一帧只解码一次，再设置到当前可见的按钮上。
+    """
+    def __init__(self, manager: "AnimatedIconManager", path: str, size: int):
+        self.manager = manager
+        self.path = path
+        self.size = size
+        self.movie: Optional[QMovie] = None
+        self.subscribers: List = []   # 显示这张图片的所有按钮
+        self.visible: List = []       # 当前在屏幕上可见的按钮
+        self.frames_seen = 0
+        self.frozen_bytes = 0         # 因超出内存上限被冻结时释放的帧内存（0表示未冻结）
+
+    def ensure_movie(self):
+        if self.movie is not None:
+            return
+        self.movie = QMovie(self.path)
+        # 缓存全部帧（已按图标大小缩放），第二轮播放起不再解码；总内存由管理器的LRU限制
+        self.movie.setCacheMode(QMovie.CacheAll)
+        self.movie.setScaledSize(QSize(self.size, self.size))
+        self.movie.frameChanged.connect(self._on_frame_changed)
+        self.frames_seen = 0
+
+    def _on_frame_changed(self, frame_number: int):
+        self.frames_seen = max(self.frames_seen, frame_number + 1)
+        icon = QIcon(self.movie.currentPixmap())
+        for button in self.visible:
+            button.setIcon(icon)
+        self.manager._touch(self)
+
+    def set_running(self, running: bool):
+        if running:
+            self.ensure_movie()
+            if self.movie.state() == QMovie.NotRunning:
+                self.movie.start()
+            elif self.movie.state() == QMovie.Paused:
+                self.movie.setPaused(False)
+        elif self.movie is not None and self.movie.state() == QMovie.Running:
+            self.movie.setPaused(True)
+
+    def memory_bytes(self) -> int:
+        if self.movie is None:
+            return 0
+        frames = max(self.movie.frameCount(), self.frames_seen)
+        return frames * self.size * self.size * 4
+
+    def release(self):
+        """释放解码器和已缓存的帧，按钮保留当前显示的帧。"""
+        if self.movie is not None:
+            self.movie.stop()
+            self.movie.deleteLater()
+            self.movie = None
+
+
+class AnimatedIconManager(QObject):
+    """
+    动态表情（GIF/WEBP）图标管理器。
+    - 同一张图片只有一个解码器，按当前图标大小解码
+    - 定时检查按钮是否在滚动区域的可见范围内，没有可见按钮的动画会暂停
+    - 所有动画缓存帧的总内存超过上限时，按最近最少使用（LRU）释放解码器
+    """
+    def __init__(self, parent=None, max_frame_bytes: int = 64 * 1024 * 1024, icon_size: int = config.ICON_SIZE):
+        super().__init__(parent)
+        self.max_frame_bytes = max_frame_bytes
+        self._icon_size = icon_size
+        self._animations: "OrderedDict[str, _SharedAnimation]" = OrderedDict()  # {图片路径: 共享动画}，按最近使用排序
+        self._button_paths: Dict[object, str] = {}  # {按钮: 图片路径}
+        self._animated_paths: Dict[str, bool] = {}  # 图片是否为动态图的检测结果缓存
+
+        self._sweep_timer = QTimer(self)
+        self._sweep_timer.setInterval(250)
+        self._sweep_timer.timeout.connect(self._sweep)
+
+    def is_animated(self, path: str) -> bool:
+        """判断图片是否为多帧动态图（只检查GIF/WEBP，结果按路径缓存）。图标解码线程也会调用。"""
+        result = self._animated_paths.get(path)
+        if result is None:
+            result = False
+            if os.path.splitext(path)[1].lower() in ANIMATED_EXTENSIONS:
+                reader = QImageReader(path)
+                result = reader.supportsAnimation() and reader.imageCount() != 1
+            self._animated_paths[path] = result
+        return result
+
+    def subscribe(self, button, path: str, first_frame: Optional[QIcon] = None):
+        """
+        让按钮显示指定的动态图片（可见时开始播放）。
+        播放前先显示 first_frame（后台解码好的、已缩放的第一帧）；没有时使用共享解码器的当前帧，
+        解码器尚未产生帧时保留按钮当前的图标。UI线程不解码原始尺寸的图片。
+        """
+        self.unsubscribe(button)
+        animation = self._animations.get(path)
+        if animation is None:
+            animation = self._animations[path] = _SharedAnimation(self, path, self._icon_size)
+        animation.subscribers.append(button)
+        self._button_paths[button] = path
+        if first_frame is not None:
+            button.setIcon(first_frame)
+        elif animation.movie is not None and not animation.movie.currentPixmap().isNull():
+            button.setIcon(QIcon(animation.movie.currentPixmap()))
+        if not self._sweep_timer.isActive():
+            self._sweep_timer.start()
+
+    def unsubscribe(self, button):
+        """按钮被删除或改为显示静态图片时调用。"""
+        path = self._button_paths.pop(button, None)
+        if path is None:
+            return
+        animation = self._animations.get(path)
+        if animation is None:
+            return
+        animation.subscribers.remove(button)
+        if button in animation.visible:
+            animation.visible.remove(button)
+        if not animation.subscribers:
+            animation.release()
+            del self._animations[path]
+
+    def set_icon_size(self, size: int):
+        """图标大小变化时丢弃旧尺寸的帧，下次检查时按新尺寸重新解码可见的动画。"""
+        if size == self._icon_size:
+            return
+        self._icon_size = size
+        for animation in self._animations.values():
+            animation.release()
+            animation.size = size
+            animation.frozen_bytes = 0
+        self._sweep()
+
+    def _touch(self, animation: _SharedAnimation):
+        self._animations.move_to_end(animation.path)
+
+    def _sweep(self):
+        """更新每个动画的可见按钮，暂停完全不可见的动画，并执行内存上限。"""
+        if not self._animations:
+            self._sweep_timer.stop()
+            FRAME_BYTES.set(0)
+            return
+
+        parent = self.parent()
+        window_hidden = parent is not None and (not parent.isVisible() or parent.window().isMinimized())
+        for animation in list(self._animations.values()):
+            if window_hidden:
+                animation.visible = []
+            else:
+                animation.visible = [b for b in animation.subscribers if b.isVisible() and not b.visibleRegion().isEmpty()]
+            animation.set_running(bool(animation.visible) and not animation.frozen_bytes)
+        self._enforce_budget()
+
+    def _enforce_budget(self):
+        """
+        总帧内存超过上限时，从最久未使用的动画开始释放（优先释放不可见的）。
+        可见的动画也被释放时会被冻结在当前帧，直到内存足够再恢复播放，避免反复解码。
+        """
+        total = sum(animation.memory_bytes() for animation in self._animations.values())
+        if total > self.max_frame_bytes:
+            for only_hidden in (True, False):
+                for animation in list(self._animations.values()):
+                    if total <= self.max_frame_bytes:
+                        break
+                    if animation.movie is None or (only_hidden and animation.visible):
+                        continue
+                    freed = animation.memory_bytes()
+                    total -= freed
+                    animation.release()
+                    if animation.visible:
+                        animation.frozen_bytes = max(freed, 1)
+                    logger.debug("动态表情帧缓存超出上限，已释放: %s", animation.path)
+        else:
+            # 内存有余量时按最近使用顺序解冻
+            for animation in reversed(self._animations.values()):
+                if animation.frozen_bytes and total + animation.frozen_bytes <= self.max_frame_bytes:
+                    total += animation.frozen_bytes
+                    animation.frozen_bytes = 0
+        FRAME_BYTES.set(total)
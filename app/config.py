@@ -11,11 +11,14 @@ SEND_DANMU_API = "https://api.live.bilibili.com/msg/send"
 GET_CHARGE_EMOTICON_API = "https://api.bilibili.com/x/upowerv2/gw/rights/index"
 GET_LIVE_INFORMATION = "https://api.live.bilibili.com/room/v1/Room/get_info"
 GET_UP_INFORMATION = "https://api.live.bilibili.com/live_user/v1/Master/info"
+CONNECTIVITY_PROBE_URL = "https://api.live.bilibili.com/"  # 离线时用于探测网络恢复的轻量请求地址
 
 # Cache directories
 CACHE_DIR = "cache"
 IMAGE_CACHE_DIR = f"{CACHE_DIR}/images"
 DATA_CACHE_DIR = f"{CACHE_DIR}/data"
+DIAGNOSTICS_DIR = f"{CACHE_DIR}/diagnostics"  # 卡顿报告等诊断输出
+LOCK_DIR = f"{CACHE_DIR}/locks"  # 多个实例共享缓存时使用的跨进程锁文件
 
 ICON_SIZE = 84
 
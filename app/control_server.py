@@ -0,0 +1,280 @@
+# app/control_server.py
+import hmac
+import json
+import time
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional, Tuple
+from urllib.parse import urlparse, parse_qs
+
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+
+from . import metrics
+from .models import SEND_TIMEOUT_MESSAGE
+
+logger = logging.getLogger(__name__)
+
+CONTROL_COMMANDS = metrics.registry.counter("control_commands_total", "本地控制接口命令次数（按命令和结果）")
+CONTROL_LATENCY = metrics.registry.histogram("control_command_seconds", "本地控制接口命令处理耗时（按命令，含发送请求）")
+
+MAX_BODY_BYTES = 64 * 1024  # 请求体大小上限（命令参数只有几个字段）
+
+
+class CommandError(Exception):
+    """控制命令无法执行，status 为返回给调用方的HTTP状态码。"""
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class ControlServer(QObject):
+    """
+    本地控制接口（HTTP，只监听 127.0.0.1），供 Stream Deck、OBS 脚本等外部工具触发发送：
+
+    GET  /packages      当前加载的表情包列表（?emotes=1 时包含每个表情的ID和名字）
+    POST /send          立即发送一个表情：{"id": 表情ID, "type": 可选, "room_id": 可选，默认当前加载的直播间}
+    POST /queue         把表情加入发送队列：{"id": 表情ID, "type": 可选}
+    POST /loop/start    开始自动发送
+    POST /loop/stop     停止自动发送
+
+    /send 的发送请求超时时返回 504。
+
+    参数可以放在查询字符串或JSON请求体中，响应为JSON。
+    - /send 在请求线程中直接查询已加载的表情索引、使用模型的长连接会话发送，不经过UI线程；
+      会话连接由后台定时器定期预热，触发到发出请求只需要几毫秒
+    - 修改发送队列和自动发送状态的命令通过信号交给UI线程执行，立即返回 202；
+      加入队列的表情每帧（约16ms）合并为一批交给UI线程，连续触发上千次也不会阻塞界面
+    - 配置 token 时请求需要带 Authorization: Bearer <token>；带 Origin 头的请求（网页中的脚本发起）一律拒绝；
+      这些检查在读取请求体之前完成，请求体超过 64 KiB 时返回 413
+    """
+    enqueue_requested = pyqtSignal(list)  # [Emote, ...]（按请求顺序）
+    sending_requested = pyqtSignal(bool)  # True=开始自动发送，False=停止
+    send_finished = pyqtSignal(object, int, object)  # Emote, 房间号, (是否成功, 消息)
+    offline_send_requested = pyqtSignal(object, int)  # Emote, 房间号（离线时交给离线发送队列）
+    _enqueue_pending = pyqtSignal()
+
+    def __init__(self, model, room_id_provider: Callable[[], Optional[int]], port: int = 0,
+                 host: str = "127.0.0.1", token: str = "", keepalive_interval: float = 30.0, parent=None):
+        super().__init__(parent)
+        self.model = model
+        self._room_id_provider = room_id_provider
+        self._token = token
+        self._keepalive_interval = keepalive_interval
+        self._keepalive_timer = None
+        self._closed = False
+        self._lock = threading.Lock()
+        self._pending_enqueues = []
+
+        self._enqueue_timer = QTimer(self)
+        self._enqueue_timer.setSingleShot(True)
+        self._enqueue_timer.setInterval(16)
+        self._enqueue_timer.timeout.connect(self._flush_enqueues)
+        # 请求线程发出的信号通过队列连接在UI线程中启动定时器
+        self._enqueue_pending.connect(self._schedule_enqueue_flush)
+        self._routes: Dict[Tuple[str, str], Callable[[Dict], Tuple[int, Dict]]] = {
+            ("GET", "/packages"): self._list_packages,
+            ("POST", "/send"): self._send,
+            ("POST", "/queue"): self._enqueue,
+            ("POST", "/loop/start"): lambda params: self._set_sending(True),
+            ("POST", "/loop/stop"): lambda params: self._set_sending(False),
+        }
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self._httpd.server_address[:2]
+
+    def start(self) -> "ControlServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="ControlServer", daemon=True)
+        self._thread.start()
+        self._schedule_keepalive(0)
+        host, port = self.address
+        logger.info(f"本地控制接口已启动: http://{host}:{port}")
+        return self
+
+    def shutdown(self):
+        with self._lock:
+            self._closed = True
+            if self._keepalive_timer is not None:
+                self._keepalive_timer.cancel()
+                self._keepalive_timer = None
+        if self._thread is not None:
+            self._httpd.shutdown()
+            self._thread = None
+        self._httpd.server_close()
+
+    # --- 发送连接预热 ---
+
+    def _schedule_keepalive(self, delay: float):
+        with self._lock:
+            if self._closed:
+                return
+            self._keepalive_timer = threading.Timer(delay, self._keepalive)
+            self._keepalive_timer.daemon = True
+            self._keepalive_timer.start()
+
+    def _keepalive(self):
+        """后台定时器：在线时预热发送连接，避免空闲的长连接被服务器关闭后第一次触发需要重新握手。"""
+        if self._closed:
+            return
+        if self.model.connectivity.online:
+            self.model.warm_send_connection()
+        self._schedule_keepalive(self._keepalive_interval)
+
+    # --- 命令 ---
+
+    def execute(self, method: str, path: str, params: Dict) -> Tuple[int, Dict]:
+        """执行一条控制命令，返回 (HTTP状态码, 响应字典)。可在任意线程调用。"""
+        handler = self._routes.get((method, path))
+        if handler is None:
+            status = 405 if any(route_path == path for _, route_path in self._routes) else 404
+            CONTROL_COMMANDS.inc(command="unknown", outcome="rejected")
+            return status, {"ok": False, "error": f"不支持的命令: {method} {path}"}
+        start = time.perf_counter()
+        try:
+            status, body = handler(params)
+            outcome = "ok" if body.get("ok") else "failed"
+        except CommandError as e:
+            status, body, outcome = e.status, {"ok": False, "error": str(e)}, "rejected"
+        except Exception as e:
+            logger.error(f"执行控制命令失败 {method} {path}: {e}")
+            status, body, outcome = 500, {"ok": False, "error": str(e)}, "error"
+        CONTROL_LATENCY.observe(time.perf_counter() - start, command=path)
+        CONTROL_COMMANDS.inc(command=path, outcome=outcome)
+        return status, body
+
+    def _find_emote(self, params: Dict):
+        emote_id = params.get("id")
+        if emote_id in (None, ""):
+            raise CommandError(400, "缺少参数 id")
+        emote = self.model.find_emote(emote_id, params.get("type"))
+        if emote is None:
+            raise CommandError(404, f"当前加载的表情包中没有表情 {emote_id}")
+        return emote
+
+    def _list_packages(self, params: Dict) -> Tuple[int, Dict]:
+        include_emotes = str(params.get("emotes", "")).lower() in ("1", "true", "yes")
+        packages = []
+        for package in list(self.model.emoticons.values()):
+            entry = {"id": package.id, "name": package.name, "type": package.type, "count": len(package.emotes)}
+            if include_emotes:
+                entry["emotes"] = [{"id": e.id, "name": e.name} for e in package.emotes]
+            packages.append(entry)
+        return 200, {"ok": True, "room_id": self._room_id_provider(), "packages": packages}
+
+    def _send(self, params: Dict) -> Tuple[int, Dict]:
+        emote = self._find_emote(params)
+        try:
+            room_id = int(params.get("room_id") or self._room_id_provider() or 0)
+        except (TypeError, ValueError):
+            raise CommandError(400, "room_id 只能是数字")
+        if not room_id:
+            raise CommandError(409, "尚未加载直播间")
+        if not self.model.connectivity.online:
+            self.offline_send_requested.emit(emote, room_id)
+            return 202, {"ok": False, "queued_offline": True, "message": "离线：已加入待发送队列"}
+        success, message = self.model.send_emoticon(room_id, emote)
+        self.send_finished.emit(emote, room_id, (success, message))
+        status = 504 if not success and message == SEND_TIMEOUT_MESSAGE else 200
+        return status, {"ok": success, "message": message, "name": emote.name}
+
+    def _enqueue(self, params: Dict) -> Tuple[int, Dict]:
+        emote = self._find_emote(params)
+        with self._lock:
+            first = not self._pending_enqueues
+            self._pending_enqueues.append(emote)
+        if first:
+            self._enqueue_pending.emit()
+        return 202, {"ok": True, "name": emote.name}
+
+    def _schedule_enqueue_flush(self):
+        if not self._enqueue_timer.isActive():
+            self._enqueue_timer.start()
+
+    def _flush_enqueues(self):
+        with self._lock:
+            emotes, self._pending_enqueues = self._pending_enqueues, []
+        if emotes:
+            self.enqueue_requested.emit(emotes)
+
+    def _set_sending(self, enabled: bool) -> Tuple[int, Dict]:
+        self.sending_requested.emit(enabled)
+        return 202, {"ok": True}
+
+    # --- HTTP ---
+
+    def _reject_reason(self, headers) -> Optional[Tuple[int, str]]:
+        """检查来源和令牌，不允许时返回 (HTTP状态码, 原因)。"""
+        if headers.get("Origin"):
+            return 403, "拒绝来自网页的请求"
+        if self._token:
+            supplied = headers.get("Authorization", "")
+            if not hmac.compare_digest(supplied.encode("utf-8"), f"Bearer {self._token}".encode("utf-8")):
+                return 401, "缺少或错误的令牌"
+        return None
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # 长连接：同一个客户端连续触发时不需要重新建立连接
+            # 响应头和响应体分两次写出，开启Nagle算法时第二次写要等客户端的延迟确认（约40ms）
+            disable_nagle_algorithm = True
+
+            def _reply(self, status: int, body: Dict):
+                data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                try:
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def _dispatch(self, method: str):
+                url = urlparse(self.path)
+                try:
+                    length = int(self.headers.get("Content-Length") or 0)
+                    if length < 0:
+                        raise ValueError(length)
+                except ValueError:
+                    # 无法确定请求体的边界，这个连接上的后续数据也无法解析，回复后关闭连接
+                    self.close_connection = True
+                    self._reply(400, {"ok": False, "error": "Content-Length 无效"})
+                    return
+                # 先检查来源和令牌、再检查大小，之后才读取请求体；未读取的请求体留在连接中，回复后关闭连接
+                rejected = server._reject_reason(self.headers)
+                if rejected is None and length > MAX_BODY_BYTES:
+                    rejected = 413, f"请求体超过 {MAX_BODY_BYTES // 1024} KiB"
+                if rejected is not None:
+                    self.close_connection = self.close_connection or length > 0
+                    self._reply(rejected[0], {"ok": False, "error": rejected[1]})
+                    return
+                raw = self.rfile.read(length) if length else b""
+                params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+                if raw:
+                    try:
+                        body = json.loads(raw)
+                    except ValueError:
+                        self._reply(400, {"ok": False, "error": "请求体不是有效的JSON"})
+                        return
+                    if not isinstance(body, dict):
+                        self._reply(400, {"ok": False, "error": "请求体必须是JSON对象"})
+                        return
+                    params.update(body)
+                self._reply(*server.execute(method, url.path.rstrip("/") or "/", params))
+
+            def do_GET(self):
+                self._dispatch("GET")
+
+            def do_POST(self):
+                self._dispatch("POST")
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
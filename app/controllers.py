@@ -1,13 +1,22 @@
 # app/controllers.py
 import json
+import time
 import logging
 from PyQt5.QtCore import QTimer, QThread
 from PyQt5.QtCore import Qt
 
 # 控制器只从models和views导入它需要交互的类
-from .models import EmoticonManager
-from .views import MainWindow
+from .models import EmoticonManager, FREQUENT_PACKAGE_ID, PACKAGE_SOURCE_NAMES
+from .views import MainWindow, DiagnosticsDialog
 from .threads import Worker
+from .emote_records import Emote
+from .send_plan import SendPlan
+from .icon_decoder import IconDecoder
+from .control_server import ControlServer
+from .logger_setup import get_ui_log_buffer
+from . import metrics
+
+logger = logging.getLogger(__name__)
 
 class MainController:
     """
@@ -20,12 +29,51 @@ class MainController:
         self.view = view
         self.model = model
         self.threadpool = []  # 用于保持对活动线程的引用，防止被垃圾回收
-        self.send_queue = []
+        self.send_plan = SendPlan()  # 发送队列（环形缓冲区 + 预编译载荷）
         self.is_sending = False
+        self.loaded_room_id = None  # 最近一次加载的直播间
+        self._streamed_packages = {}  # 加载过程中已分块获取到的用户表情包（加载完成后清空）
 
         self.sending_timer = QTimer()
         self.sending_timer.timeout.connect(self._send_next_from_queue)
 
+        # UI日志面板：定时从环形缓冲区批量取出日志，避免每条日志都触发一次界面更新
+        self.log_buffer = get_ui_log_buffer()
+        self.log_timer = QTimer()
+        self.log_timer.timeout.connect(self._flush_log_panel)
+        if self.log_buffer is not None:
+            self.log_timer.start(250)
+
+        # UI线程卡顿探测：定时器的实际触发时间比预期晚多少，就说明事件循环被阻塞了多久
+        self._lag_probe_interval = 0.2
+        self._lag_probe_expected = time.perf_counter() + self._lag_probe_interval
+        self.lag_probe_timer = QTimer()
+        self.lag_probe_timer.timeout.connect(self._probe_ui_lag)
+        self.lag_probe_timer.start(int(self._lag_probe_interval * 1000))
+
+        # 指标定时导出（config.json 中配置 metrics_export_path 时启用）
+        self.metrics_export_path = ""
+        self.metrics_export_timer = QTimer()
+        self.metrics_export_timer.timeout.connect(self._export_metrics_periodically)
+        self.diagnostics_dialog = None
+
+        # 表情图标在后台线程池中读取、解码并缩放，每帧（约16ms）批量交给UI线程转换为图标
+        self.icon_decoder = IconDecoder(self.view.emoticon_widget.animations.is_animated)
+        self.icon_decoder.images_decoded.connect(self._on_icons_decoded)
+        self._icon_decode_size = 0  # 已请求解码的最大图标尺寸（像素），图标放大超过它时重新解码
+        self.icon_resize_timer = QTimer()
+        self.icon_resize_timer.setSingleShot(True)
+        self.icon_resize_timer.setInterval(200)
+        self.icon_resize_timer.timeout.connect(self._redecode_icons_if_larger)
+
+        # 本地控制接口（config.json 中配置 control_port 时启用）
+        self.control_server = None
+
+        # 离线期间排队的表情：网络恢复后按发送间隔逐条补发
+        self.offline_drain_timer = QTimer()
+        self.offline_drain_timer.timeout.connect(self._drain_offline_sends)
+        self.model.connectivity_changed.connect(self._on_connectivity_changed)
+
         # 连接模型的下载信号
         self.model.download_completed.connect(self._on_download_completed)
         self.model.download_failed.connect(self._on_download_failed)
@@ -33,6 +81,12 @@ class MainController:
         self._connect_signals()
         self.load_config()
         self._update_room_combo()  # 初始化时更新房间下拉框
+        self.view.update_preset_combo(self.model.preset_store.names())
+
+        # 上次退出时还有未发送的离线记录：尝试补发（已过期的会被丢弃）
+        self._refresh_connection_state()
+        if len(self.model.offline_sends):
+            self.offline_drain_timer.start(self.view.interval_spin.value() * 1000)
 
     def _connect_signals(self):
         """将视图发出的信号连接到控制器的槽函数上。"""
@@ -41,8 +95,16 @@ class MainController:
         self.view.package_list.currentRowChanged.connect(self.display_package_emoticons)
         self.view.start_btn.clicked.connect(self.toggle_sending)
         self.view.clear_queue_btn.clicked.connect(self.clear_send_queue)
+        self.view.save_preset_btn.clicked.connect(self.save_preset)
+        self.view.load_preset_btn.clicked.connect(self.load_preset)
+        self.view.delete_preset_btn.clicked.connect(self.delete_preset)
         self.view.quick_send_check.stateChanged.connect(self._on_quick_send_toggled)
         self.view.room_id_combo.currentIndexChanged.connect(self._on_room_id_changed)
+        self.view.search_edit.textChanged.connect(self._on_search_text_changed)
+        self.view.diagnostics_btn.clicked.connect(self.show_diagnostics)
+        self.view.offline_check.toggled.connect(self._on_offline_toggled)
+        self.view.size_slider.valueChanged.connect(lambda _: self.icon_resize_timer.start())
+        self.model.emoticons_partial.connect(self._on_emoticons_partial)
 
     def _on_quick_send_toggled(self, state):
         """当快速发送开关切换时，切换开始按钮的可用性。"""
@@ -58,6 +120,84 @@ class MainController:
         if is_checked and self.is_sending:
             self.toggle_sending()
 
+    def _flush_log_panel(self):
+        """把缓冲区中的新日志批量显示到日志面板（面板隐藏时只丢弃，不更新界面）。"""
+        lines = self.log_buffer.drain()
+        if lines and self.view.log_panel.isVisible():
+            self.view.append_log_lines(lines)
+
+    def _probe_ui_lag(self):
+        """记录UI线程事件循环的延迟（定时器触发时间与预期时间之差）。"""
+        now = time.perf_counter()
+        metrics.UI_STALL.observe(max(0.0, now - self._lag_probe_expected))
+        self._lag_probe_expected = now + self._lag_probe_interval
+
+    # --- 运行诊断 ---
+
+    def show_diagnostics(self):
+        """打开诊断对话框（已打开时只激活它）。"""
+        if self.diagnostics_dialog is None:
+            self.diagnostics_dialog = DiagnosticsDialog(self.view)
+            self.diagnostics_dialog.refresh_btn.clicked.connect(self._refresh_diagnostics)
+            self.diagnostics_dialog.export_btn.clicked.connect(self.export_metrics)
+            self.diagnostics_timer = QTimer()
+            self.diagnostics_timer.timeout.connect(self._auto_refresh_diagnostics)
+            self.diagnostics_timer.start(2000)
+        self._refresh_diagnostics()
+        self.diagnostics_dialog.show()
+        self.diagnostics_dialog.raise_()
+
+    def _refresh_diagnostics(self):
+        """把最新的指标显示到诊断对话框。"""
+        self._update_queue_depth()
+        self.diagnostics_dialog.set_text(metrics.registry.render_text() + self._render_download_scaling())
+
+    def _render_download_scaling(self) -> str:
+        """下载线程数自动调整的状态和最近的调整记录。"""
+        manager = self.model.download_manager
+        if not manager:
+            return ""
+        status = manager.scaling_status()
+        lines = [f"[下载线程自动调整] 当前 {status['workers']} / 目标 {status['target']} "
+                 f"（范围 {status['min_workers']}-{status['max_workers']}），队列积压 {status['backlog']}"]
+        for decision in [d for d in status["decisions"] if d["action"] != "hold"][-10:]:
+            lines.append(f"    {time.strftime('%H:%M:%S', time.localtime(decision['time']))} "
+                         f"{decision['from']} -> {decision['to']} {decision['reason']} "
+                         f"吞吐量 {decision['throughput_bps'] / 1024:.0f}KB/s "
+                         f"中位延迟 {decision['latency_p50'] * 1000:.0f}ms（基线 {decision['latency_baseline'] * 1000:.0f}ms）")
+        return "\n".join(lines) + "\n"
+
+    def _auto_refresh_diagnostics(self):
+        """定时刷新：对话框隐藏或关闭了自动刷新时跳过。"""
+        dialog = self.diagnostics_dialog
+        if dialog.isVisible() and dialog.auto_refresh_check.isChecked():
+            self._refresh_diagnostics()
+
+    def _update_queue_depth(self):
+        """更新发送队列深度指标。"""
+        metrics.QUEUE_DEPTH.set(len(self.send_plan), queue="send")
+
+    def export_metrics(self):
+        """把当前指标导出到用户选择的文件。"""
+        path = self.view.ask_save_path("导出运行指标", "metrics.json",
+                                       "JSON 快照 (*.json);;Prometheus 文本 (*.prom)")
+        if not path:
+            return
+        try:
+            self._update_queue_depth()
+            metrics.registry.export(path)
+            self.view.set_status(f"运行指标已导出: {path}")
+        except Exception as e:
+            self.view.show_message("错误", f"导出运行指标失败: {e}", "error")
+
+    def _export_metrics_periodically(self):
+        """定时导出指标，供外部监控（例如 node_exporter textfile collector）采集。"""
+        self._update_queue_depth()
+        try:
+            metrics.registry.export(self.metrics_export_path)
+        except Exception as e:
+            logger.error(f"导出运行指标失败: {e}")
+
     def _execute_in_thread(self, fn, on_success, on_error, *args, **kwargs):
         """通用函数，用于在后台线程中执行任何耗时操作。"""
         worker = Worker(fn, *args, **kwargs)
@@ -79,9 +219,9 @@ class MainController:
         try:
             cached_rooms = self.model.get_cached_rooms()
             self.view.update_room_combo(cached_rooms)
-            logging.debug(f"房间下拉框已更新，共 {len(cached_rooms)} 个房间")
+            logger.debug(f"房间下拉框已更新，共 {len(cached_rooms)} 个房间")
         except Exception as e:
-            logging.error(f"更新房间下拉框失败: {e}")
+            logger.error(f"更新房间下拉框失败: {e}")
 
     def _on_room_id_changed(self, index: int):
         """
@@ -115,20 +255,48 @@ class MainController:
         self.view.set_status("正在加载表情包，请稍候...")
         self.view.load_emoticons_btn.setEnabled(False)
 
+        # 再次加载当前直播间视为手动刷新，忽略表情包缓存；切换到其他直播间时使用缓存
+        room_id = int(room_id_str)
+        force_refresh = room_id == self.loaded_room_id
+        self.loaded_room_id = room_id
+
         self._execute_in_thread(
             self.model.load_all_emoticons,
             on_success=self._on_emoticons_loaded,
             on_error=lambda err: self.view.show_message("加载失败", f"发生错误: {err[1]}", "error"),
-            room_id=int(room_id_str)
+            room_id=room_id,
+            force_refresh=force_refresh
         )
 
+    def _on_emoticons_partial(self, room_id: int, packages: dict):
+        """分块加载过程中，先把已获取到的用户表情包显示在列表顶部（其余项暂时保留上一次的结果）。"""
+        if room_id != self.loaded_room_id:
+            return
+        self._streamed_packages = packages
+        previous = {pkg_id: pkg for pkg_id, pkg in self.model.emoticons.items() if pkg_id not in packages}
+        self.view.populate_package_list(self._with_virtual_packages({**packages, **previous}))
+        self.view.set_status(f"正在加载表情包，已获取 {len(packages)} 个用户表情包...")
+
     def _on_emoticons_loaded(self, emoticons: dict):
         """当表情包数据从模型成功返回后的回调函数。"""
-        self.view.populate_package_list(emoticons)
+        self._streamed_packages = {}
+        self.view.populate_package_list(self._with_virtual_packages(emoticons))
+        # 增量更新后刷新当前显示的内容（未变化的按钮会被直接复用）
+        search_text = self.view.search_edit.text()
+        if search_text.strip():
+            self._on_search_text_changed(search_text)
+        else:
+            self.display_package_emoticons(self.view.package_list.currentRow())
 
-        self.view.set_status(f"成功加载了 {len(emoticons)} 个表情包。")
+        if self.model.connectivity.online and self.model.last_load_failures:
+            sources = "、".join(PACKAGE_SOURCE_NAMES.get(s, s) for s in self.model.last_load_failures)
+            self.view.set_status(f"加载了 {len(emoticons)} 个表情包（{sources}获取失败，已沿用缓存数据）。")
+        elif self.model.connectivity.online:
+            self.view.set_status(f"成功加载了 {len(emoticons)} 个表情包。")
+        else:
+            self.view.set_status(f"离线模式：从本地缓存加载了 {len(emoticons)} 个表情包。")
         self.view.load_emoticons_btn.setEnabled(True)
-        logging.info("表情包数据已加载并传递给视图进行填充。")
+        logger.info("表情包数据已加载并传递给视图进行填充。")
 
         # 更新房间下拉框，显示最新的缓存内容
         self._update_room_combo()
@@ -139,51 +307,223 @@ class MainController:
 
         item = self.view.package_list.item(row)
         pkg_id = item.data(Qt.UserRole) # 从视图项获取数据
-        pkg_data = self.model.emoticons.get(pkg_id)
+        if pkg_id == FREQUENT_PACKAGE_ID:
+            pkg_data = self.model.get_frequent_package()
+        else:
+            pkg_data = self._streamed_packages.get(pkg_id) or self.model.emoticons.get(pkg_id)
 
         if pkg_data:
-            # 为每个表情添加表情包名称信息
-            emotes_with_package = [dict(e, package_name=pkg_data["name"]) for e in pkg_data["emotes"]]
-            emotes_with_type = [dict(e, type=pkg_data["type"]) for e in emotes_with_package]
-            self.view.emoticon_widget.set_emoticons(emotes_with_type)
-
-            # 为新创建的表情按钮连接信号
-            for button in self.view.emoticon_widget.emoticon_buttons:
-                button.clicked_with_data.connect(self.add_to_send_queue)
-                button.request_image_load.connect(self._load_emoticon_image)
-                # 立即触发图片加载请求
-                button.request_image_load.emit(button, button.emoticon_data['url'], str(button.emoticon_data['id']))
-                
+            # 选择表情包时退出搜索状态
+            if self.view.search_edit.text():
+                self.view.search_edit.blockSignals(True)
+                self.view.search_edit.clear()
+                self.view.search_edit.blockSignals(False)
+            # 表情记录通过所属表情包引用获得包名和类型，直接交给视图，无需复制
+            self._show_emoticons(pkg_data.emotes)
+
+    def _on_search_text_changed(self, text: str):
+        """搜索框内容变化时，用搜索结果过滤表情网格；清空搜索框时恢复当前表情包。"""
+        if not text.strip():
+            self.display_package_emoticons(self.view.package_list.currentRow())
+            return
+
+        results = self.model.search_index.search(text)
+        self._show_emoticons(results)
+        self.view.set_status(f"搜索 \"{text}\": 找到 {len(results)} 个表情")
+
+    def _show_emoticons(self, emotes: list):
+        """在表情网格中显示给定的表情列表。"""
+        new_buttons = self.view.emoticon_widget.set_emoticons(emotes)
+        # 切换表情包后，尚未开始解码的、已不在网格中的图标直接跳过
+        self.icon_decoder.retain(emote.url for emote in emotes)
+
+        # 只为新创建的表情按钮连接信号，复用的按钮已连接且图标已加载
+        for button in new_buttons:
+            button.clicked_with_data.connect(self.add_to_send_queue)
+            button.favorite_toggled.connect(self._toggle_favorite)
+            button.request_image_load.connect(self._load_emoticon_image)
+            button.request_image_load.emit(button, button.emoticon_data.url, str(button.emoticon_data.id))
+
+    def _with_virtual_packages(self, emoticons: dict) -> dict:
+        """在表情包列表顶部加入虚拟的"常用"表情包（有收藏或使用记录时）。"""
+        frequent = self.model.get_frequent_package()
+        if not frequent.emotes:
+            return emoticons
+        return {frequent.id: frequent, **emoticons}
+
+    def _refresh_package_list(self):
+        """增量刷新表情包列表（用于"常用"表情包出现或消失时）。"""
+        if self.model.emoticons:
+            self.view.populate_package_list(self._with_virtual_packages(self.model.emoticons))
+
+    def _is_showing_frequent_package(self) -> bool:
+        item = self.view.package_list.currentItem()
+        return item is not None and item.data(Qt.UserRole) == FREQUENT_PACKAGE_ID and not self.view.search_edit.text()
+
+    def _toggle_favorite(self, emoticon_data: Emote):
+        """收藏或取消收藏一个表情。"""
+        is_favorite = self.model.usage_store.toggle_favorite(emoticon_data)
+        self.view.set_status(f"{'已收藏' if is_favorite else '已取消收藏'}: {emoticon_data.name}")
+        self._refresh_package_list()
+        if self._is_showing_frequent_package():
+            self.display_package_emoticons(self.view.package_list.currentRow())
+
     def _load_emoticon_image(self, button, url: str, emoticon_id: str):
-        """在后台加载单个表情图片并更新对应的按钮。"""
-        # 从按钮的表情数据中获取表情包名称
-        package_name = button.emoticon_data.get('package_name')
+        """在后台加载并解码单个表情图片，完成后随同一帧的其他结果批量更新到按钮上。"""
+        emote = button.emoticon_data
+
+        def load():
+            # 已打包的静态图标直接从内存映射中读取；其余的从图片缓存读取（未缓存时加入下载队列）
+            data = self.model.get_packed_icon(emote)
+            if data is not None:
+                return data
+            return self.model.get_emoticon_image(url, emoticon_id, emote.package_name)
+
+        self.icon_decoder.submit(url, load, self._icon_pixel_size())
+
+    def _icon_pixel_size(self) -> int:
+        """解码目标尺寸：当前图标大小（按屏幕缩放比换算为像素），不小于之前请求过的尺寸。"""
+        size = int(self.view.emoticon_widget.icon_size() * self.view.devicePixelRatioF())
+        self._icon_decode_size = max(self._icon_decode_size, size)
+        return self._icon_decode_size
+
+    def _redecode_icons_if_larger(self):
+        """图标放大到超过已解码的尺寸时，按新尺寸重新解码当前网格中的图标（缩小时直接使用较大的图片）。"""
+        previous = self._icon_decode_size
+        if self._icon_pixel_size() <= previous:
+            return
+        for button in self.view.emoticon_widget.emoticon_buttons:
+            self._load_emoticon_image(button, button.emoticon_data.url, str(button.emoticon_data.id))
 
-        # 使用模型的方法加载图片
-        self._execute_in_thread(
-            self.model.get_emoticon_image,
-            on_success=button.set_icon_from_path,
-            on_error=lambda err: logging.error(f"加载图片失败 {url}: {err[1]}"),
-            url=url,
-            emoticon_id=emoticon_id,
-            package_name=package_name
-        )
+    def _on_icons_decoded(self, images: dict):
+        """把这一帧内解码完成的图标批量设置到表情按钮上（按图片URL索引查找，O(1)）。"""
+        updated = self.view.emoticon_widget.set_images(images)
+        logger.debug("批量更新图标: %d 个解码完成，更新 %d 个按钮", len(images), updated)
 
     # --- 发送逻辑 ---
 
-    def add_to_send_queue(self, emoticon_data: dict):
+    def add_to_send_queue(self, emoticon_data: Emote):
         """将用户点击的表情添加到发送队列或立即发送。"""
         if self.view.quick_send_check.isChecked():
             # 新增一个独立的立即发送函数
             self.send_single_emoticon(emoticon_data)
-            logging.info(f"快速发送: {emoticon_data['name']}")
+            logger.info(f"快速发送: {emoticon_data.name}")
         else:
             # Otherwise, add to the queue as usual
-            self.send_queue.append(emoticon_data)
-            self.view.send_queue_list.addItem(emoticon_data['name'])
-            logging.info(f"已将 '{emoticon_data['name']}' 添加到发送队列。")
+            self._append_to_send_queue(emoticon_data)
+
+    def _append_to_send_queue(self, emoticon_data: Emote):
+        self.send_plan.append(emoticon_data)
+        self.view.send_queue_list.addItem(emoticon_data.name)
+        logger.info(f"已将 '{emoticon_data.name}' 添加到发送队列。")
+
+    # --- 本地控制接口 ---
+
+    def start_control_server(self, port: int, token: str = "") -> bool:
+        """启动本地控制接口（只监听 127.0.0.1），端口被占用等情况下返回 False。"""
+        try:
+            server = ControlServer(self.model, lambda: self.loaded_room_id, port=port, token=token)
+        except OSError as e:
+            logger.error(f"启动本地控制接口失败（端口 {port}）: {e}")
+            self.view.set_status(f"本地控制接口启动失败：端口 {port} 不可用", 8000)
+            return False
+        # 控制接口的请求线程发出的信号通过队列连接在UI线程中执行
+        server.enqueue_requested.connect(self._on_control_enqueue_requested)
+        server.sending_requested.connect(self._on_control_sending_requested)
+        server.send_finished.connect(lambda emote, room_id, result: self._on_send_result(result, emote, room_id))
+        server.offline_send_requested.connect(self._queue_offline_send)
+        self.control_server = server.start()
+        return True
+
+    def _on_control_enqueue_requested(self, emotes: list):
+        """控制接口在这一帧内请求加入队列的表情，一次性加入发送队列和队列列表。"""
+        for emoticon_data in emotes:
+            self.send_plan.append(emoticon_data)
+        self.view.send_queue_list.addItems([emoticon_data.name for emoticon_data in emotes])
+        logger.info(f"控制接口：已将 {len(emotes)} 个表情添加到发送队列。")
+
+    def _on_control_sending_requested(self, enabled: bool):
+        """控制接口请求开始/停止自动发送（状态已经一致时忽略，队列为空时只提示不弹窗）。"""
+        if enabled == self.is_sending:
+            return
+        if enabled and not self.send_plan:
+            self.view.set_status("控制接口：发送队列为空，未开始自动发送。")
+            return
+        self.toggle_sending()
+
+    def shutdown(self):
+        """应用程序退出前调用：停止控制接口和后台解码。"""
+        if self.control_server is not None:
+            self.control_server.shutdown()
+            self.control_server = None
+        self.icon_decoder.shutdown()
+
+    # --- 离线模式 ---
+
+    def _on_offline_toggled(self, checked: bool):
+        """用户手动开启/关闭离线模式。"""
+        self.model.connectivity.set_forced_offline(checked)
+        self._refresh_connection_state()
+
+    def _on_connectivity_changed(self, online: bool):
+        """网络状态变化（自动检测或手动切换）。"""
+        self._refresh_connection_state()
+        if online:
+            self.view.set_status("网络已恢复，切换回在线模式。")
+            if len(self.model.offline_sends):
+                logger.info(f"开始补发离线期间排队的 {len(self.model.offline_sends)} 个表情")
+                self.offline_drain_timer.start(self.view.interval_spin.value() * 1000)
+                self._drain_offline_sends()
+        else:
+            self.offline_drain_timer.stop()
+            if self.model.connectivity.forced_offline:
+                self.view.set_status("已开启离线模式：表情包从本地缓存加载，发送的表情将排队。")
+            else:
+                self.view.set_status("网络不可用，已切换为离线模式：表情包从本地缓存加载，发送的表情将排队。", 8000)
+
+    def _refresh_connection_state(self):
+        self.view.set_connection_state(self.model.connectivity.online, len(self.model.offline_sends))
+
+    def _queue_offline_send(self, emoticon_data: Emote, room_id: int):
+        """离线时把表情加入待发送队列（超过有效期未能发送的会被丢弃）。"""
+        self.model.offline_sends.put(emoticon_data.to_dict(), room_id, owner=self.model.account_id)
+        self._refresh_connection_state()
+        self.view.set_status(f"离线：'{emoticon_data.name}' 已加入待发送队列，"
+                             f"{self.model.offline_sends.ttl:.0f} 秒内网络恢复会自动发送")
+
+    def _drain_offline_sends(self):
+        """补发一条离线期间排队的表情（已过期的会被跳过）。"""
+        if not self.model.connectivity.online:
+            self.offline_drain_timer.stop()
+            return
+        entry = self.model.offline_sends.take_ready(owner=self.model.account_id)
+        self._refresh_connection_state()
+        if entry is None:
+            self.offline_drain_timer.stop()
+            return
+        emoticon_data = self.model.resolve_emote(entry["emote"])
+        room_id = entry["room_id"]
+        self.view.set_status(f"正在补发: {emoticon_data.name}...")
+        self._execute_in_thread(
+            self.model.send_emoticon,
+            on_success=lambda result, e=emoticon_data, r=room_id: self._on_offline_send_result(entry, result, e, r),
+            on_error=lambda err, e=emoticon_data, r=room_id: self._on_offline_send_result(entry, (False, str(err[1])), e, r),
+            room_id=room_id,
+            emoticon_data=emoticon_data
+        )
 
-    def send_single_emoticon(self, emoticon_data: dict):
+    def _on_offline_send_result(self, entry: dict, result: tuple, emoticon_data: Emote, room_id: int):
+        """补发完成：成功时从离线队列中删除记录，失败时放回队列等待下次补发。"""
+        if result[0]:
+            self.model.offline_sends.ack(entry)
+        else:
+            self.model.offline_sends.release(entry)
+            if not self.offline_drain_timer.isActive() and self.model.connectivity.online:
+                self.offline_drain_timer.start(self.view.interval_spin.value() * 1000)
+        self._refresh_connection_state()
+        self._on_send_result(result, emoticon_data, room_id)
+
+    def send_single_emoticon(self, emoticon_data: Emote):
         """
         处理立即发送一个表情的逻辑。
         """
@@ -198,13 +538,17 @@ class MainController:
             self.view.show_message("错误", "直播间ID只能是纯数字", "warning")
             return
 
-        self.view.set_status(f"正在快速发送: {emoticon_data['name']}...")
         room_id = int(room_id_str)
+        if not self.model.connectivity.online:
+            self._queue_offline_send(emoticon_data, room_id)
+            return
+
+        self.view.set_status(f"正在快速发送: {emoticon_data.name}...")
         
         self._execute_in_thread(
             self.model.send_emoticon,
-            on_success=self._on_send_result,
-            on_error=lambda err: self._on_send_result((False, str(err[1]))),
+            on_success=lambda result, e=emoticon_data, r=room_id: self._on_send_result(result, e, r),
+            on_error=lambda err, e=emoticon_data, r=room_id: self._on_send_result((False, str(err[1])), e, r),
             room_id=room_id,
             emoticon_data=emoticon_data
         )
@@ -212,9 +556,9 @@ class MainController:
 
     def clear_send_queue(self):
         """清空发送队列。"""
-        self.send_queue.clear()
+        self.send_plan.clear()
         self.view.send_queue_list.clear()
-        logging.info("发送队列已清空。")
+        logger.info("发送队列已清空。")
         
     def toggle_sending(self):
         """切换自动发送的状态。"""
@@ -222,7 +566,7 @@ class MainController:
         self.view.toggle_sending_state(self.is_sending)
 
         if self.is_sending:
-            if not self.send_queue:
+            if not self.send_plan:
                 self.view.show_message("提示", "发送队列为空，请先点击表情添加到队列。", "warning")
                 self.is_sending = False
                 self.view.toggle_sending_state(False)
@@ -230,54 +574,98 @@ class MainController:
             
             interval_ms = self.view.interval_spin.value() * 1000
             self.sending_timer.start(interval_ms)
-            logging.info(f"开始自动发送，间隔 {interval_ms}ms。")
+            logger.info(f"开始自动发送，间隔 {interval_ms}ms。")
             self._send_next_from_queue() # 立即发送第一个
         else:
             self.sending_timer.stop()
-            logging.info("已停止自动发送。")
+            logger.info("已停止自动发送。")
 
     def _send_next_from_queue(self):
         """发送队列中的下一个表情。"""
-        if not self.is_sending or not self.send_queue:
+        if not self.is_sending or not self.send_plan:
             if self.is_sending: self.toggle_sending() # 如果队列空了，自动停止
             return
-            
-        emoticon_data = self.send_queue[0]
-        
-        if self.view.loop_check.isChecked():
-            # 循环模式：将队首元素移到队尾
-            self.send_queue.append(self.send_queue.pop(0))
-            item = self.view.send_queue_list.takeItem(0)
-            self.view.send_queue_list.addItem(item)
-        else:
-            # 普通模式：移除队首元素
-            self.send_queue.pop(0)
-            self.view.send_queue_list.takeItem(0)
-        
-        self.view.set_status(f"正在发送: {emoticon_data['name']}...")
-        room_id_str = self.view.get_room_id()
 
+        room_id_str = self.view.get_room_id()
         if not room_id_str or not room_id_str.isdigit():
             self.view.show_message("错误", "直播间ID无效，请重新选择或输入", "warning")
             self.toggle_sending()  # 停止发送
             return
 
         room_id = int(room_id_str)
-        
+        if not self.model.connectivity.online:
+            # 离线时暂停自动发送（定时器继续运行，网络恢复后从当前位置继续）
+            self.view.set_status("离线：自动发送已暂停，等待网络恢复...")
+            return
+
+        # 只有房间号/Cookie变化或有新表情时才会重新构建载荷，否则每次发送只需填入 rnd
+        self.send_plan.compile((room_id, self.model.cookie), lambda e: self.model.build_send_payload(room_id, e))
+        index, emoticon_data, payload = self.send_plan.advance(self.view.loop_check.isChecked())
+        if not self.view.loop_check.isChecked():
+            # 普通模式：移除已发送的表情；循环模式下列表保持不变
+            self.view.send_queue_list.takeItem(index)
+
+        self.view.set_status(f"正在发送: {emoticon_data.name}...")
+
+        if payload is None:
+            # 无法构建载荷（例如Cookie中没有CSRF Token），走完整发送流程以报告错误
+            send_fn, kwargs = self.model.send_emoticon, {"room_id": room_id, "emoticon_data": emoticon_data}
+        else:
+            send_fn, kwargs = self.model.send_payload, {"payload": payload}
+
         self._execute_in_thread(
-            self.model.send_emoticon,
-            on_success=self._on_send_result,
-            on_error=lambda err: self._on_send_result((False, str(err[1]))),
-            room_id=room_id,
-            emoticon_data=emoticon_data
+            send_fn,
+            on_success=lambda result, e=emoticon_data, r=room_id: self._on_send_result(result, e, r),
+            on_error=lambda err, e=emoticon_data, r=room_id: self._on_send_result((False, str(err[1])), e, r),
+            **kwargs
         )
         
-    def _on_send_result(self, result: tuple):
+    def _on_send_result(self, result: tuple, emoticon_data: Emote = None, room_id: int = None):
         """处理表情发送后的结果。"""
         success, message = result
         status_text = "成功" if success else "失败"
         self.view.set_status(f"发送{status_text}: {message}")
-        logging.info(f"发送结果: {success}, 消息: {message}")
+        logger.info("发送结果: %s, 消息: %s", success, message)
+
+        if success and emoticon_data is not None:
+            # 记录使用频率（只修改内存，磁盘写入由后台批量完成）
+            self.model.usage_store.record_send(emoticon_data, room_id)
+            if not self.view.has_package(FREQUENT_PACKAGE_ID):
+                self._refresh_package_list()
+
+    # --- 发送组合预设 ---
+
+    def save_preset(self):
+        """把当前发送队列保存为预设。"""
+        if not self.send_plan:
+            self.view.show_message("提示", "发送队列为空，请先点击表情添加到队列。", "warning")
+            return
+        name = self.view.ask_text("保存发送预设", "预设名称:", self.view.preset_combo.currentText())
+        if not name:
+            return
+        self.model.preset_store.save(name, self.send_plan.entries)
+        self.view.update_preset_combo(self.model.preset_store.names(), current=name)
+        self.view.set_status(f"已保存发送预设: {name}（{len(self.send_plan)} 个表情）")
+
+    def load_preset(self):
+        """把选中的预设一次性载入发送队列。"""
+        name = self.view.preset_combo.currentText()
+        if not name:
+            return
+        fallback_packages = {}
+        emotes = [self.model.resolve_emote(data, fallback_packages) for data in self.model.preset_store.get(name)]
+        self.send_plan.replace(emotes)
+        self.view.set_send_queue([e.name for e in emotes])
+        self.view.set_status(f"已载入发送预设: {name}（{len(emotes)} 个表情）")
+
+    def delete_preset(self):
+        """删除选中的预设。"""
+        name = self.view.preset_combo.currentText()
+        if not name:
+            return
+        self.model.preset_store.delete(name)
+        self.view.update_preset_combo(self.model.preset_store.names())
+        self.view.set_status(f"已删除发送预设: {name}")
 
     # --- 配置管理 ---
 
@@ -296,34 +684,43 @@ class MainController:
                 self.view.quick_send_check.setChecked(config.get("quick_send", False))
                 self.view.size_slider.setValue(config.get("icon_size",84))
 
-                # 初始化下载管理器
-                max_threads = config.get("max_download_threads", 4)
-                self.model.init_download_manager(max_threads)
+                # 离线发送记录的有效期（秒）
+                self.model.offline_sends.ttl = config.get("offline_send_ttl", self.model.offline_sends.ttl)
+
+                # 表情包缩略图打包文件（默认开启）
+                self.model.pack_enabled = config.get("pack_thumbnails", True)
+
+                # 初始化下载管理器（线程数在上下限之间自动调整）
+                self.model.init_download_manager(config.get("max_download_threads", 16),
+                                                 config.get("min_download_threads", 1))
+
+                # 本地控制接口（默认关闭）
+                if config.get("control_port"):
+                    self.start_control_server(int(config["control_port"]), config.get("control_token", ""))
+
+                # 指标定时导出
+                self.metrics_export_path = config.get("metrics_export_path", "")
+                if self.metrics_export_path:
+                    self.metrics_export_timer.start(int(config.get("metrics_export_interval", 15) * 1000))
 
-                logging.info("配置文件 config.json 加载成功。")
+                logger.info("配置文件 config.json 加载成功。")
         except FileNotFoundError:
-            logging.warning("未找到配置文件 config.json，将使用默认值。")
+            logger.warning("未找到配置文件 config.json，将使用默认值。")
             # 使用默认值初始化下载管理器
-            self.model.init_download_manager(4)
+            self.model.init_download_manager()
         except Exception as e:
-            logging.error(f"加载配置文件失败: {e}")
+            logger.error(f"加载配置文件失败: {e}")
             # 出错时使用默认值初始化下载管理器
-            self.model.init_download_manager(4)
+            self.model.init_download_manager()
 
     def _on_download_completed(self, url: str, emoticon_id: str, local_path: str):
-        """下载完成回调"""
-        logging.debug(f"下载完成: {url} -> {local_path}")
-
-        # 查找并更新对应的按钮图标
-        for button in self.view.emoticon_widget.emoticon_buttons:
-            if str(button.emoticon_data.get('id')) == emoticon_id:
-                # button.request_image_load.emit(button, button.emoticon_data['url'], str(button.emoticon_data['id']))
-                button.set_icon_from_path(local_path)
-                break
+        """下载完成回调：交给后台解码，图标更新合并到下一帧批量进行。"""
+        logger.debug("下载完成: %s -> %s", url, local_path)
+        self.icon_decoder.submit(url, lambda: local_path, self._icon_pixel_size())
 
     def _on_download_failed(self, url: str, emoticon_id: str, error_message: str):
         """下载失败回调"""
-        logging.error(f"下载失败: {url}, 错误: {error_message}")
+        logger.error(f"下载失败: {url}, 错误: {error_message}")
 
     def save_config(self):
         """保存当前配置到文件。"""
@@ -334,12 +731,19 @@ class MainController:
             "loop": self.view.loop_check.isChecked(),
             "quick_send": self.view.quick_send_check.isChecked(),
             "icon_size": self.view.size_slider.value(),
-            "max_download_threads": self.model.download_manager.max_workers if self.model.download_manager else 4
+            "max_download_threads": self.model.download_manager.max_workers if self.model.download_manager else 16,
+            "min_download_threads": self.model.download_manager.min_workers if self.model.download_manager else 1
         }
+        try:
+            # 保留界面上没有对应控件的配置项（日志、指标导出等）
+            with open("config.json", "r") as f:
+                config_data = dict(json.load(f), **config_data)
+        except Exception:
+            pass
         try:
             with open("config.json", "w") as f:
                 json.dump(config_data, f, indent=4)
             self.view.show_message("成功", "配置已成功保存到 config.json。")
-            logging.info("配置已保存。")
+            logger.info("配置已保存。")
         except Exception as e:
             self.view.show_message("错误", f"保存配置失败: {e}", "error")
\ No newline at end of file
@@ -0,0 +1,110 @@
+# app/download_journal.py
+import os
+import json
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List
+
+from . import config
+from .file_lock import FileLock, atomic_write
+
+logger = logging.getLogger(__name__)
+
+
+def task_key(task) -> str:
+    """下载任务在日志中的唯一键（与 DownloadTask 的相等判断一致）。"""
+    return f"{task.url}\n{task.emoticon_id}\n{task.package_name}"
+
+
+class DownloadJournal:
+    """
+    下载队列的持久化日志（JSON Lines，只追加）：任务入队时记录 add，下载结束或取消时记录 done。
+    程序退出或崩溃时仍在队列中或正在下载的任务，下次启动时按原顺序恢复，不需要重新生成任务列表。
+    - 记录先放在内存中，由定时器线程批量追加到文件，不阻塞入队和下载
+    - 追加的记录超过 compact_threshold 条、启动恢复和关闭时会压缩日志，只保留未完成的任务
+    - 读写都在跨进程文件锁内进行，多个实例共享同一个日志时不会互相覆盖未完成的任务
+    """
+    def __init__(self, file_path: str = None, batch_delay: float = 0.5, compact_threshold: int = 2000):
+        self._file_path = file_path or os.path.join(config.DATA_CACHE_DIR, "download_journal.jsonl")
+        self._batch_delay = batch_delay
+        self._compact_threshold = compact_threshold
+        self._lock = threading.Lock()
+        self._batch_timer = None
+        self._buffer: List[str] = []
+        self._appended = 0  # 上次压缩后追加的记录数
+
+    def record_added(self, task):
+        self._append({"op": "add", "key": task_key(task), "local_path": task.local_path, "url": task.url,
+                      "emoticon_id": task.emoticon_id, "package_name": task.package_name,
+                      "priority": task.priority})
+
+    def record_finished(self, task):
+        self._append({"op": "done", "key": task_key(task)})
+
+    def _append(self, entry: Dict):
+        line = json.dumps(entry, ensure_ascii=False)
+        with self._lock:
+            self._buffer.append(line)
+            if self._batch_timer is not None:
+                return
+            self._batch_timer = threading.Timer(self._batch_delay, self.flush)
+            self._batch_timer.daemon = True
+            self._batch_timer.start()
+
+    def _take_buffer(self) -> List[str]:
+        with self._lock:
+            if self._batch_timer is not None:
+                self._batch_timer.cancel()
+                self._batch_timer = None
+            lines, self._buffer = self._buffer, []
+            return lines
+
+    def flush(self):
+        """立即把缓冲的记录追加到日志文件。"""
+        lines = self._take_buffer()
+        if not lines:
+            return
+        try:
+            os.makedirs(os.path.dirname(self._file_path) or ".", exist_ok=True)
+            with FileLock.for_path(self._file_path):
+                with open(self._file_path, 'a', encoding='utf-8') as f:
+                    f.write("\n".join(lines) + "\n")
+            self._appended += len(lines)
+        except Exception as e:
+            logger.error(f"写入下载日志失败: {e}")
+            return
+        if self._appended >= self._compact_threshold:
+            self.compact()
+
+    def _replay(self, lines: List[str]) -> "OrderedDict[str, Dict]":
+        """按顺序重放日志记录，返回未完成的任务 {键: add记录}。崩溃时写了一半的行会被忽略。"""
+        outstanding: "OrderedDict[str, Dict]" = OrderedDict()
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if entry.get("op") == "add":
+                outstanding.setdefault(entry["key"], entry)
+            elif entry.get("op") == "done":
+                outstanding.pop(entry.get("key"), None)
+        return outstanding
+
+    def compact(self) -> List[Dict]:
+        """把缓冲记录并入日志后重写为只包含未完成任务的日志，返回这些任务的 add 记录。"""
+        lines = self._take_buffer()
+        try:
+            os.makedirs(os.path.dirname(self._file_path) or ".", exist_ok=True)
+            with FileLock.for_path(self._file_path):
+                if os.path.exists(self._file_path):
+                    with open(self._file_path, 'r', encoding='utf-8') as f:
+                        lines = f.read().splitlines() + lines
+                outstanding = self._replay(lines)
+                content = "".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in outstanding.values())
+                atomic_write(self._file_path, content)
+            self._appended = 0
+            return list(outstanding.values())
+        except Exception as e:
+            logger.error(f"压缩下载日志失败: {e}")
+            return []
@@ -1,14 +1,28 @@
 # app/download_manager.py
+import time
 import threading
 import queue
 import logging
 import requests
 import os
 import json
-from typing import Dict, Set, Tuple, Optional
+import socket
+import weakref
+import statistics
+from collections import OrderedDict, deque
+from typing import Callable, Dict, List, Set, Tuple, Optional
+from requests.adapters import HTTPAdapter
 from PyQt5.QtCore import QObject, pyqtSignal
 
 from . import config
+from . import metrics
+from .file_lock import FileClaim, atomic_write
+from .download_journal import DownloadJournal
+
+logger = logging.getLogger(__name__)
+
+DOWNLOAD_WORKERS = metrics.registry.gauge("image_download_workers", "图片下载工作线程数（current=当前，target=目标）")
+SCALING_DECISIONS = metrics.registry.counter("image_download_scaling_total", "下载线程数调整次数（按动作和原因）")
 
 
 class DownloadTask:
@@ -35,6 +49,206 @@ class DownloadTask:
         return self.priority > other.priority
 
 
+class FairTaskQueue(queue.Queue):
+    """
+    公平调度的下载队列：元素为 (优先级, DownloadTask)，优先级数值小的先出队（与 PriorityQueue 一致）；
+    同一优先级内按表情包分成子队列轮流出队，预取大表情包时，新打开的小表情包不必排在几百个任务之后。
+    close() 之后 get() 立即返回 None，用于关闭时唤醒所有等待中的工作线程。
+    """
+    def _init(self, maxsize):
+        self._levels: Dict[int, "OrderedDict[str, deque]"] = {}  # 优先级 -> {表情包名: 任务队列}，按轮转顺序排列
+        self._count = 0
+        self._closed = False
+
+    def close(self):
+        """关闭队列：剩余任务不再出队，等待中和之后的 get() 都返回 None。"""
+        with self.mutex:
+            self._closed = True
+            self.not_empty.notify_all()
+
+    def _qsize(self):
+        # 关闭后视为非空，等待中的 get() 会立即调用 _get 拿到 None
+        return self._count + (1 if self._closed else 0)
+
+    def _put(self, item):
+        priority, task = item
+        level = self._levels.setdefault(priority, OrderedDict())
+        level.setdefault(task.package_name, deque()).append(item)
+        self._count += 1
+
+    def _get(self):
+        if self._closed:
+            return None
+        priority = min(self._levels)
+        level = self._levels[priority]
+        package_name, items = next(iter(level.items()))
+        item = items.popleft()
+        if items:
+            level.move_to_end(package_name)  # 本轮已出队一个，排到队尾
+        else:
+            del level[package_name]
+            if not level:
+                del self._levels[priority]
+        self._count -= 1
+        return item
+
+    def remove(self, predicate: Callable[[tuple], bool]) -> List[tuple]:
+        """移除满足条件的任务（视为已完成，join() 不再等待它们），返回被移除的任务。"""
+        with self.mutex:
+            removed = []
+            for priority, level in list(self._levels.items()):
+                for package_name, items in list(level.items()):
+                    kept = deque()
+                    for item in items:
+                        (removed if predicate(item) else kept).append(item)
+                    if kept:
+                        level[package_name] = kept
+                    else:
+                        del level[package_name]
+                if not level:
+                    del self._levels[priority]
+            if removed:
+                self._count -= len(removed)
+                self.unfinished_tasks -= len(removed)
+                if self.unfinished_tasks == 0:
+                    self.all_tasks_done.notify_all()
+                self.not_full.notify_all()
+            return removed
+
+
+class AbortableHTTPAdapter(HTTPAdapter):
+    """
+    记录建立过的所有连接的 HTTP 适配器。abort_all() 断开这些连接的套接字，
+    正在等待响应或读取数据的请求会立即出错返回，关闭下载管理器时不必等待慢请求。
+    """
+    def __init__(self, **kwargs):
+        self.connections = weakref.WeakSet()
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        adapter = self
+        new_pool = self.poolmanager._new_pool
+
+        def tracked_new_pool(*pool_args, **pool_kwargs):
+            pool = new_pool(*pool_args, **pool_kwargs)
+
+            class TrackedConnection(pool.ConnectionCls):
+                def connect(self):
+                    super().connect()
+                    adapter.connections.add(self)
+
+            pool.ConnectionCls = TrackedConnection
+            return pool
+
+        self.poolmanager._new_pool = tracked_new_pool
+
+    def abort_all(self):
+        for conn in list(self.connections):
+            sock = getattr(conn, "sock", None)
+            if sock is None:
+                continue
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+class WorkerAutoScaler:
+    """
+    下载线程数的 AIMD 控制器：每个观测窗口统计下载吞吐量、延迟和错误/429比例，
+    出现限流、错误或延迟明显升高（吞吐量却没有提高）时线程数减半，队列有积压时增加线程数：
+    第一次减少之前翻倍增长（慢启动），之后每个窗口加一。
+    限流和错误的响应通常很快返回，不等窗口结束，累计到 min_samples 次时立即减少。
+    延迟基线取最近若干窗口的最低中位延迟，带宽变化后基线会随之更新。
+    """
+    def __init__(self, min_workers: int = 1, max_workers: int = 16, initial: int = 4,
+                 interval: float = 0.5, min_samples: int = 4, error_threshold: float = 0.1,
+                 latency_factor: float = 2.0, baseline_windows: int = 10, history: int = 200):
+        self.min_workers = max(1, min_workers)
+        self.max_workers = max(self.min_workers, max_workers)
+        self.target = self._clamp(initial)
+        self.interval = interval
+        self.min_samples = min_samples
+        self.error_threshold = error_threshold
+        self.latency_factor = latency_factor
+        self.decisions = deque(maxlen=history)  # 最近的调整记录，供诊断和基准测试查看
+        self._lock = threading.Lock()
+        self._samples: List[Tuple[float, int, str]] = []  # (延迟, 字节数, 结果)
+        self._window_start = time.monotonic()
+        self._latency_history = deque(maxlen=baseline_windows)
+        self._last_throughput = 0.0
+        self._slow_start_limit = self.max_workers  # 低于该值时翻倍增长，第一次减少后设为减少后的线程数
+        self._failures = 0  # 当前窗口内的限流/错误次数
+        DOWNLOAD_WORKERS.set(self.target, kind="target")
+
+    def _clamp(self, value: int) -> int:
+        return max(self.min_workers, min(self.max_workers, value))
+
+    def record(self, latency: float, nbytes: int, outcome: str, backlog: int, workers: int):
+        """记录一次下载结果（outcome: ok / throttled / error），窗口结束时调整目标线程数。"""
+        with self._lock:
+            self._samples.append((latency, nbytes, outcome))
+            if outcome != "ok":
+                self._failures += 1
+            now = time.monotonic()
+            elapsed = now - self._window_start
+            congested = (self._failures >= self.min_samples
+                         and self._failures / len(self._samples) > self.error_threshold)
+            if not congested and (elapsed < self.interval or len(self._samples) < self.min_samples):
+                return
+            self._failures = 0
+            samples, self._samples = self._samples, []
+            self._window_start = now
+            self._evaluate(samples, elapsed, backlog, workers)
+
+    def _evaluate(self, samples: List[Tuple[float, int, str]], elapsed: float, backlog: int, workers: int):
+        throttled = sum(1 for _, _, outcome in samples if outcome == "throttled")
+        errors = sum(1 for _, _, outcome in samples if outcome == "error")
+        ok_latencies = [latency for latency, _, outcome in samples if outcome == "ok"]
+        throughput = sum(nbytes for _, nbytes, _ in samples) / elapsed
+        latency = statistics.median(ok_latencies) if ok_latencies else 0.0
+        if ok_latencies:
+            self._latency_history.append(latency)
+        baseline = min(self._latency_history) if self._latency_history else 0.0
+        improved = throughput > self._last_throughput * 1.1
+        self._last_throughput = throughput
+
+        old = self.target
+        if throttled / len(samples) > self.error_threshold:
+            action, reason, new = "decrease", "throttled", self._clamp(old // 2)
+        elif errors / len(samples) > self.error_threshold:
+            action, reason, new = "decrease", "errors", self._clamp(old // 2)
+        elif baseline and latency > baseline * self.latency_factor and not improved:
+            action, reason, new = "decrease", "latency", self._clamp(old // 2)
+        elif backlog > 0 and workers >= old:
+            step = old if old < self._slow_start_limit else 1
+            action, reason, new = "increase", "backlog", self._clamp(min(old + step, max(self._slow_start_limit, old + 1)))
+        else:
+            action, reason, new = "hold", "steady", old
+        if new == old:
+            action = "hold"
+        elif action == "decrease":
+            self._slow_start_limit = new
+        self.target = new
+        DOWNLOAD_WORKERS.set(new, kind="target")
+        SCALING_DECISIONS.inc(action=action, reason=reason)
+        self.decisions.append({
+            "time": time.time(), "action": action, "reason": reason, "from": old, "to": new,
+            "throughput_bps": throughput, "latency_p50": latency, "latency_baseline": baseline,
+            "throttled": throttled, "errors": errors, "samples": len(samples), "backlog": backlog,
+        })
+        if action != "hold":
+            logger.info("下载线程数 %d -> %d（%s，吞吐量 %.0f KB/s，中位延迟 %.0f ms，基线 %.0f ms）",
+                        old, new, reason, throughput / 1024, latency * 1000, baseline * 1000)
+
+    def status(self) -> Dict:
+        """当前目标线程数、上下限和最近的调整记录。"""
+        with self._lock:
+            return {"target": self.target, "min_workers": self.min_workers, "max_workers": self.max_workers,
+                    "decisions": list(self.decisions)}
+
+
 class DownloadManager(QObject):
     """
     下载管理器：使用任务队列和线程池管理图片下载
@@ -43,14 +257,25 @@ class DownloadManager(QObject):
     download_completed = pyqtSignal(str, str, str)  # url, emoticon_id, local_path
     download_failed = pyqtSignal(str, str, str)     # url, emoticon_id, error_message
 
-    def __init__(self, model, max_workers: int = 4):
+    def __init__(self, model, max_workers: int = 16, min_workers: int = 1, idle_timeout: float = 1.0,
+                 journal: Optional[DownloadJournal] = None):
         super().__init__()
         self.user_agent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
         self.model = model
         self.max_workers = max_workers
+        self.min_workers = min_workers
+        self.idle_timeout = idle_timeout  # 工作线程空闲超过该时间（秒）后退出，有新任务时再按需启动
+        self.journal = journal  # 未完成任务的持久化日志（None 表示不持久化）
 
-        # 任务队列（使用优先级队列）
-        self.task_queue = queue.PriorityQueue()
+        # 所有工作线程共用一个会话（复用连接），关闭时通过适配器断开正在进行的请求
+        self._http_adapter = AbortableHTTPAdapter(pool_maxsize=max_workers)
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = self.user_agent
+        self.session.mount("http://", self._http_adapter)
+        self.session.mount("https://", self._http_adapter)
+
+        # 任务队列（按优先级，同一优先级内各表情包轮流下载）
+        self.task_queue = FairTaskQueue()
 
         # 线程同步
         self.lock = threading.Lock()
@@ -61,24 +286,41 @@ class DownloadManager(QObject):
         self.pending_tasks: Set[DownloadTask] = set()
         self.completed_tasks: Set[DownloadTask] = set()
 
-        # 启动工作线程
-        self._start_workers()
+        # 工作线程数在 [min_workers, max_workers] 范围内根据下载表现自动调整
+        self.autoscaler = WorkerAutoScaler(min_workers, max_workers, initial=min(4, max_workers))
+        self._worker_seq = 0
 
-        logging.info(f"下载管理器已启动，最大工作线程数: {max_workers}")
+        logger.info(f"下载管理器已启动，工作线程数: {min_workers}-{max_workers}（自动调整）")
 
-    def _start_workers(self):
-        """启动工作线程"""
-        for i in range(self.max_workers):
-            worker = threading.Thread(target=self._worker_loop, daemon=True, name=f"DownloadWorker-{i}")
-            worker.start()
+    def _ensure_workers(self):
+        """队列中有任务且线程数低于目标时启动新的工作线程（调用方持有 self.lock）。"""
+        wanted = min(self.autoscaler.target, self.task_queue.qsize())
+        while self.running and len(self.workers) < wanted:
+            worker = threading.Thread(target=self._worker_loop, daemon=True, name=f"DownloadWorker-{self._worker_seq}")
+            self._worker_seq += 1
             self.workers.append(worker)
+            worker.start()
+        DOWNLOAD_WORKERS.set(len(self.workers), kind="current")
+
+    def _remove_current_worker(self):
+        """把当前线程从工作线程列表中移除（调用方持有 self.lock），add_download_task 据此判断是否需要补充线程。"""
+        current = threading.current_thread()
+        if current in self.workers:
+            self.workers.remove(current)
+        DOWNLOAD_WORKERS.set(len(self.workers), kind="current")
 
     def _worker_loop(self):
-        """工作线程主循环"""
+        """工作线程主循环：空闲超时或线程数超过目标时退出"""
         while self.running:
             try:
-                # 从队列获取任务（阻塞等待）
-                priority, task = self.task_queue.get(timeout=1.0)
+                # 从队列获取任务（阻塞等待，空闲超时后退出）
+                item = self.task_queue.get(timeout=self.idle_timeout)
+                if item is None:
+                    # 队列已关闭（正在关闭下载管理器）
+                    break
+                priority, task = item
+                metrics.QUEUE_DEPTH.set(self.task_queue.qsize(), queue="download")
+                aborted = False
 
                 try:
                     # 执行下载
@@ -89,30 +331,56 @@ class DownloadManager(QObject):
                         task.package_name
                     )
 
-                    # 发送完成信号
-                    if local_path:
+                    # 发送完成信号（关闭时中止的下载不发信号，任务留在日志中下次启动继续）
+                    if local_path is None:
+                        aborted = True
+                    elif local_path:
                         self.download_completed.emit(task.url, task.emoticon_id, local_path)
                     else:
                         self.download_failed.emit(task.url, task.emoticon_id, "下载失败")
 
                 except Exception as e:
-                    logging.error(f"下载任务执行失败 {task.url}: {e}")
+                    logger.error(f"下载任务执行失败 {task.url}: {e}")
                     self.download_failed.emit(task.url, task.emoticon_id, str(e))
 
                 finally:
                     # 标记任务完成
                     with self.lock:
                         self.pending_tasks.discard(task)
-                        self.completed_tasks.add(task)
+                        if not aborted:
+                            self.completed_tasks.add(task)
+                        # 线程数超过目标（自动调整减少了线程数）时当前线程退出
+                        retire = not self.running or len(self.workers) > self.autoscaler.target
+                        if retire:
+                            self._remove_current_worker()
+                        else:
+                            self._ensure_workers()
 
                     self.task_queue.task_done()
+                    if self.journal and not aborted:
+                        self.journal.record_finished(task)
+                if retire:
+                    return
 
             except queue.Empty:
-                # 超时，检查是否继续运行
-                continue
+                # 空闲超时：队列仍为空则退出（在锁内判断，避免与 add_download_task 竞争导致任务无人处理）
+                with self.lock:
+                    if self.task_queue.empty() or not self.running:
+                        self._remove_current_worker()
+                        return
             except Exception as e:
-                logging.error(f"工作线程异常: {e}")
+                logger.error(f"工作线程异常: {e}")
                 break
+        with self.lock:
+            self._remove_current_worker()
+
+    def scaling_status(self) -> Dict:
+        """自动调整状态：当前/目标线程数、上下限、队列积压和最近的调整记录。"""
+        status = self.autoscaler.status()
+        with self.lock:
+            status["workers"] = len(self.workers)
+        status["backlog"] = self.task_queue.qsize()
+        return status
 
     def _update_mapping_file(self, mapping_file: str, emoticon_id: str, package_name: str):
         """
@@ -129,21 +397,81 @@ class DownloadManager(QObject):
             with open(mapping_file, 'w', encoding='utf-8') as f:
                 json.dump(mappings, f, ensure_ascii=False, indent=2)
         except Exception as e:
-            logging.error(f"更新映射文件失败 {mapping_file}: {e}")
+            logger.error(f"更新映射文件失败 {mapping_file}: {e}")
     
     def get_emoticon_image(self, local_path:str, url: str, emoticon_id, package_name: str = None):
-        logging.info(f"正在下载图片: {url}")
+        """下载图片到 local_path，返回本地路径；失败返回空字符串，关闭下载管理器时中止返回 None。"""
+        logger.debug("正在下载图片: %s", url)
+        start = time.perf_counter()
         try:
-            response = requests.get(url, timeout=10, headers={"User-Agent": self.user_agent})
-            response.raise_for_status()
-            with open(local_path, 'wb') as f:
-                f.write(response.content)
-            logging.info(f"图片已下载并缓存至: {local_path}")
+            # 同一工作目录下的多个实例共享图片缓存：认领该文件（<路径>.part）后再下载，
+            # 已被其他线程或实例认领时等待其完成后直接使用；认领只针对这一个文件，下载期间不持有任何共享锁
+            claim = self._claim_image(local_path)
+            if claim is None:
+                if os.path.exists(local_path):
+                    metrics.DOWNLOADS.inc(outcome="shared")
+                    logger.debug("图片已由其他实例下载: %s", local_path)
+                    return local_path
+                metrics.DOWNLOADS.inc(outcome="aborted")
+                return None
+            try:
+                content = self._fetch(url)
+                if content is None:
+                    metrics.DOWNLOADS.inc(outcome="aborted")
+                    return None
+                atomic_write(local_path, content)
+            finally:
+                claim.release()
+            elapsed = time.perf_counter() - start
+            metrics.DOWNLOAD_LATENCY.observe(elapsed)
+            metrics.DOWNLOAD_BYTES.inc(len(content))
+            metrics.DOWNLOADS.inc(outcome="ok")
+            self._record_download(elapsed, len(content), "ok")
+            logger.debug("图片已下载并缓存至: %s", local_path)
             return local_path
-        except requests.RequestException as e:
-            logging.error(f"下载图片失败 {url}: {e}")
+        except (requests.RequestException, OSError) as e:
+            if not self.running:
+                # 关闭时连接被断开：视为中止，任务留在日志中
+                metrics.DOWNLOADS.inc(outcome="aborted")
+                return None
+            metrics.DOWNLOADS.inc(outcome="failed")
+            status = getattr(getattr(e, "response", None), "status_code", None)
+            self._record_download(time.perf_counter() - start, 0, "throttled" if status == 429 else "error")
+            logger.error(f"下载图片失败 {url}: {e}")
             return "" # 下载失败返回空字符串
 
+    def _claim_image(self, local_path: str, poll_interval: float = 0.05) -> Optional[FileClaim]:
+        """
+        认领图片文件。图片已存在（包括等待期间由其他线程或实例下载完成）或正在关闭时返回 None。
+        """
+        claim = FileClaim(local_path)
+        while self.running:
+            if os.path.exists(local_path):
+                return None
+            if claim.try_acquire():
+                if os.path.exists(local_path):  # 认领前刚好下载完成
+                    claim.release()
+                    return None
+                return claim
+            time.sleep(poll_interval)
+        return None
+
+    def _fetch(self, url: str) -> Optional[bytes]:
+        """分块读取响应体，每块之间检查是否正在关闭；关闭时丢弃已读取的部分并返回 None。"""
+        if not self.running:
+            return None
+        with self.session.get(url, timeout=(5, 10), stream=True) as response:
+            response.raise_for_status()
+            chunks = []
+            for chunk in response.iter_content(chunk_size=16384):
+                if not self.running:
+                    return None
+                chunks.append(chunk)
+        return b"".join(chunks) if self.running else None
+
+    def _record_download(self, latency: float, nbytes: int, outcome: str):
+        """把一次网络下载的结果交给自动调整控制器。"""
+        self.autoscaler.record(latency, nbytes, outcome, self.task_queue.qsize(), len(self.workers))
 
     def add_download_task(self,local_path: str, url: str, emoticon_id: str, package_name: str, priority: int = 0) -> bool:
         """
@@ -163,18 +491,45 @@ class DownloadManager(QObject):
         with self.lock:
             # 检查任务是否已存在或已完成
             if task in self.pending_tasks or task in self.completed_tasks:
-                logging.debug(f"下载任务已存在或已完成: {url}")
+                logger.debug("下载任务已存在或已完成: %s", url)
                 return False
 
             # 添加到待处理集合
             self.pending_tasks.add(task)
 
-        # 添加到优先级队列（优先级取负值，因为PriorityQueue是小顶堆）
+        if self.journal:
+            self.journal.record_added(task)
+
+        # 添加到任务队列（优先级取负值，数值小的先出队）
         self.task_queue.put((-priority, task))
+        metrics.QUEUE_DEPTH.set(self.task_queue.qsize(), queue="download")
+
+        # 先入队再检查线程数：空闲退出的线程在锁内确认队列为空，这里一定能看到它已退出
+        with self.lock:
+            self._ensure_workers()
 
-        logging.debug(f"已添加下载任务: {url}, 优先级: {priority}")
+        logger.debug("已添加下载任务: %s, 优先级: %s", url, priority)
         return True
 
+    def resume(self) -> List[DownloadTask]:
+        """
+        恢复上次退出时未完成的下载任务（按原来的入队顺序），返回重新入队的任务。
+        本地文件已经存在的任务（例如由其他实例下载完成）直接跳过。
+        """
+        if not self.journal:
+            return []
+        resumed = []
+        for entry in self.journal.compact():
+            task = DownloadTask(entry["local_path"], entry["url"], entry["emoticon_id"],
+                                entry["package_name"], entry.get("priority", 0))
+            if os.path.exists(task.local_path):
+                self.journal.record_finished(task)
+            elif self.add_download_task(task.local_path, task.url, task.emoticon_id, task.package_name, task.priority):
+                resumed.append(task)
+        if resumed:
+            logger.info(f"已恢复 {len(resumed)} 个未完成的下载任务")
+        return resumed
+
     def add_high_priority_task(self,local_path: str, url: str, emoticon_id: str, package_name: str) -> bool:
         """添加高优先级下载任务（当前可见表情）"""
         return self.add_download_task(local_path, url, emoticon_id, package_name, priority=1)
@@ -190,49 +545,47 @@ class DownloadManager(QObject):
             if emoticon_ids is None:
                 # 取消所有任务
                 self.pending_tasks.clear()
-                # 清空队列
-                while not self.task_queue.empty():
-                    try:
-                        self.task_queue.get_nowait()
-                        self.task_queue.task_done()
-                    except queue.Empty:
-                        break
+                removed = self.task_queue.remove(lambda item: True)
             else:
                 # 取消指定表情ID的任务
                 tasks_to_remove = [task for task in self.pending_tasks if task.emoticon_id in emoticon_ids]
                 for task in tasks_to_remove:
                     self.pending_tasks.discard(task)
-
-                # 从队列中移除指定任务（需要重建队列）
-                temp_queue = queue.PriorityQueue()
-                while not self.task_queue.empty():
-                    try:
-                        priority, task = self.task_queue.get_nowait()
-                        if task.emoticon_id not in emoticon_ids:
-                            temp_queue.put((priority, task))
-                        self.task_queue.task_done()
-                    except queue.Empty:
-                        break
-
-                # 将剩余任务放回原队列
-                while not temp_queue.empty():
-                    priority, task = temp_queue.get_nowait()
-                    self.task_queue.put((priority, task))
+                removed = self.task_queue.remove(lambda item: item[1].emoticon_id in emoticon_ids)
+        if self.journal:
+            for _, task in removed:
+                self.journal.record_finished(task)
+        metrics.QUEUE_DEPTH.set(self.task_queue.qsize(), queue="download")
 
     def get_queue_size(self) -> Tuple[int, int]:
         """获取队列状态：待处理任务数，已完成任务数"""
         with self.lock:
             return len(self.pending_tasks), len(self.completed_tasks)
 
-    def shutdown(self):
-        """关闭下载管理器"""
+    def shutdown(self, timeout: float = 0.5):
+        """
+        关闭下载管理器：关闭队列唤醒空闲线程，断开正在进行的请求的连接，
+        所有线程共用一个 timeout 秒的截止时间（之后仍未退出的守护线程不再等待）。
+        未完成的任务保留在下载日志中，下次启动时由 resume() 恢复。重复调用时直接返回。
+        """
+        if not self.running:
+            return
         self.running = False
+        self.task_queue.close()
+        self._http_adapter.abort_all()
 
-        # 等待所有工作线程结束
-        for worker in self.workers:
-            worker.join(timeout=5.0)
-
-        logging.info("下载管理器已关闭")
+        # 线程退出时会从 self.workers 中移除自己，这里遍历副本
+        with self.lock:
+            workers = list(self.workers)
+        deadline = time.monotonic() + timeout
+        for worker in workers:
+            worker.join(timeout=max(0.0, deadline - time.monotonic()))
+        abandoned = sum(1 for worker in workers if worker.is_alive())
+        self.session.close()
+
+        if self.journal:
+            self.journal.compact()
+        logger.info(f"下载管理器已关闭（{abandoned} 个线程仍在等待响应，已放弃）" if abandoned else "下载管理器已关闭")
 
     def __del__(self):
         """析构函数，确保资源清理"""
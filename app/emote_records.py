@@ -0,0 +1,80 @@
+# app/emote_records.py
+import sys
+from typing import Dict, List
+
+
+class EmotePackage:
+    """
+    表情包数据类。
+    使用 __slots__ 减少内存占用，包名和类型字符串经过 intern，
+    同名的表情包在多次加载之间共享同一个字符串对象。
+    """
+    __slots__ = ("id", "name", "type", "emotes")
+
+    def __init__(self, pkg_id, name: str, pkg_type: str):
+        self.id = pkg_id
+        self.name = sys.intern(name)
+        self.type = sys.intern(pkg_type)
+        self.emotes: List["Emote"] = []
+
+    def add_emote(self, name: str, url: str, emote_id) -> "Emote":
+        """创建一个属于本表情包的表情并追加到列表末尾。"""
+        emote = Emote(name, url, emote_id, self)
+        self.emotes.append(emote)
+        return emote
+
+    def to_dict(self) -> Dict:
+        """转换为可JSON序列化的字典。"""
+        return {
+            "id": self.id,
+            "name": self.name,
+            "type": self.type,
+            "emotes": [{"name": e.name, "url": e.url, "id": e.id} for e in self.emotes]
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "EmotePackage":
+        """从 to_dict 生成的字典恢复表情包。"""
+        package = cls(data["id"], data["name"], data["type"])
+        for e in data.get("emotes", []):
+            package.add_emote(e["name"], e["url"], e["id"])
+        return package
+
+    def __repr__(self):
+        return f"EmotePackage(id={self.id!r}, name={self.name!r}, type={self.type!r}, emotes={len(self.emotes)})"
+
+
+class Emote:
+    """
+    单个表情的数据类。
+    表情包名称和类型不在每个表情上复制，而是通过所属表情包引用获得，
+    因此模型、控制器和视图可以直接共享同一个对象，无需在每次点击时复制。
+    """
+    __slots__ = ("name", "url", "id", "package")
+
+    def __init__(self, name: str, url: str, emote_id, package: EmotePackage):
+        self.name = name
+        self.url = url
+        self.id = emote_id
+        self.package = package
+
+    @property
+    def package_name(self) -> str:
+        return self.package.name
+
+    @property
+    def type(self) -> str:
+        return self.package.type
+
+    def to_dict(self) -> Dict:
+        """转换为可JSON序列化的字典（包含所属表情包的名称和类型）。"""
+        return {
+            "name": self.name,
+            "url": self.url,
+            "id": self.id,
+            "package_name": self.package.name,
+            "type": self.package.type
+        }
+
+    def __repr__(self):
+        return f"Emote(name={self.name!r}, id={self.id!r}, package={self.package.name!r})"
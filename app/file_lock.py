@@ -0,0 +1,147 @@
+# app/file_lock.py
+import os
+import time
+import uuid
+import hashlib
+import logging
+import threading
+from typing import Union
+
+from . import config
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+logger = logging.getLogger(__name__)
+
+LOCK_BUCKETS = 256  # 锁文件数量上限：按路径哈希分桶，避免为每个缓存文件创建锁文件
+
+
+class FileLock:
+    """
+    跨进程文件锁（POSIX 使用 flock，Windows 使用 msvcrt.locking），用于同一工作目录下运行的多个实例。
+    每次加锁都重新打开锁文件，因此同一进程内的不同线程之间同样互斥。
+    """
+    def __init__(self, lock_path: str, timeout: float = 30.0, poll_interval: float = 0.02):
+        self.lock_path = lock_path
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self._fd = None
+
+    @classmethod
+    def for_path(cls, path: str, **kwargs) -> "FileLock":
+        """返回保护指定缓存文件的锁（锁文件位于 config.LOCK_DIR，按路径哈希分桶）。"""
+        digest = hashlib.sha1(os.path.abspath(path).encode("utf-8")).digest()
+        bucket = int.from_bytes(digest[:4], "big") % LOCK_BUCKETS
+        return cls(os.path.join(config.LOCK_DIR, f"{bucket:03d}.lock"), **kwargs)
+
+    def acquire(self):
+        """获取锁，超过 timeout 秒仍未获得时抛出 TimeoutError。"""
+        os.makedirs(os.path.dirname(self.lock_path) or ".", exist_ok=True)
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                if os.name == "nt":
+                    os.lseek(fd, 0, os.SEEK_SET)
+                    msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+                else:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                self._fd = fd
+                return
+            except OSError:
+                if time.monotonic() >= deadline:
+                    os.close(fd)
+                    raise TimeoutError(f"等待文件锁超时: {self.lock_path}")
+                time.sleep(self.poll_interval)
+
+    def release(self):
+        fd, self._fd = self._fd, None
+        if fd is None:
+            return
+        try:
+            if os.name == "nt":
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+        return False
+
+
+class FileClaim:
+    """
+    单个目标文件的独占认领：在目标文件旁用 O_CREAT|O_EXCL 创建 <path>.part。
+    只保护这一个文件，持有期间可以进行网络下载等耗时操作，不会像分桶的 FileLock 那样
+    阻塞碰巧分到同一个桶的其他文件。进程崩溃留下的 .part 超过 stale_after 秒后视为失效，可以被重新认领。
+    """
+    def __init__(self, path: str, stale_after: float = 120.0):
+        self.part_path = f"{path}.part"
+        self.stale_after = stale_after
+        self._token = None  # 写入 .part 的认领标识（inode号在文件删除后可能马上被复用，不能用来识别认领）
+
+    def try_acquire(self) -> bool:
+        """尝试认领，已被其他线程/实例认领（且未失效）时立即返回 False。"""
+        for _ in range(2):
+            try:
+                fd = os.open(self.part_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(self.part_path) < self.stale_after:
+                        return False
+                    logger.warning(f"清理失效的下载认领: {self.part_path}")
+                    os.remove(self.part_path)
+                except FileNotFoundError:
+                    pass  # 认领者刚好释放
+                continue
+            token = uuid.uuid4().hex
+            try:
+                os.write(fd, token.encode("ascii"))
+            finally:
+                os.close(fd)
+            self._token = token
+            return True
+        return False
+
+    def release(self):
+        """释放认领（.part 已被其他实例当作失效认领重新创建时不删除）。"""
+        token, self._token = self._token, None
+        if token is None:
+            return
+        try:
+            with open(self.part_path, "r", encoding="ascii") as f:
+                owned = f.read() == token
+            if owned:
+                os.remove(self.part_path)
+        except (OSError, UnicodeDecodeError):
+            pass
+
+
+def atomic_write(path: str, content: Union[str, bytes], retries: int = 5):
+    """
+    先写入本进程/线程独有的临时文件，再替换目标文件，其他进程读取时只会看到完整的旧文件或新文件。
+    Windows 下目标文件正被其他进程读取时替换可能失败，短暂等待后重试。
+    """
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    mode = "wb" if isinstance(content, bytes) else "w"
+    with open(tmp_path, mode, **({} if isinstance(content, bytes) else {"encoding": "utf-8"})) as f:
+        f.write(content)
+    for attempt in range(retries):
+        try:
+            os.replace(tmp_path, path)
+            return
+        except PermissionError:
+            if attempt == retries - 1:
+                os.remove(tmp_path)
+                raise
+            time.sleep(0.05 * (attempt + 1))
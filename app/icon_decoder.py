@@ -0,0 +1,116 @@
+# app/icon_decoder.py
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, FrozenSet, Optional, Union
+
+from PyQt5.QtCore import QObject, QTimer, QBuffer, QByteArray, QIODevice, QSize, Qt, pyqtSignal
+from PyQt5.QtGui import QImage, QImageReader
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+ICON_DECODE = metrics.registry.histogram("icon_decode_seconds", "表情图标后台解码耗时（含读取）")
+ICON_BATCH = metrics.registry.histogram("icon_batch_seconds", "UI线程把一批解码结果转换为图标的耗时")
+
+
+def decode_image(source: Union[str, bytes], size: int) -> QImage:
+    """把图片文件或内存中的图片数据解码为不超过 size x size 的 QImage（保持宽高比，可在任意线程调用）。"""
+    if isinstance(source, bytes):
+        buffer = QBuffer()
+        buffer.setData(QByteArray(source))
+        buffer.open(QIODevice.ReadOnly)
+        reader = QImageReader(buffer)
+    else:
+        reader = QImageReader(source)
+    original = reader.size()
+    if original.isValid() and (original.width() > size or original.height() > size):
+        # 解码时直接缩放（JPEG等格式的解码器会跳过多余的像素），缩放后的图片转换为 QPixmap 也更快
+        reader.setScaledSize(original.scaled(QSize(size, size), Qt.KeepAspectRatio))
+    image = reader.read()
+    if not image.isNull() and (image.width() > size or image.height() > size):
+        image = image.scaled(size, size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+    return image
+
+
+class IconDecoder(QObject):
+    """
+    后台解码表情图标：读取和解码在线程池中完成，得到按目标图标大小缩放好的 QImage，
+    UI线程每帧（约16ms）把这一帧内完成的结果一次性交给 images_decoded 信号，只需要转换为 QPixmap。
+    结果字典的值：QImage（静态图片）、(动态图片路径, 缩放好的第一帧 QImage)（交给动画管理器播放）或 None（没有图片，例如正在下载）。
+    is_animated 判断图片文件是否为动态图（通常是动画管理器的 is_animated，检测结果与播放时共用同一份缓存）。
+    """
+    images_decoded = pyqtSignal(dict)  # {图片URL: QImage | (路径, 第一帧) | None}
+    _results_pending = pyqtSignal()
+
+    def __init__(self, is_animated: Callable[[str], bool], workers: int = None, batch_interval: int = 16, parent=None):
+        super().__init__(parent)
+        self._is_animated = is_animated
+        # QImageReader 解码时释放GIL，多个线程可以并行解码；保留一个核心给UI线程
+        workers = workers or max(1, min(4, (os.cpu_count() or 2) - 1))
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="IconDecoder")
+        self._lock = threading.Lock()
+        self._results: Dict[str, object] = {}
+        self._wanted: Optional[FrozenSet[str]] = None  # 仍需要的图片URL（None表示不限制）
+
+        self._flush_timer = QTimer(self)
+        self._flush_timer.setSingleShot(True)
+        self._flush_timer.setInterval(batch_interval)
+        self._flush_timer.timeout.connect(self._flush)
+        # 工作线程发出的信号通过队列连接在UI线程中启动定时器
+        self._results_pending.connect(self._schedule_flush)
+
+    def retain(self, urls):
+        """只保留这些图片URL的解码请求：尚未开始的其他请求直接跳过（例如已经切换到其他表情包）。"""
+        self._wanted = frozenset(urls)
+
+    def submit(self, url: str, load: Callable[[], Union[str, bytes, None]], size: int):
+        """
+        在线程池中调用 load() 取得图片来源（文件路径或图片数据，没有时返回空值），再解码为 size 大小的 QImage。
+        load 本身也在后台线程中执行，可以包含读取缓存、查询打包文件等磁盘操作。
+        """
+        self._executor.submit(self._decode, url, load, size)
+
+    def _decode(self, url: str, load: Callable[[], Union[str, bytes, None]], size: int):
+        wanted = self._wanted
+        if wanted is not None and url not in wanted:
+            return
+        start = time.perf_counter()
+        try:
+            source = load()
+            if not source:
+                result = None
+            elif isinstance(source, str) and self._is_animated(source):
+                # 动态图片交给动画管理器播放，同时解码缩放好的第一帧，播放开始前显示
+                result = (source, decode_image(source, size))
+            else:
+                result = decode_image(source, size)
+                if result.isNull():
+                    result = None
+        except Exception as e:
+            logger.error(f"解码表情图片失败 {url}: {e}")
+            result = None
+        ICON_DECODE.observe(time.perf_counter() - start)
+        with self._lock:
+            first = not self._results
+            self._results[url] = result
+        if first:
+            self._results_pending.emit()
+
+    def _schedule_flush(self):
+        if not self._flush_timer.isActive():
+            self._flush_timer.start()
+
+    def _flush(self):
+        with self._lock:
+            results, self._results = self._results, {}
+        if results:
+            with ICON_BATCH.time():
+                self.images_decoded.emit(results)
+
+    def shutdown(self):
+        """停止接收新的解码请求，丢弃尚未开始的请求。"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -1,14 +1,144 @@
 # app/logger_setup.py
-import logging
 import sys
+import json
+import queue
+import atexit
+import logging
+import threading
+from collections import deque
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, List, Optional
+
+LOG_FORMAT = "%(asctime)s [%(levelname)s] [%(threadName)s] %(name)s: %(message)s"
+
+_listener: Optional[QueueListener] = None
+_ui_log_buffer: Optional["LogRingBuffer"] = None
+_atexit_registered = False
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """
+    只把日志记录放入队列的处理器。
+    标准的 QueueHandler 会在调用线程中格式化消息（为了跨进程序列化），
+    这里记录只在进程内传递，因此把格式化推迟到后台写线程完成。
+    """
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info and not record.exc_text:
+            # 异常回溯必须在异常仍然存在时生成
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """把日志记录格式化为单行JSON，便于离线分析。"""
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage()
+        }
+        if record.exc_text:
+            data["exc"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False)
+
+
+class LogRingBuffer(logging.Handler):
+    """
+    有界环形缓冲区日志处理器，供UI日志面板使用。
+    由后台写线程格式化并写入，UI线程定时调用 drain() 批量取出，
+    超出容量时丢弃最旧的记录，因此日志突发不会拖慢界面。
+    """
+    def __init__(self, capacity: int = 2000):
+        super().__init__()
+        self._lines = deque(maxlen=capacity)
+        self._buffer_lock = threading.Lock()
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            line = self.format(record)
+        except Exception:
+            self.handleError(record)
+            return
+        with self._buffer_lock:
+            self._lines.append(line)
+
+    def drain(self, limit: int = 500) -> List[str]:
+        """取出并返回最多 limit 条尚未显示的日志（超出部分只保留最新的）。"""
+        with self._buffer_lock:
+            lines = list(self._lines)
+            self._lines.clear()
+        return lines[-limit:]
+
+
+def load_logging_options(config_path: str) -> Dict:
+    """
+    从 config.json 中读取日志相关配置，缺省时返回空字典。
+    支持的键：log_level, log_levels（按模块设置级别）, log_json, log_max_bytes, log_backup_count
+    """
+    try:
+        with open(config_path, "r") as f:
+            config = json.load(f)
+    except Exception:
+        return {}
+    keys = {"log_level": "level", "log_levels": "module_levels", "log_json": "json_format",
+            "log_max_bytes": "max_bytes", "log_backup_count": "backup_count"}
+    return {arg: config[key] for key, arg in keys.items() if key in config}
+
+
+def setup_logger(log_file: str = "app.log", level="INFO", module_levels: Dict[str, str] = None,
+                 json_format: bool = False, max_bytes: int = 5 * 1024 * 1024, backup_count: int = 3):
+    """
+    配置应用程序的日志记录器。
+    调用线程只把记录放入队列，格式化、文件写入（按大小轮转）和控制台输出都在后台线程中完成。
+
+    Args:
+        log_file: 日志文件路径
+        level: 根日志级别
+        module_levels: 按模块设置的日志级别，如 {"app.download_manager": "WARNING"}
+        json_format: 是否以JSON格式写入日志文件
+        max_bytes: 单个日志文件的最大字节数，超出后轮转
+        backup_count: 保留的轮转日志文件数量
+    """
+    global _listener, _ui_log_buffer, _atexit_registered
+    if _listener is not None:
+        _listener.stop()
+
+    text_formatter = logging.Formatter(LOG_FORMAT)
+    file_handler = RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+    file_handler.setFormatter(JsonFormatter() if json_format else text_formatter)
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(text_formatter)
+    _ui_log_buffer = LogRingBuffer()
+    _ui_log_buffer.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s", "%H:%M:%S"))
+
+    log_queue = queue.SimpleQueue()
+    _listener = QueueListener(log_queue, file_handler, stream_handler, _ui_log_buffer, respect_handler_level=True)
+    _listener.start()
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(_DeferredQueueHandler(log_queue))
+    root.setLevel(level)
+    for name, module_level in (module_levels or {}).items():
+        logging.getLogger(name).setLevel(module_level)
+
+    if not _atexit_registered:
+        atexit.register(shutdown_logger)
+        _atexit_registered = True
+
+
+def get_ui_log_buffer() -> Optional[LogRingBuffer]:
+    """返回UI日志面板使用的环形缓冲区（未调用 setup_logger 时为 None）。"""
+    return _ui_log_buffer
+
 
-def setup_logger():
-    """配置应用程序的日志记录器"""
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s [%(levelname)s] [%(threadName)s] %(message)s",
-        handlers=[
-            logging.FileHandler("app.log", encoding='utf-8'),
-            logging.StreamHandler(sys.stdout)
-        ]
-    )
\ No newline at end of file
+def shutdown_logger():
+    """停止后台写线程，写出队列中剩余的日志。"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,234 @@
+# app/metrics.py
+import os
+import json
+import time
+import bisect
+import threading
+from typing import Dict, List, Tuple
+
+# 默认的延迟直方图分桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _label_key(labels: Dict[str, str]) -> Tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: Tuple, extra: Tuple = ()) -> str:
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+class _Metric:
+    """指标基类：按标签组合保存数值，所有操作线程安全。"""
+    kind = ""
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple, object] = {}
+
+
+class Counter(_Metric):
+    """只增不减的计数器。"""
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(_label_key(labels), 0)
+
+    def _snapshot(self) -> List[Dict]:
+        with self._lock:
+            return [{"labels": dict(key), "value": value} for key, value in self._values.items()]
+
+    def _prometheus(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{_format_labels(key)} {value}" for key, value in self._values.items()]
+
+
+class Gauge(Counter):
+    """可任意设置的瞬时值（例如队列深度）。"""
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    """分桶直方图，记录次数、总和以及各分桶的累计次数。"""
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"count": 0, "sum": 0.0, "max": 0.0, "buckets": [0] * (len(self.buckets) + 1)}
+            state["count"] += 1
+            state["sum"] += value
+            state["max"] = max(state["max"], value)
+            state["buckets"][index] += 1
+
+    def time(self, **labels) -> "_Timer":
+        """返回一个上下文管理器，在退出时记录经过的秒数。"""
+        return _Timer(self, labels)
+
+    def _quantile(self, state: Dict, q: float) -> float:
+        """根据分桶估计分位数（取所在分桶的上界，不超过观测到的最大值）。"""
+        target = q * state["count"]
+        cumulative = 0
+        for bound, count in zip(self.buckets + (state["max"],), state["buckets"]):
+            cumulative += count
+            if cumulative >= target:
+                return min(bound, state["max"])
+        return state["max"]
+
+    def _snapshot(self) -> List[Dict]:
+        with self._lock:
+            return [{
+                "labels": dict(key),
+                "count": state["count"],
+                "sum": state["sum"],
+                "max": state["max"],
+                "p50": self._quantile(state, 0.5),
+                "p95": self._quantile(state, 0.95),
+                "buckets": dict(zip([str(b) for b in self.buckets] + ["+Inf"], state["buckets"]))
+            } for key, state in self._values.items()]
+
+    def _prometheus(self) -> List[str]:
+        lines = []
+        with self._lock:
+            for key, state in self._values.items():
+                cumulative = 0
+                for bound, count in zip([str(b) for b in self.buckets] + ["+Inf"], state["buckets"]):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_format_labels(key, (('le', bound),))} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {state['sum']}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {state['count']}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: Dict):
+        self._histogram = histogram
+        self._labels = labels
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._histogram.observe(time.perf_counter() - self._start, **self._labels)
+        return False
+
+
+class MetricsRegistry:
+    """
+    指标注册表：按名称创建/获取指标，并导出为JSON快照或Prometheus文本格式。
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+        self.started_at = time.time()
+
+    def _get_or_create(self, cls, name: str, help_text: str, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text, **kwargs)
+            return metric
+
+    def counter(self, name: str, help_text: str = "") -> Counter:
+        return self._get_or_create(Counter, name, help_text)
+
+    def gauge(self, name: str, help_text: str = "") -> Gauge:
+        return self._get_or_create(Gauge, name, help_text)
+
+    def histogram(self, name: str, help_text: str = "", buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help_text, buckets=buckets)
+
+    def snapshot(self) -> Dict:
+        """返回所有指标的JSON可序列化快照。"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {
+            "timestamp": time.time(),
+            "uptime_seconds": time.time() - self.started_at,
+            "metrics": {m.name: {"type": m.kind, "help": m.help, "values": m._snapshot()} for m in metrics}
+        }
+
+    def to_prometheus(self) -> str:
+        """导出为Prometheus文本格式（可供 node_exporter textfile collector 读取）。"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            if metric.help:
+                lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric._prometheus())
+        return "\n".join(lines) + "\n"
+
+    def export(self, path: str):
+        """
+        把当前指标写入文件：.json 后缀写JSON快照，其他后缀写Prometheus文本。
+        先写临时文件再替换，避免读取方看到写了一半的文件。
+        """
+        if path.endswith(".json"):
+            content = json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+        else:
+            content = self.to_prometheus()
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+    def render_text(self) -> str:
+        """生成便于人阅读的指标摘要，用于诊断对话框。"""
+        snapshot = self.snapshot()
+        lines = [f"运行时间: {snapshot['uptime_seconds']:.0f} 秒", ""]
+        for name, metric in sorted(snapshot["metrics"].items()):
+            lines.append(f"[{name}] {metric['help']}")
+            for entry in metric["values"]:
+                labels = ", ".join(f"{k}={v}" for k, v in entry["labels"].items()) or "-"
+                if metric["type"] == "histogram":
+                    avg = entry["sum"] / entry["count"] if entry["count"] else 0
+                    lines.append(f"    {labels}: 次数={entry['count']} 平均={avg * 1000:.1f}ms "
+                                 f"p50≤{entry['p50'] * 1000:.0f}ms p95≤{entry['p95'] * 1000:.0f}ms "
+                                 f"最大={entry['max'] * 1000:.1f}ms")
+                else:
+                    lines.append(f"    {labels}: {entry['value']}")
+            lines.append("")
+        return "\n".join(lines)
+
+
+# 全局指标注册表
+registry = MetricsRegistry()
+
+# 应用使用的指标
+API_LATENCY = registry.histogram("bili_api_request_seconds", "B站API请求延迟（按接口）")
+API_REQUESTS = registry.counter("bili_api_requests_total", "B站API请求次数（按接口和结果）")
+DOWNLOAD_LATENCY = registry.histogram("image_download_seconds", "表情图片下载延迟")
+DOWNLOAD_BYTES = registry.counter("image_download_bytes_total", "表情图片下载字节数")
+DOWNLOADS = registry.counter("image_downloads_total", "表情图片下载次数（按结果）")
+CACHE_LOOKUPS = registry.counter("cache_lookups_total", "缓存查询次数（按缓存类型和命中情况）")
+QUEUE_DEPTH = registry.gauge("queue_depth", "队列深度（按队列）")
+SENDS = registry.counter("danmu_sends_total", "表情发送次数（按结果）")
+SEND_LATENCY = registry.histogram("danmu_send_seconds", "表情发送请求延迟")
+UI_STALL = registry.histogram("ui_event_loop_lag_seconds", "UI线程事件循环延迟",
+                              buckets=(0.016, 0.033, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0))
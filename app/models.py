@@ -6,13 +6,34 @@ import json
 import logging
 import threading
 from queue import Queue
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import List, Dict, Union, Tuple
 from PyQt5.QtCore import QObject, pyqtSignal
 
 # 从同级目录的 config.py 中导入配置
 from . import config
+from . import metrics
 from .download_manager import DownloadManager
+from .download_journal import DownloadJournal
+from .emote_records import Emote, EmotePackage
+from .search_index import EmoticonSearchIndex
+from .usage_store import UsageStore, emote_key
+from .send_plan import PresetStore
+from .send_payload import SendPayloadCache, parse_cookie_value
+from .pack_store import PackStore
+from .offline import ConnectivityMonitor, OfflineSendQueue
+from .resilience import ResilientClient, CircuitOpenError, SingleFlight
+from .file_lock import FileLock, atomic_write
+
+logger = logging.getLogger(__name__)
+
+FREQUENT_PACKAGE_ID = "__frequent__"  # 虚拟"常用"表情包的ID
+RATE_LIMIT_CODES = {10030, 10031, -412}  # 发送弹幕接口表示频率限制的业务错误码
+RATE_LIMIT_HTTP_STATUS = {412, 429}  # 表示频率限制的HTTP状态码
+SEND_TIMEOUT = (3, 10)  # 发送弹幕请求的（连接, 读取）超时（秒）
+SEND_TIMEOUT_MESSAGE = "发送请求超时"  # 发送超时时 send_emoticon 返回的消息
+PACKAGE_SOURCE_NAMES = {"user": "用户表情包", "live": "直播间表情包", "upower": "充电表情包"}  # 表情包来源的显示名称
 
 class EmoticonManager(QObject):
     """
@@ -22,13 +43,23 @@ class EmoticonManager(QObject):
     # 信号：下载完成时发出
     download_completed = pyqtSignal(str, str, str)  # url, emoticon_id, local_path
     download_failed = pyqtSignal(str, str, str)     # url, emoticon_id, error_message
+    # 信号：在线/离线状态变化时发出（可能由后台线程发出）
+    connectivity_changed = pyqtSignal(bool)
+    # 信号：分块获取用户表情包详情时，每块返回后发出已获取的表情包（由后台线程发出）
+    emoticons_partial = pyqtSignal(int, object)  # room_id, {pkg_id: EmotePackage}
 
     def __init__(self):
         super().__init__()
-        self.emoticons = {}  # 内存中存储当前加载的表情包数据
+        self.emoticons: Dict[Union[int, str], EmotePackage] = {}  # 内存中存储当前加载的表情包数据
         self.cookie = config.DEFAULT_COOKIE
         self.user_agent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
         self.download_manager = None  # 下载管理器
+        self._payload_cache = SendPayloadCache(self.user_agent)  # 发送载荷缓存（按Cookie失效）
+        # 发送弹幕使用的长连接会话：复用已建立的TCP/TLS连接，每次发送不再重新握手
+        self._send_session = requests.Session()
+        self.search_index = EmoticonSearchIndex()  # 跨表情包搜索索引
+        self._emotes_by_key: Dict[str, Emote] = {}  # 当前加载的表情索引 {类型:ID: Emote}，用于解析收藏和常用表情
+        self._emotes_by_id: Dict[str, Emote] = {}  # {ID: Emote}，ID在不同类型间重复时保留先加载的表情
 
         # 批量映射更新系统
         self._pending_mappings = defaultdict(dict)  # 待处理的映射更新 {mapping_file: {emoticon_id: package_name}}
@@ -40,17 +71,51 @@ class EmoticonManager(QObject):
         self._room_cache_file = os.path.join(config.DATA_CACHE_DIR, "room_cache.json")
         self._room_cache = {}  # 内存缓存 {room_id: {"uid": uid, "name": name}}
         self._room_cache_lock = threading.Lock()  # 缓存锁
+        self._room_cache_mtime = None  # 最近一次读取/写入时文件的修改时间，用于发现其他实例的更新
 
         self._setup_cache()
         self._load_room_cache()
 
+        # 表情收藏与使用频率统计、发送组合预设
+        self.usage_store = UsageStore()
+        self.preset_store = PresetStore()
+
+        # 表情包缩略图打包文件（每个表情包一个内存映射文件）
+        self.pack_enabled = True
+        self.pack_store = PackStore()
+        self._pack_dirs: Dict[str, str] = {}  # {表情包缓存目录: 表情包名称}，用于下载完成后重建打包文件
+
+        # 离线模式：网络状态监视和离线期间的待发送队列
+        self.connectivity = ConnectivityMonitor(on_change=self.connectivity_changed.emit)
+        self.offline_sends = OfflineSendQueue()
+
+        # API请求容错层（重试、熔断、对冲），以及最近一次加载中获取失败的表情包来源
+        self.api = ResilientClient()
+        # 房间号→UID、UID→主播名称查询的合并层：并发和重复的查询只发出一次请求，失败结果短暂缓存
+        self._lookups = SingleFlight(ttl=300.0, negative_ttl=30.0)
+        self.last_load_failures: List[str] = []
+
+        # 表情包分层缓存：用户表情包只与账号有关；直播间/充电表情包按直播间缓存最近使用的若干个
+        self._tier_lock = threading.Lock()
+        self._user_tier = None  # {"cookie", "packages", "fetched_at", "generation"}
+        self._user_tier_generation = 0
+        self._room_tiers: "OrderedDict[int, Dict]" = OrderedDict()  # {房间号: {"up_name", "packages", "fetched_at", "combined", "user_generation"}}
+        self.user_tier_ttl = 600.0  # 用户表情包缓存有效期（秒）
+        self.room_tier_ttl = 300.0  # 直播间表情包缓存有效期（秒）
+        self.max_cached_rooms = 8
+        # 表情包详情分块获取：每次请求的表情包数量上限和同时进行的请求数
+        self.package_chunk_size = 20
+        self.package_fetch_parallel = 4
+
     def _setup_cache(self):
         """创建缓存目录（如果不存在）。"""
         os.makedirs(config.IMAGE_CACHE_DIR, exist_ok=True)
         os.makedirs(config.DATA_CACHE_DIR, exist_ok=True)
         # 创建映射文件目录
         os.makedirs(os.path.join(config.DATA_CACHE_DIR, "mappings"), exist_ok=True)
-        logging.info("缓存目录已准备就绪。")
+        # 创建表情包元数据快照目录（离线模式使用）
+        os.makedirs(os.path.join(config.DATA_CACHE_DIR, "snapshots"), exist_ok=True)
+        logger.info("缓存目录已准备就绪。")
 
     def _load_room_cache(self):
         """
@@ -58,25 +123,48 @@ class EmoticonManager(QObject):
         """
         try:
             if os.path.exists(self._room_cache_file):
-                with open(self._room_cache_file, 'r', encoding='utf-8') as f:
-                    self._room_cache = json.load(f)
-                logging.info(f"房间缓存已加载，共 {len(self._room_cache)} 条记录")
+                self._room_cache = self._read_room_cache_file()
+                logger.info(f"房间缓存已加载，共 {len(self._room_cache)} 条记录")
             else:
-                logging.info("房间缓存文件不存在，将创建新缓存")
+                logger.info("房间缓存文件不存在，将创建新缓存")
         except Exception as e:
-            logging.error(f"加载房间缓存失败: {e}")
+            logger.error(f"加载房间缓存失败: {e}")
             self._room_cache = {}
 
+    def _read_room_cache_file(self) -> Dict:
+        """读取房间缓存文件并记录其修改时间。"""
+        mtime = os.stat(self._room_cache_file).st_mtime_ns
+        with open(self._room_cache_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        self._room_cache_mtime = mtime
+        return data
+
+    def _merge_room_cache_from_disk(self) -> bool:
+        """
+        文件被其他实例修改过时，把文件中的记录合并到内存缓存。调用方需持有 _room_cache_lock。
+        返回是否合并了新数据。
+        """
+        try:
+            if os.stat(self._room_cache_file).st_mtime_ns == self._room_cache_mtime:
+                return False
+            self._room_cache.update(self._read_room_cache_file())
+            return True
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            logger.error(f"重新读取房间缓存失败: {e}")
+            return False
+
     def _save_room_cache(self):
         """
-        保存房间号-UID-名称缓存到文件。
+        保存房间号-UID-名称缓存到文件（原子替换）。调用方需持有跨进程文件锁。
         """
         try:
-            with open(self._room_cache_file, 'w', encoding='utf-8') as f:
-                json.dump(self._room_cache, f, ensure_ascii=False, indent=2)
-            logging.debug(f"房间缓存已保存，共 {len(self._room_cache)} 条记录")
+            atomic_write(self._room_cache_file, json.dumps(self._room_cache, ensure_ascii=False, indent=2))
+            self._room_cache_mtime = os.stat(self._room_cache_file).st_mtime_ns
+            logger.debug(f"房间缓存已保存，共 {len(self._room_cache)} 条记录")
         except Exception as e:
-            logging.error(f"保存房间缓存失败: {e}")
+            logger.error(f"保存房间缓存失败: {e}")
 
     def _update_room_cache(self, room_id: int, uid: int, name: str):
         """
@@ -88,12 +176,15 @@ class EmoticonManager(QObject):
             name: 主播名称
         """
         with self._room_cache_lock:
-            room_id_str = str(room_id)
-            self._room_cache[room_id_str] = {
-                "uid": uid,
-                "name": name
-            }
-            self._save_room_cache()
+            try:
+                with FileLock.for_path(self._room_cache_file):
+                    # 先合并其他实例写入的记录，避免覆盖它们
+                    self._merge_room_cache_from_disk()
+                    self._room_cache[str(room_id)] = {"uid": uid, "name": name}
+                    self._save_room_cache()
+            except TimeoutError as e:
+                logger.error(f"更新房间缓存失败: {e}")
+                self._room_cache[str(room_id)] = {"uid": uid, "name": name}
 
     def _get_cached_room_info(self, room_id: int) -> Tuple[Union[int, None], Union[str, None]]:
         """
@@ -107,9 +198,14 @@ class EmoticonManager(QObject):
         """
         room_id_str = str(room_id)
         with self._room_cache_lock:
+            if room_id_str not in self._room_cache:
+                # 其他实例可能已经查询过这个房间
+                self._merge_room_cache_from_disk()
             if room_id_str in self._room_cache:
+                metrics.CACHE_LOOKUPS.inc(cache="room", result="hit")
                 cache_data = self._room_cache[room_id_str]
                 return cache_data.get("uid"), cache_data.get("name")
+        metrics.CACHE_LOOKUPS.inc(cache="room", result="miss")
         return None, None
 
     def get_cached_rooms(self) -> List[Dict[str, str]]:
@@ -166,22 +262,23 @@ class EmoticonManager(QObject):
             updates: 要更新的映射 {emoticon_id: package_name}
         """
         try:
-            # 读取现有映射
-            existing_mappings = {}
-            if os.path.exists(mapping_file):
-                with open(mapping_file, 'r', encoding='utf-8') as f:
-                    existing_mappings = json.load(f)
+            # 读取-合并-写入在跨进程锁内完成，避免多个实例互相覆盖对方的更新
+            with FileLock.for_path(mapping_file):
+                # 读取现有映射
+                existing_mappings = {}
+                if os.path.exists(mapping_file):
+                    with open(mapping_file, 'r', encoding='utf-8') as f:
+                        existing_mappings = json.load(f)
 
-            # 合并更新（新值覆盖旧值）
-            existing_mappings.update(updates)
+                # 合并更新（新值覆盖旧值）
+                existing_mappings.update(updates)
 
-            # 写入合并后的映射
-            with open(mapping_file, 'w', encoding='utf-8') as f:
-                json.dump(existing_mappings, f, ensure_ascii=False, indent=2)
+                # 写入合并后的映射（原子替换，其他实例读取时不会看到写了一半的文件）
+                atomic_write(mapping_file, json.dumps(existing_mappings, ensure_ascii=False, indent=2))
 
-            logging.debug(f"批量更新映射文件 {mapping_file}: {len(updates)} 个更新")
+            logger.debug("批量更新映射文件 %s: %d 个更新", mapping_file, len(updates))
         except Exception as e:
-            logging.error(f"批量更新映射文件失败 {mapping_file}: {e}")
+            logger.error(f"批量更新映射文件失败 {mapping_file}: {e}")
             # 如果失败，将更新重新加入待处理队列
             with self._mapping_lock:
                 self._pending_mappings[mapping_file].update(updates)
@@ -212,28 +309,35 @@ class EmoticonManager(QObject):
         return os.path.join(config.DATA_CACHE_DIR, "mappings", f"{sanitized_name}.json")
 
     def set_cookie(self, cookie: str):
-        """设置请求时使用的Cookie。"""
+        """设置请求时使用的Cookie。切换账号时丢弃按直播间缓存的表情包（解锁状态与账号有关）。"""
+        if cookie != self.cookie:
+            with self._tier_lock:
+                self._room_tiers.clear()
         self.cookie = cookie
 
-    def init_download_manager(self, max_threads: int = 4):
-        """初始化下载管理器"""
+    def init_download_manager(self, max_threads: int = 16, min_threads: int = 1):
+        """初始化下载管理器（工作线程数在 min_threads 到 max_threads 之间自动调整）"""
         if self.download_manager:
             self.download_manager.shutdown()
 
-        self.download_manager = DownloadManager(self, max_threads)
+        self.download_manager = DownloadManager(self, max_threads, min_threads, journal=DownloadJournal())
         # 连接下载管理器的信号到模型的信号
         self.download_manager.download_completed.connect(self.download_completed)
+        self.download_manager.download_completed.connect(self._on_image_downloaded)
         self.download_manager.download_failed.connect(self.download_failed)
-        logging.info(f"下载管理器已初始化，最大工作线程数: {max_threads}")
+        # 继续上次退出时未完成的下载（信号已连接，完成后照常重建打包文件）
+        for task in self.download_manager.resume():
+            self._pack_dirs[os.path.dirname(task.local_path)] = task.package_name
+        logger.info(f"下载管理器已初始化，工作线程数: {min_threads}-{max_threads}")
 
     def get_csrf_from_cookie(self) -> str:
-        """从Cookie字符串中提取bili_jct (csrf_token)。"""
-        try:
-            cookie_dict = {pair.split('=', 1)[0].strip(): pair.split('=', 1)[1] for pair in self.cookie.split(';') if '=' in pair}
-            return cookie_dict.get('bili_jct', '')
-        except Exception as e:
-            logging.error(f"从Cookie中解析CSRF失败: {e}")
-            return ''
+        """从Cookie字符串中提取bili_jct (csrf_token)，结果按Cookie缓存。"""
+        return self._payload_cache.csrf(self.cookie)
+
+    @property
+    def account_id(self) -> str:
+        """当前Cookie所属账号的UID（DedeUserID），用于区分多个实例共享的离线发送记录。"""
+        return parse_cookie_value(self.cookie, 'DedeUserID')
 
     def get_emoticon_image(self, url: str, emoticon_id, package_name: str = None) -> str:
         """
@@ -246,7 +350,7 @@ class EmoticonManager(QObject):
             file_extension = ".png"
 
         # 统一ID格式为字符串，避免路径问题
-        emoticon_id_str = str(emoticon_id).replace(":", "_").replace("/", "_")
+        emoticon_id_str = self._cache_file_id(emoticon_id)
 
         # 如果没有提供包名
         if not package_name:
@@ -272,123 +376,249 @@ class EmoticonManager(QObject):
         should_refresh = self._should_refresh_cache(mapping_file, emoticon_id_str, package_name)
 
         if os.path.exists(local_path) and not should_refresh:
-            logging.debug(f"图片在缓存中找到: {local_path}")
+            metrics.CACHE_LOOKUPS.inc(cache="image", result="hit")
+            logger.debug("图片在缓存中找到: %s", local_path)
+            if self.pack_enabled:
+                # 已缓存的图片还没有打包（例如升级前下载的缓存），安排后台打包
+                pack = self.pack_store.get(package_cache_dir)
+                if pack is None or emoticon_id_str not in pack:
+                    self._schedule_pack_build(package_name)
             return local_path
+        metrics.CACHE_LOOKUPS.inc(cache="image", result="miss")
+
+        if not self.connectivity.online:
+            # 离线模式：不下载未缓存的图片
+            return ""
 
         # 如果没有下载管理器，使用同步下载
         if not self.download_manager:
-            logging.info(f"正在下载图片: {url}")
+            logger.debug("正在下载图片: %s", url)
             try:
                 response = requests.get(url, timeout=10, headers={"User-Agent": self.user_agent})
                 response.raise_for_status()
-                with open(local_path, 'wb') as f:
-                    f.write(response.content)
+                atomic_write(local_path, response.content)
 
                 # 更新映射文件
                 self._update_mapping_file(mapping_file, emoticon_id_str, package_name)
 
-                logging.info(f"图片已下载并缓存至: {local_path}")
+                logger.debug("图片已下载并缓存至: %s", local_path)
                 return local_path
             except requests.RequestException as e:
-                logging.error(f"下载图片失败 {url}: {e}")
+                logger.error(f"下载图片失败 {url}: {e}")
                 return "" # 下载失败返回空字符串
         else:
             # 使用下载管理器异步下载
             if self.download_manager.add_download_task(local_path ,url, emoticon_id_str, package_name, priority=0):
                 # 更新映射文件
                 self._update_mapping_file(mapping_file, emoticon_id_str, package_name)
-                logging.debug(f"已添加下载任务: {url}")
+                self._pack_dirs[package_cache_dir] = package_name
+                logger.debug("已添加下载任务: %s", url)
             return ""  # 异步下载，暂时返回空路径
 
+    def _cache_file_id(self, emoticon_id) -> str:
+        """表情ID在缓存文件名中的形式。"""
+        return str(emoticon_id).replace(":", "_").replace("/", "_")
+
+    def get_packed_icon(self, emote: Emote) -> Union[bytes, None]:
+        """
+        从表情包的打包文件中读取表情图片数据（未启用、未打包或不在包中时返回None）。
+        打开一个表情包时只需要一次 open + mmap，不再为每个表情检查映射文件和图片文件。
+        """
+        if not self.pack_enabled:
+            return None
+        return self.pack_store.read(self._get_package_cache_dir(emote.package_name), self._cache_file_id(emote.id))
+
+    def _schedule_pack_build(self, package_name: str):
+        """安排在后台重建表情包的打包文件（多次请求会合并）。"""
+        sanitized_name = self._get_sanitized_package_name(package_name)
+        mapping_file = self._get_mapping_file_path(package_name)
+        self.pack_store.schedule_build(self._get_package_cache_dir(package_name), f"_{sanitized_name}",
+                                       lambda: self._get_valid_pack_ids(mapping_file, package_name))
+
+    def _get_valid_pack_ids(self, mapping_file: str, package_name: str):
+        """返回映射文件中属于该表情包的表情ID集合（没有映射文件时返回None，不过滤）。"""
+        with self._mapping_lock:
+            mappings = dict(self._pending_mappings.get(mapping_file, {}))
+        try:
+            if os.path.exists(mapping_file):
+                with open(mapping_file, 'r', encoding='utf-8') as f:
+                    mappings = dict(json.load(f), **mappings)
+        except Exception as e:
+            logger.error(f"读取映射文件失败 {mapping_file}: {e}")
+        if not mappings:
+            return None
+        return {emoticon_id for emoticon_id, name in mappings.items() if name == package_name}
+
+    def _on_image_downloaded(self, url: str, emoticon_id: str, local_path: str):
+        """图片下载完成后安排重建所属表情包的打包文件。"""
+        package_name = self._pack_dirs.get(os.path.dirname(local_path))
+        if self.pack_enabled and package_name:
+            self._schedule_pack_build(package_name)
+
     # --- 以下是所有与Bilibili API交互的方法 ---
 
-    def get_user_emoticons(self) -> List[Dict]:
-        """获取用户表情包列表 (带缓存)。"""
+    def _api_get(self, endpoint: str, url: str, **kwargs) -> requests.Response:
+        """
+        所有API GET请求的统一入口：经过容错层（重试、熔断、对冲）发出请求，记录每个接口的延迟和结果指标。
+
+        Args:
+            endpoint: 接口名称（用作指标标签和熔断器名称）
+            url: 请求地址
+            **kwargs: 传给 requests.get 的其他参数
+        """
+        if not self.connectivity.online:
+            # 离线时直接失败，不再请求已经无法连接的接口
+            metrics.API_REQUESTS.inc(endpoint=endpoint, outcome="offline")
+            raise requests.ConnectionError("离线模式")
+
+        start = time.perf_counter()
+        try:
+            response = self.api.get(endpoint, url, **kwargs)
+        except CircuitOpenError:
+            metrics.API_REQUESTS.inc(endpoint=endpoint, outcome="circuit_open")
+            raise
+        except (requests.ConnectionError, requests.Timeout):
+            metrics.API_REQUESTS.inc(endpoint=endpoint, outcome="exception")
+            self.connectivity.record_failure()
+            raise
+        except Exception:
+            metrics.API_REQUESTS.inc(endpoint=endpoint, outcome="exception")
+            raise
+        finally:
+            metrics.API_LATENCY.observe(time.perf_counter() - start, endpoint=endpoint)
+        self.connectivity.record_success()
+        metrics.API_REQUESTS.inc(endpoint=endpoint, outcome="ok" if response.ok else f"http_{response.status_code}")
+        return response
+
+    def get_user_emoticons(self) -> Union[List[Dict], None]:
+        """获取用户表情包列表 (带缓存)。请求失败时返回None，成功但没有表情包时返回空列表。"""
         headers = {"Cookie": self.cookie, "User-Agent": self.user_agent}
         try:
-            response = requests.get(config.GET_USER_EMOTICON_API, params={"business": "reply"}, headers=headers, timeout=10)
+            response = self._api_get("user_emoticons", config.GET_USER_EMOTICON_API, params={"business": "reply"}, headers=headers, timeout=10)
             response.raise_for_status()
             data = response.json()
             if data["code"] == 0:
-                logging.info("成功获取用户表情包列表。")
+                logger.info("成功获取用户表情包列表。")
                 return data["data"]["packages"]
             else:
-                logging.error(f"获取用户表情包失败: {data['message']}")
-                return []
+                logger.error(f"获取用户表情包失败: {data['message']}")
+                return None
         except Exception as e:
-            logging.error(f"获取用户表情包异常: {e}")
-            return []
+            logger.error(f"获取用户表情包异常: {e}")
+            return None
 
-    def get_emoticon_package(self, package_ids: List[int]) -> List[Dict]:
-        """获取指定表情包的详细信息 (带缓存)。"""
+    def get_emoticon_package(self, package_ids: List[int]) -> Union[List[Dict], None]:
+        """获取指定表情包的详细信息 (带缓存)。请求失败时返回None，成功但没有表情包时返回空列表。"""
         headers = {"Cookie": self.cookie, "User-Agent": self.user_agent}
         try:
-            response = requests.get(config.GET_EMOTICON_PACKAGE_API, params={"business": "reply", "ids": ",".join(map(str, package_ids))}, headers=headers, timeout=10)
+            response = self._api_get("emoticon_package", config.GET_EMOTICON_PACKAGE_API, params={"business": "reply", "ids": ",".join(map(str, package_ids))}, headers=headers, timeout=10)
             response.raise_for_status()
             data = response.json()
             if data["code"] == 0:
-                logging.info(f"成功获取表情包详情: {package_ids}")
+                logger.info(f"成功获取表情包详情: {package_ids}")
                 return data["data"]["packages"]
             else:
-                logging.error(f"获取表情包详情失败: {data['message']}")
-                return []
+                logger.error(f"获取表情包详情失败: {data['message']}")
+                return None
         except Exception as e:
-            logging.error(f"获取表情包详情异常: {e}")
-            return []
+            logger.error(f"获取表情包详情异常: {e}")
+            return None
+
+    def fetch_package_details(self, package_ids: List[int], on_chunk=None) -> Tuple[List[Dict], List[int]]:
+        """
+        分块并行获取表情包详情，避免一个超长的请求地址，也避免一个请求失败导致所有表情包都丢失。
+        每块最多 package_chunk_size 个ID，最多 package_fetch_parallel 块同时请求；
+        失败的块在本轮其他块完成后再重试一次。
 
-    def get_live_emoticons(self, room_id: int) -> List[Dict]:
-        """获取直播间表情包 (带缓存)。"""
+        Args:
+            package_ids: 表情包ID列表
+            on_chunk: 可选，每块成功返回后（在调用线程中）以该块的详情列表调用
+
+        Returns:
+            (已获取的详情列表, 获取失败的表情包ID列表)
+        """
+        size = max(1, self.package_chunk_size)
+        chunks = [package_ids[i:i + size] for i in range(0, len(package_ids), size)]
+        details: List[Dict] = []
+
+        def fetch(pending: List[List[int]]) -> List[List[int]]:
+            failed = []
+            with ThreadPoolExecutor(max_workers=min(self.package_fetch_parallel, len(pending)),
+                                    thread_name_prefix="PackageDetail") as pool:
+                futures = {pool.submit(self.get_emoticon_package, chunk): chunk for chunk in pending}
+                for future in as_completed(futures):
+                    result = future.result()
+                    if result is None:
+                        failed.append(futures[future])
+                        continue
+                    details.extend(result)
+                    if on_chunk is not None:
+                        on_chunk(result)
+            return failed
+
+        failed_chunks = fetch(chunks) if chunks else []
+        if failed_chunks:
+            logger.warning(f"{len(failed_chunks)}/{len(chunks)} 块表情包详情获取失败，重试一次")
+            failed_chunks = fetch(failed_chunks)
+        return details, [pkg_id for chunk in failed_chunks for pkg_id in chunk]
+
+    def get_live_emoticons(self, room_id: int) -> Union[List[Dict], None]:
+        """获取直播间表情包 (带缓存)。请求失败时返回None，成功但没有表情包时返回空列表。"""
         headers = {"Cookie": self.cookie, "User-Agent": self.user_agent}
         try:
-            response = requests.get(config.GET_LIVE_EMOTICON_API, params={"platform": "android", "room_id": room_id}, headers=headers, timeout=10)
+            response = self._api_get("live_emoticons", config.GET_LIVE_EMOTICON_API, params={"platform": "android", "room_id": room_id}, headers=headers, timeout=10)
             response.raise_for_status()
             data = response.json()
             if data["code"] == 0:
-                logging.info(f"成功获取直播间 {room_id} 的表情包。")
+                logger.info(f"成功获取直播间 {room_id} 的表情包。")
                 return data["data"]["data"]
             else:
-                logging.error(f"获取直播间表情包失败: {data['message']}")
-                return []
+                logger.error(f"获取直播间表情包失败: {data['message']}")
+                return None
         except Exception as e:
-            logging.error(f"获取直播间表情包异常: {e}")
-            return []
+            logger.error(f"获取直播间表情包异常: {e}")
+            return None
 
     def get_UP_UID(self, room_id: int) -> int:
-        """获取直播间主播的UID (带缓存)。"""
+        """获取直播间主播的UID (带缓存)，同时获取主播名称写入房间缓存。失败时返回0。"""
         # 首先尝试从缓存获取
         cached_uid, cached_name = self._get_cached_room_info(room_id)
         if cached_uid is not None:
-            logging.debug(f"从缓存获取房间 {room_id} 的主播UID: {cached_uid}")
+            logger.debug("从缓存获取房间 %s 的主播UID: %s", room_id, cached_uid)
             return cached_uid
 
-        # 缓存中没有，从API获取
+        # 缓存中没有，从API获取（同一房间的并发/重复查询只请求一次）
+        uid = self._lookups.do(("uid", room_id), self._fetch_up_uid, room_id)
+        if uid:
+            # 获取主播名称并更新缓存
+            up_name = self._get_up_name_from_api(uid)
+            if up_name:
+                self._update_room_cache(room_id, uid, up_name)
+        return uid
+
+    def _fetch_up_uid(self, room_id: int) -> int:
+        """请求直播间信息接口获取主播UID，失败时返回0。"""
         headers = {"User-Agent": self.user_agent}
         try:
-            response = requests.get(config.GET_LIVE_INFORMATION, params={"room_id": room_id}, headers=headers, timeout=10)
+            response = self._api_get("live_info", config.GET_LIVE_INFORMATION, params={"room_id": room_id}, headers=headers, timeout=10)
             response.raise_for_status()
             data = response.json()
             if data["code"] == 0:
                 uid = data["data"]["uid"]
-                logging.info(f"成功获取房间 {room_id} 的主播UID: {uid}")
-
-                # 获取主播名称并更新缓存
-                up_name = self._get_up_name_from_api(uid)
-                if up_name:
-                    self._update_room_cache(room_id, uid, up_name)
-
+                logger.info(f"成功获取房间 {room_id} 的主播UID: {uid}")
                 return uid
             else:
-                logging.error(f"获取主播UID失败: {data['message']}")
+                logger.error(f"获取主播UID失败: {data['message']}")
                 return 0
         except Exception as e:
-            logging.error(f"获取主播UID异常: {e}")
+            logger.error(f"获取主播UID异常: {e}")
             return 0
 
-    def get_charge_emoticons(self, mid: int) -> Tuple[Union[Dict, None], Dict]:
-        """获取充电专属表情包 (带缓存)。"""
+    def get_charge_emoticons(self, mid: int) -> Tuple[Union[Dict, None], Union[Dict, None]]:
+        """获取充电专属表情包 (带缓存)。请求失败时返回 (None, None)，主播没有充电表情包时返回 (None, {})。"""
         headers = {"Cookie": self.cookie, "User-Agent": self.user_agent}
         try:
-            response = requests.get(config.GET_CHARGE_EMOTICON_API, params={"up_mid": mid}, headers=headers, timeout=10)
+            response = self._api_get("charge_emoticons", config.GET_CHARGE_EMOTICON_API, params={"up_mid": mid}, headers=headers, timeout=10)
             response.raise_for_status()
             data = response.json()
             
@@ -400,21 +630,21 @@ class EmoticonManager(QObject):
                 privilege_rights = data["data"]["privilege_rights"]
                 # 筛选出已解锁的表情包详情
                 result = {str(k): privilege_rights[str(k)] for k in data_type if str(k) in privilege_rights and not privilege_rights[str(k)].get('emote', {}).get('locked')}
-                logging.info(f"成功获取主播 {mid} 的充电表情包。")
+                logger.info(f"成功获取主播 {mid} 的充电表情包。")
                 return data_list, result
             elif data["code"] == 203010:
-                logging.warning(f"主播 {mid} 没有充电专属表情包。")
+                logger.warning(f"主播 {mid} 没有充电专属表情包。")
                 return None, {}
             else:
-                logging.error(f"获取主播充电表情包失败: {data['message']}")
-                return None, {}
+                logger.error(f"获取主播充电表情包失败: {data['message']}")
+                return None, None
         except Exception as e:
-            logging.error(f"获取主播充电表情包异常: {e}")
-            return None, {}
+            logger.error(f"获取主播充电表情包异常: {e}")
+            return None, None
 
     def _get_up_name_from_api(self, uid: int) -> str:
         """
-        通过UID从API获取主播名称。
+        通过UID从API获取主播名称（同一UID的并发/重复查询只请求一次）。
 
         Args:
             uid: 主播UID
@@ -422,20 +652,24 @@ class EmoticonManager(QObject):
         Returns:
             主播名称，如果获取失败则返回空字符串
         """
+        return self._lookups.do(("name", uid), self._fetch_up_name, uid)
+
+    def _fetch_up_name(self, uid: int) -> str:
+        """请求主播信息接口获取主播名称，失败时返回空字符串。"""
         headers = {"User-Agent": self.user_agent}
         try:
-            response = requests.get(config.GET_UP_INFORMATION, params={"uid": uid}, headers=headers, timeout=10)
+            response = self._api_get("up_info", config.GET_UP_INFORMATION, params={"uid": uid}, headers=headers, timeout=10)
             response.raise_for_status()
             data = response.json()
             if data["code"] == 0:
                 up_name = data["data"]["info"]["uname"]
-                logging.info(f"成功获取主播 {uid} 的名称: {up_name}")
+                logger.info(f"成功获取主播 {uid} 的名称: {up_name}")
                 return up_name
             else:
-                logging.warning(f"获取主播名称失败: {data['message']}")
+                logger.warning(f"获取主播名称失败: {data['message']}")
                 return ""
         except Exception as e:
-            logging.error(f"获取主播名称异常: {e}")
+            logger.error(f"获取主播名称异常: {e}")
             return ""
 
     def _get_up_name_from_room(self, room_id: int) -> str:
@@ -446,29 +680,20 @@ class EmoticonManager(QObject):
         # 首先尝试从缓存获取
         cached_uid, cached_name = self._get_cached_room_info(room_id)
         if cached_name is not None:
-            logging.debug(f"从缓存获取房间 {room_id} 的主播名称: {cached_name}")
+            logger.debug("从缓存获取房间 %s 的主播名称: %s", room_id, cached_name)
             return cached_name
 
-        # 缓存中没有名称，但可能有UID
-        if cached_uid is not None:
-            # 有UID但没有名称，通过API获取名称
-            up_name = self._get_up_name_from_api(cached_uid)
+        # 缓存中有UID但没有名称时直接查询名称；否则先查询UID（会同时查询名称并写入缓存）
+        up_uid = cached_uid if cached_uid is not None else self.get_UP_UID(room_id)
+        if up_uid:
+            up_name = self._get_up_name_from_api(up_uid)
             if up_name:
-                self._update_room_cache(room_id, cached_uid, up_name)
+                if cached_uid is not None:
+                    self._update_room_cache(room_id, up_uid, up_name)
                 return up_name
 
-        # 缓存中什么都没有，通过常规流程获取
-        try:
-            up_UID = self.get_UP_UID(room_id)
-            if up_UID:
-                up_name = self._get_up_name_from_api(up_UID)
-                if up_name:
-                    return up_name
-        except Exception as e:
-            logging.error(f"获取主播名称异常，使用房间ID: {room_id}, 错误: {e}")
-
         # 所有方法都失败，返回房间ID
-        logging.warning(f"获取主播名称失败，使用房间ID: {room_id}")
+        logger.warning(f"获取主播名称失败，使用房间ID: {room_id}")
         return str(room_id)
 
     def _apply_special_package_renaming(self, package_name: str, package_type: str, room_id: int, up_name: str = None) -> str:
@@ -502,57 +727,178 @@ class EmoticonManager(QObject):
 
         return package_name
 
-    def load_all_emoticons(self, room_id: int) -> Dict:
+    def load_all_emoticons(self, room_id: int, force_refresh: bool = False) -> Dict:
         """
         核心方法：加载并整合所有类型的表情包（用户、直播间、充电）。
         这个方法会被 Controller 在后台线程中调用。
+        用户表情包只与账号有关，作为单独的一层缓存；直播间和充电表情包按直播间缓存（最近使用的若干个直播间），
+        切换直播间时只获取该直播间的数据，切换回最近加载过的直播间时直接使用缓存。
+        离线模式下（或网络中断导致什么都没有加载到时）改为从本地缓存加载。
+
+        Args:
+            room_id: 直播间ID
+            force_refresh: 忽略缓存有效期，重新获取所有数据
+        """
+        if not self.connectivity.online:
+            return self.load_offline_emoticons(room_id)
+
+        def stream_user_packages(packages: Dict):
+            # 按当前直播间的规则重命名后发给界面，先显示已获取的用户表情包
+            up_name = self._get_up_name_from_room(room_id)
+            self.emoticons_partial.emit(room_id, self._combine_tiers(room_id, {"packages": packages},
+                                                                     {"up_name": up_name, "packages": {}}))
+
+        user_tier, user_failed = self._get_user_tier(force_refresh, on_partial=stream_user_packages)
+        with self._tier_lock:
+            room_tier = self._room_tiers.get(room_id)
+            if room_tier is not None:
+                self._room_tiers.move_to_end(room_id)
+        cached = (not force_refresh and room_tier is not None
+                  and time.time() - room_tier["fetched_at"] < self.room_tier_ttl)
+        if cached and room_tier["user_generation"] == user_tier["generation"]:
+            # 最近加载过的直播间，且用户表情包没有更新：直接使用整合好的结果
+            logger.info(f"使用缓存的直播间 {room_id} 表情包，共 {len(room_tier['combined'])} 个包。")
+            emoticons = dict(room_tier["combined"])
+            self.last_load_failures = list(user_failed)
+            if user_failed:
+                self._restore_failed_sources(room_id, user_failed, emoticons)
+            self.emoticons = emoticons
+            self._rebuild_emote_indexes()
+            return self.emoticons
+
+        if not cached:
+            room_tier, room_failed = self._fetch_room_tier(room_id)
+        else:
+            room_failed = []
+
+        combined = self._combine_tiers(room_id, user_tier, room_tier)
+        failed = user_failed + room_failed
+        emoticons = dict(combined)
+
+        if not emoticons and not self.connectivity.online:
+            return self.load_offline_emoticons(room_id)
+
+        self.last_load_failures = failed
+        if failed:
+            # 获取失败的来源沿用快照中的数据，避免用空结果覆盖内存和快照中的表情包
+            self._restore_failed_sources(room_id, failed, emoticons)
+        # 整理完成后一次性替换引用：UI线程可能仍在遍历上一个字典
+        self.emoticons = emoticons
+        if not room_failed:
+            # 直播间数据获取失败时不缓存，下次加载重新获取
+            room_tier["combined"] = combined
+            room_tier["user_generation"] = user_tier["generation"]
+            with self._tier_lock:
+                self._room_tiers[room_id] = room_tier
+                self._room_tiers.move_to_end(room_id)
+                while len(self._room_tiers) > self.max_cached_rooms:
+                    self._room_tiers.popitem(last=False)
+
+        logger.info(f"所有表情包加载完成，共 {len(self.emoticons)} 个包。")
+        if self.emoticons:
+            self.save_metadata_snapshot(room_id)
+        self._rebuild_emote_indexes()
+        return self.emoticons
+
+    def _get_user_tier(self, force_refresh: bool = False, on_partial=None) -> Tuple[Dict, List[str]]:
+        """
+        返回当前账号的用户表情包层（未按直播间重命名），超过有效期时重新获取。
+        获取失败时沿用同一账号之前的数据；部分表情包详情获取失败时，缺少的表情包用之前的数据补上，
+        并且这一层立即过期，下次加载时重新获取。
+
+        Args:
+            force_refresh: 忽略有效期重新获取
+            on_partial: 可选，重新获取时每块详情返回后以已获取的表情包（按原顺序）调用
+
+        Returns:
+            ({"cookie", "packages", "fetched_at", "generation"}, 失败的来源列表)
+        """
+        with self._tier_lock:
+            tier = self._user_tier
+        if (tier is not None and tier["cookie"] == self.cookie and not force_refresh
+                and time.time() - tier["fetched_at"] < self.user_tier_ttl):
+            return tier, []
+
+        packages, complete = self._fetch_user_packages(on_partial)
+        with self._tier_lock:
+            previous = self._user_tier if self._user_tier is not None and self._user_tier["cookie"] == self.cookie else None
+            if packages is None:
+                if previous is not None:
+                    return previous, ["user"]
+                return {"cookie": self.cookie, "packages": {}, "fetched_at": 0.0, "generation": -1}, ["user"]
+            if not complete and previous is not None:
+                packages.update((pkg_id, pkg) for pkg_id, pkg in previous["packages"].items() if pkg_id not in packages)
+            self._user_tier_generation += 1
+            self._user_tier = {"cookie": self.cookie, "packages": packages,
+                               "fetched_at": time.time() if complete else 0.0,
+                               "generation": self._user_tier_generation}
+            return self._user_tier, [] if complete else ["user"]
+
+    def _fetch_user_packages(self, on_partial=None) -> Tuple[Union[Dict, None], bool]:
+        """
+        获取用户表情包（保留原始名称）。
+
+        Returns:
+            (表情包字典，用户表情包列表获取失败时为None, 是否所有表情包详情都获取成功)
+        """
+        user_packages = self.get_user_emoticons()
+        if user_packages is None:
+            return None, False
+        order = [pkg["id"] for pkg in user_packages]
+        names = {pkg["id"]: pkg["text"] for pkg in user_packages}
+        built: Dict[int, EmotePackage] = {}
+
+        def add_chunk(details: List[Dict]):
+            for detail_pkg in details:
+                pkg_id = detail_pkg.get("id")
+                if pkg_id in names and detail_pkg.get("emote"):
+                    package = EmotePackage(pkg_id, names[pkg_id], "user")
+                    for e in detail_pkg["emote"]:
+                        package.add_emote(e["text"], e["url"], e["id"])
+                    built[pkg_id] = package
+            if on_partial is not None:
+                on_partial({pkg_id: built[pkg_id] for pkg_id in order if pkg_id in built})
+
+        _, failed_ids = self.fetch_package_details(order, on_chunk=add_chunk)
+        if failed_ids and not built:
+            return None, False
+        return {pkg_id: built[pkg_id] for pkg_id in order if pkg_id in built}, not failed_ids
+
+    def _fetch_room_tier(self, room_id: int) -> Tuple[Dict, List[str]]:
         """
-        self.emoticons.clear()
+        获取直播间相关的表情包（直播间表情包和充电表情包，已按规则重命名）。
+
+        Returns:
+            ({"up_name", "packages", "fetched_at"}, 失败的来源列表)
+        """
+        failed = []
+        packages: Dict[Union[int, str], EmotePackage] = {}
 
         # 获取UP主名称用于特殊表情包重命名
         up_name = self._get_up_name_from_room(room_id)
 
-        # 1. 获取用户表情包
-        user_packages = self.get_user_emoticons()
-        if user_packages:
-            user_pkg_ids = [pkg['id'] for pkg in user_packages]
-            details = self.get_emoticon_package(user_pkg_ids)
-            if details:
-                details_map = {pkg['id']: pkg for pkg in details}
-                for pkg in user_packages:
-                    pkg_id = pkg["id"]
-                    detail_pkg = details_map.get(pkg_id)
-                    if detail_pkg and detail_pkg.get("emote"):
-                        # 应用重命名规则
-                        original_name = pkg["text"]
-                        renamed_name = self._apply_special_package_renaming(original_name, "user", room_id, up_name)
-
-                        self.emoticons[pkg_id] = {
-                            "name": renamed_name,
-                            "type": "user",
-                            "emotes": [{"name": e["text"], "url": e["url"], "id": e["id"]} for e in detail_pkg["emote"]]
-                        }
-
-        # 2. 获取直播间表情包
+        # 1. 获取直播间表情包
         live_packages = self.get_live_emoticons(room_id)
-        for pkg in live_packages:
-            pkg_id = pkg["pkg_id"] # 不需要避免冲突,这个表情包列表只是为了补全房间表情的
-            if pkg_id not in self.emoticons:
-                # 应用重命名规则
-                original_name = pkg["pkg_name"]
-                renamed_name = self._apply_special_package_renaming(original_name, "live", room_id, up_name)
-
-                self.emoticons[pkg_id] = {
-                    "name": renamed_name,
-                    "type": "live",
-                    "emotes": [{"name": e["emoji"], "url": e["url"], "id": e.get("emoticon_unique", "")} for e in pkg["emoticons"]]
-                }
-
-        # 3. 获取充电表情包
+        if live_packages is None:
+            failed.append("live")
+        for pkg in live_packages or []:
+            pkg_id = pkg["pkg_id"]
+            # 应用重命名规则
+            renamed_name = self._apply_special_package_renaming(pkg["pkg_name"], "live", room_id, up_name)
+            package = EmotePackage(pkg_id, renamed_name, "live")
+            for e in pkg["emoticons"]:
+                package.add_emote(e["emoji"], e["url"], e.get("emoticon_unique", ""))
+            packages[pkg_id] = package
+
+        # 2. 获取充电表情包
         up_uid = self.get_UP_UID(room_id)
-        if up_uid:
+        if not up_uid:
+            failed.append("upower")
+        else:
             charge_type_map, charge_packages = self.get_charge_emoticons(up_uid)
-            if charge_type_map and charge_packages:
+            if charge_packages is None:
+                failed.append("upower")
+            elif charge_type_map and charge_packages:
                 charge_up_name = list(charge_type_map.keys())[0]
                 charge_level_names = list(charge_type_map.values())[0]
 
@@ -565,77 +911,253 @@ class EmoticonManager(QObject):
                     original_name = f"{charge_up_name}-[{level_name}]"
                     renamed_name = self._apply_special_package_renaming(original_name, "upower", room_id, up_name)
 
-                    self.emoticons[pkg_id] = {
-                        "name": renamed_name,
-                        "type": "upower",
-                        "emotes": []
-                    }
+                    package = EmotePackage(pkg_id, renamed_name, "upower")
                     for e in pkg_data.get('emote', {}).get('emojis', []):
-                         self.emoticons[pkg_id]["emotes"].append({
-                            # 充电表情的发送格式是特殊的
-                            "name": f"upower_[UPOWER_{up_uid}_{e['name']}]",
-                            "url": e["icon"],
-                            "id": e['id']
-                        })
-
-        logging.info(f"所有表情包加载完成，共 {len(self.emoticons)} 个包。")
+                        # 充电表情的发送格式是特殊的
+                        package.add_emote(f"upower_[UPOWER_{up_uid}_{e['name']}]", e["icon"], e['id'])
+                    packages[pkg_id] = package
+
+        return {"up_name": up_name, "packages": packages, "fetched_at": time.time()}, failed
+
+    def _combine_tiers(self, room_id: int, user_tier: Dict, room_tier: Dict) -> Dict:
+        """
+        按原来的顺序整合用户表情包和直播间表情包（用户表情包在前，与用户表情包ID相同的直播间表情包被忽略）。
+        只有名称需要按直播间重命名的用户表情包会复制一份，其余直接共享同一个对象。
+        """
+        combined: Dict[Union[int, str], EmotePackage] = {}
+        for pkg_id, package in user_tier["packages"].items():
+            renamed_name = self._apply_special_package_renaming(package.name, "user", room_id, room_tier["up_name"])
+            if renamed_name != package.name:
+                renamed = EmotePackage(pkg_id, renamed_name, "user")
+                for e in package.emotes:
+                    renamed.add_emote(e.name, e.url, e.id)
+                package = renamed
+            combined[pkg_id] = package
+        for pkg_id, package in room_tier["packages"].items():
+            if pkg_id not in combined:
+                combined[pkg_id] = package
+        return combined
+
+    def _restore_failed_sources(self, room_id: int, failed: List[str], emoticons: Dict[Union[int, str], EmotePackage]):
+        """
+        对获取失败的表情包来源，沿用该直播间快照中的同类型表情包（加入尚未发布的 emoticons 字典）。
+        """
+        candidates = []
+        path = self._get_snapshot_path(room_id)
+        try:
+            if os.path.exists(path):
+                with open(path, 'r', encoding='utf-8') as f:
+                    candidates = [EmotePackage.from_dict(d) for d in json.load(f).get("packages", [])]
+        except Exception as e:
+            logger.error(f"读取表情包元数据快照失败 {path}: {e}")
+
+        restored = 0
+        for package in candidates:
+            if package.type in failed and package.id not in emoticons:
+                emoticons[package.id] = package
+                restored += 1
+        logger.warning(f"表情包来源获取失败: {', '.join(failed)}，沿用了 {restored} 个已缓存的表情包")
+
+    def _rebuild_emote_indexes(self):
+        """在后台线程中增量更新搜索索引，UI线程只负责查询。"""
+        self.search_index.update(self.emoticons)
+        emotes_by_key, emotes_by_id = {}, {}
+        for pkg in self.emoticons.values():
+            for e in pkg.emotes:
+                emotes_by_key[emote_key(e)] = e
+                emotes_by_id.setdefault(str(e.id), e)
+        # 整体替换引用：控制接口的线程可以随时无锁查询
+        self._emotes_by_key, self._emotes_by_id = emotes_by_key, emotes_by_id
+
+    # --- 离线模式 ---
+
+    def _get_snapshot_path(self, room_id: int) -> str:
+        return os.path.join(config.DATA_CACHE_DIR, "snapshots", f"room_{room_id}.json")
+
+    def save_metadata_snapshot(self, room_id: int):
+        """保存当前直播间的表情包元数据快照，供离线模式重建表情包列表。"""
+        path = self._get_snapshot_path(room_id)
+        try:
+            data = {"saved_at": time.time(), "packages": [pkg.to_dict() for pkg in self.emoticons.values()]}
+            atomic_write(path, json.dumps(data, ensure_ascii=False))
+            logger.debug("表情包元数据快照已保存: %s", path)
+        except Exception as e:
+            logger.error(f"保存表情包元数据快照失败: {e}")
+
+    def load_offline_emoticons(self, room_id: int) -> Dict:
+        """
+        离线加载：优先使用该直播间最近一次的元数据快照，
+        没有快照时根据映射文件和图片缓存重建表情包（只能浏览，表情名称可能未知）。
+        """
+        emoticons: Dict[Union[int, str], EmotePackage] = {}
+        path = self._get_snapshot_path(room_id)
+        try:
+            if os.path.exists(path):
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                for pkg_data in data.get("packages", []):
+                    package = EmotePackage.from_dict(pkg_data)
+                    emoticons[package.id] = package
+                logger.info(f"离线模式：从快照加载了 {len(emoticons)} 个表情包（保存于 "
+                            f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(data.get('saved_at', 0)))}）")
+        except Exception as e:
+            logger.error(f"读取表情包元数据快照失败 {path}: {e}")
+            emoticons = {}
+
+        if not emoticons:
+            emoticons = self._reconstruct_from_image_cache()
+        # 整理完成后一次性替换引用：UI线程可能仍在遍历上一个字典
+        self.emoticons = emoticons
+        self._rebuild_emote_indexes()
         return self.emoticons
 
-    def send_emoticon(self, room_id: int, emoticon_data: Dict) -> Tuple[bool, str]:
+    def _reconstruct_from_image_cache(self) -> Dict[str, EmotePackage]:
+        """根据映射文件和图片缓存目录重建表情包（用于没有元数据快照的直播间），返回 {包ID: 表情包}。"""
+        emoticons: Dict[str, EmotePackage] = {}
+        # 使用统计中保存了完整的表情数据，可以用来还原表情名称
+        known = {(d["package_name"], self._cache_file_id(d["id"])): d
+                 for d in self.usage_store.get_frequent(limit=10000) + self.usage_store.get_favorites()}
+        mappings_dir = os.path.join(config.DATA_CACHE_DIR, "mappings")
+        for file_name in sorted(os.listdir(mappings_dir)):
+            try:
+                with open(os.path.join(mappings_dir, file_name), 'r', encoding='utf-8') as f:
+                    mappings = json.load(f)
+            except Exception as e:
+                logger.error(f"读取映射文件失败 {file_name}: {e}")
+                continue
+            for package_name in sorted(set(mappings.values())):
+                package_dir = self._get_package_cache_dir(package_name)
+                if not os.path.isdir(package_dir):
+                    continue
+                suffix = f"_{self._get_sanitized_package_name(package_name)}"
+                package = None
+                for entry in sorted(os.scandir(package_dir), key=lambda e: e.name):
+                    stem, ext = os.path.splitext(entry.name)
+                    emoticon_id = stem[:-len(suffix)]
+                    if not stem.endswith(suffix) or mappings.get(emoticon_id) != package_name:
+                        continue
+                    data = known.get((package_name, emoticon_id))
+                    if package is None:
+                        pkg_type = data["type"] if data else "cache"
+                        package = emoticons[f"cache_{package_name}"] = EmotePackage(f"cache_{package_name}", package_name, pkg_type)
+                    if data:
+                        package.add_emote(data["name"], data["url"], data["id"])
+                    else:
+                        # 名称未知：显示ID，URL指向本地文件（保证扩展名与缓存文件一致）
+                        package.add_emote(f"[{emoticon_id}]", entry.path, emoticon_id)
+        logger.info(f"离线模式：根据图片缓存重建了 {len(emoticons)} 个表情包")
+        return emoticons
+
+    def get_frequent_package(self, limit: int = 30) -> EmotePackage:
+        """
+        构建虚拟的"常用"表情包：收藏的表情在前，其余按衰减后的使用频率排序。
+        表情优先解析为当前已加载的表情对象；不在当前直播间的表情按保存的数据重建。
+        """
+        package = EmotePackage(FREQUENT_PACKAGE_ID, "⭐ 常用", "virtual")
+        fallback_packages = {}
+        seen = set()
+        for data in self.usage_store.get_favorites() + self.usage_store.get_frequent(limit):
+            key = data["key"]
+            if key in seen:
+                continue
+            seen.add(key)
+            package.emotes.append(self.resolve_emote(data, fallback_packages))
+        return package
+
+    def resolve_emote(self, data: Dict, fallback_packages: Dict = None) -> Emote:
+        """
+        把保存的表情字典（Emote.to_dict 的结果）解析为表情对象。
+        优先返回当前已加载的表情对象；不在当前直播间的表情按保存的数据重建。
+
+        Args:
+            data: 表情字典
+            fallback_packages: 可选，在多次调用之间共享重建出的表情包 {(包名, 类型): EmotePackage}
+        """
+        emote = self._emotes_by_key.get(f"{data['type']}:{data['id']}")
+        if emote is not None:
+            return emote
+
+        if fallback_packages is None:
+            fallback_packages = {}
+        pkg_key = (data["package_name"], data["type"])
+        source_package = fallback_packages.get(pkg_key)
+        if source_package is None:
+            source_package = fallback_packages[pkg_key] = EmotePackage(data["package_name"], *pkg_key)
+        return Emote(data["name"], data["url"], data["id"], source_package)
+
+    def find_emote(self, emote_id, emote_type: str = None) -> Union[Emote, None]:
+        """
+        按ID（和可选的类型）在当前加载的表情中查找表情，找不到时返回 None。可在任意线程调用。
+        """
+        if emote_type:
+            return self._emotes_by_key.get(f"{emote_type}:{emote_id}")
+        return self._emotes_by_id.get(str(emote_id))
+
+    def send_emoticon(self, room_id: int, emoticon_data: Emote) -> Tuple[bool, str]:
         """
         发送表情弹幕到指定直播间。
         """
-        headers = {"Cookie": self.cookie, "User-Agent": self.user_agent}
-        csrf_token = self.get_csrf_from_cookie()
-        if not csrf_token:
+        payload = self.build_send_payload(room_id, emoticon_data)
+        if payload is None:
             return False, "无法获取CSRF Token，请检查Cookie"
+        return self.send_payload(payload)
 
-        # 根据表情类型构建消息内容
-        if emoticon_data["type"] == "upower":
-            msg = emoticon_data["name"]  # 充电表情直接使用特殊格式的名称
-        elif emoticon_data["type"] == "live":
-            msg = f"{emoticon_data['id']}" # 直播间表情使用ID代码
-        else:
-            msg = f"upower_{emoticon_data['name']}" # 普通表情使用文字代码
-
-        payload = {
-            "bubble": 0,
-            "msg": msg,
-            "color": 16777215,
-            "fontsize": 25,
-            "mode": 1,
-            "roomid": room_id,
-            "csrf": csrf_token,
-            "csrf_token": csrf_token,
-            "rnd": int(time.time())
-        }
-        
-        # 对于直播间和充电表情，需要额外附加dm_type和emoticonOptions
-        if emoticon_data['type'] in ['live', 'upower','user']:
-            payload['dm_type'] = 1
-            # 构建emoticonOptions的JSON字符串
-            options = {
-                "bulge_display": 0,
-                "emoticon_unique": emoticon_data['id'],
-                "url": emoticon_data['url'],
-                "is_dynamic": 1
-            }
-            payload['emoticon_options'] = json.dumps(options, ensure_ascii=False)
-
-        logging.info(f"准备发送表情: {msg} 到房间 {room_id}")
+    def build_send_payload(self, room_id: int, emoticon_data: Emote) -> Union[bytes, None]:
+        """
+        获取发送表情所需的已编码请求体（不含随时间变化的 rnd 字段）。
+        请求体按 (房间号, 表情) 缓存，Cookie变化时自动失效，可以预先构建并重复使用。
+        如果无法从Cookie中获取CSRF Token则返回 None。
+        """
+        return self._payload_cache.fragment(self.cookie, room_id, emoticon_data)
+
+    def send_payload(self, payload: bytes) -> Tuple[bool, str]:
+        """
+        提交由 build_send_payload 构建的请求体，只在发送时填入 rnd。
+        """
+        headers = self._payload_cache.headers(self.cookie)
+        data = self._payload_cache.fill(payload)
+
+        start = time.perf_counter()
         try:
-            response = requests.post(config.SEND_DANMU_API, headers=headers, data=payload)
+            response = self._send_session.post(config.SEND_DANMU_API, headers=headers, data=data, timeout=SEND_TIMEOUT)
+            metrics.SEND_LATENCY.observe(time.perf_counter() - start)
+            self.connectivity.record_success()
+            if response.status_code in RATE_LIMIT_HTTP_STATUS:
+                metrics.SENDS.inc(outcome="rate_limited")
+                return False, f"请求过于频繁 (HTTP {response.status_code})"
             result = response.json()
-            logging.info(f"发送响应: {result}")
+            logger.debug("发送响应: %s", result)
             
             if result.get("code") == 0:
+                metrics.SENDS.inc(outcome="success")
                 return True, result.get("message", "发送成功")
             else:
+                metrics.SENDS.inc(outcome="rate_limited" if result.get("code") in RATE_LIMIT_CODES else "failed")
                 return False, result.get("message", "未知错误")
+        except requests.Timeout as e:
+            metrics.SENDS.inc(outcome="timeout")
+            self.connectivity.record_failure()
+            logger.error(f"发送表情超时: {e}")
+            return False, SEND_TIMEOUT_MESSAGE
         except Exception as e:
-            logging.error(f"发送表情时发生异常: {e}")
+            metrics.SENDS.inc(outcome="error")
+            if isinstance(e, requests.ConnectionError):
+                self.connectivity.record_failure()
+            logger.error(f"发送表情时发生异常: {e}")
             return False, str(e)
 
+    def warm_send_connection(self) -> bool:
+        """
+        向发送接口所在的主机发出一个轻量请求，预先建立（或保持）发送会话的连接，
+        之后的发送不需要等待TCP/TLS握手。返回是否成功。
+        """
+        try:
+            self._send_session.head(config.CONNECTIVITY_PROBE_URL, timeout=3)
+            return True
+        except requests.RequestException as e:
+            logger.debug(f"预热发送连接失败: {e}")
+            return False
+
     def _should_refresh_cache(self, mapping_file: str, emoticon_id: str, current_package_name: str) -> bool:
         """
         检查是否需要刷新缓存。
@@ -649,15 +1171,16 @@ class EmoticonManager(QObject):
                 mappings = json.load(f)
 
             # 检查该表情ID对应的包名是否与当前包名一致
+            metrics.CACHE_LOOKUPS.inc(cache="mapping", result="hit" if emoticon_id in mappings else "miss")
             if emoticon_id in mappings:
                 cached_package_name = mappings[emoticon_id]
                 if cached_package_name != current_package_name:
-                    logging.info(f"检测到表情包名称变化: {cached_package_name} -> {current_package_name}，需要刷新缓存")
+                    logger.info(f"检测到表情包名称变化: {cached_package_name} -> {current_package_name}，需要刷新缓存")
                     return True
 
             return False
         except Exception as e:
-            logging.error(f"读取映射文件失败 {mapping_file}: {e}")
+            logger.error(f"读取映射文件失败 {mapping_file}: {e}")
             return False
 
     def _update_mapping_file(self, mapping_file: str, emoticon_id: str, package_name: str):
@@ -673,6 +1196,19 @@ class EmoticonManager(QObject):
         # 安排批量写入
         self._schedule_batch_write()
 
+    def shutdown(self):
+        """
+        应用程序退出前调用：关闭下载管理器并写入所有待保存的数据。
+        """
+        if self.download_manager:
+            self.download_manager.shutdown()
+        self.flush_all_mappings()
+        self.usage_store.flush()
+        self.pack_store.shutdown()
+        self.connectivity.shutdown()
+        self.api.shutdown()
+        self._send_session.close()
+
     def flush_all_mappings(self):
         """
         强制写入所有待处理的映射更新。
@@ -683,4 +1219,4 @@ class EmoticonManager(QObject):
             self._batch_timer = None
 
         self._flush_pending_mappings()
-        logging.info("所有映射更新已写入完成")
\ No newline at end of file
+        logger.info("所有映射更新已写入完成")
\ No newline at end of file
@@ -0,0 +1,239 @@
+# app/offline.py
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+from typing import Callable, Dict, List, Optional
+
+import requests
+
+from . import config
+from . import metrics
+from .file_lock import FileLock, atomic_write
+
+logger = logging.getLogger(__name__)
+
+CONNECTIVITY = metrics.registry.gauge("connectivity_online", "网络连接状态（1=在线，0=离线）")
+PROBES = metrics.registry.counter("connectivity_probes_total", "网络恢复探测次数（按结果）")
+
+
+class ConnectivityMonitor:
+    """
+    网络连接状态监视器。
+    - 模型在每次请求后调用 record_success / record_failure，连续网络错误达到阈值时进入离线状态
+    - 离线期间在后台定时发送轻量探测请求（HEAD），间隔按指数退避增长，避免反复请求已失败的接口
+    - 探测成功后回到在线状态；状态变化通过 on_change 回调通知（可能在后台线程中调用）
+    """
+    def __init__(self, probe_url: str = None, on_change: Callable[[bool], None] = None,
+                 failure_threshold: int = 3, min_probe_interval: float = 5.0, max_probe_interval: float = 60.0):
+        self.probe_url = probe_url or config.CONNECTIVITY_PROBE_URL
+        self.on_change = on_change
+        self.failure_threshold = failure_threshold
+        self.min_probe_interval = min_probe_interval
+        self.max_probe_interval = max_probe_interval
+
+        self._lock = threading.Lock()
+        self._online = True
+        self._forced_offline = False  # 用户手动开启离线模式
+        self._consecutive_failures = 0
+        self._probe_interval = min_probe_interval
+        self._probe_timer: Optional[threading.Timer] = None
+        CONNECTIVITY.set(1)
+
+    @property
+    def online(self) -> bool:
+        return self._online and not self._forced_offline
+
+    @property
+    def forced_offline(self) -> bool:
+        return self._forced_offline
+
+    def record_success(self):
+        """记录一次成功的网络请求。"""
+        with self._lock:
+            self._consecutive_failures = 0
+        if not self._online:
+            self._set_online(True)
+
+    def record_failure(self):
+        """记录一次网络层面的失败（连接错误、超时），连续失败达到阈值时切换为离线。"""
+        with self._lock:
+            self._consecutive_failures += 1
+            reached = self._consecutive_failures >= self.failure_threshold
+        if reached and self._online:
+            self._set_online(False)
+
+    def set_forced_offline(self, forced: bool):
+        """用户手动开启/关闭离线模式。关闭时立即探测一次网络。"""
+        was_online = self.online
+        self._forced_offline = forced
+        if not forced and not self._online:
+            self._schedule_probe(0)
+        if self.online != was_online:
+            self._notify()
+
+    def _set_online(self, online: bool):
+        with self._lock:
+            if self._online == online:
+                return
+            self._online = online
+            self._consecutive_failures = 0
+            self._probe_interval = self.min_probe_interval
+        CONNECTIVITY.set(1 if online else 0)
+        if online:
+            logger.info("网络已恢复，切换回在线模式")
+        else:
+            logger.warning("连续网络请求失败，切换为离线模式，将定时探测网络恢复")
+            self._schedule_probe(self.min_probe_interval)
+        if not self._forced_offline:
+            self._notify()
+
+    def _notify(self):
+        if self.on_change is not None:
+            self.on_change(self.online)
+
+    def _schedule_probe(self, delay: float):
+        with self._lock:
+            if self._probe_timer is not None:
+                self._probe_timer.cancel()
+            self._probe_timer = threading.Timer(delay, self._probe)
+            self._probe_timer.daemon = True
+            self._probe_timer.start()
+
+    def _probe(self):
+        """后台线程：发送一次轻量探测请求，失败时按指数退避安排下一次探测。"""
+        with self._lock:
+            self._probe_timer = None
+            if self._online:
+                return
+        try:
+            requests.head(self.probe_url, timeout=3)
+            PROBES.inc(result="ok")
+            self._set_online(True)
+        except requests.RequestException:
+            PROBES.inc(result="failed")
+            with self._lock:
+                delay = self._probe_interval
+                self._probe_interval = min(self._probe_interval * 2, self.max_probe_interval)
+            logger.debug("网络探测失败，%.0f 秒后重试", delay)
+            self._schedule_probe(delay)
+
+    def shutdown(self):
+        with self._lock:
+            if self._probe_timer is not None:
+                self._probe_timer.cancel()
+                self._probe_timer = None
+
+
+class OfflineSendQueue:
+    """
+    离线期间的待发送表情队列（持久化到文件）。
+    每条记录带有过期时间，网络恢复后只发送尚未过期的记录，避免把很久以前的表情发到直播间。
+    同一工作目录下的多个实例共享这个文件：所有修改都在跨进程文件锁内重新读取文件、修改后原子写回。
+    - take_ready 认领一条记录（在文件中标记认领者，其他实例跳过它），发送成功后 ack 删除，
+      发送失败时 release 放回队列等待下次补发；认领后超过 claim_timeout 秒仍未确认（例如实例已退出）的记录可以被重新认领
+    - 记录带有所属账号（owner），只会由同一账号的实例取出
+    - 同一条记录补发失败 max_attempts 次后丢弃
+    """
+    def __init__(self, file_path: str = None, ttl: float = 120.0, claim_timeout: float = 60.0, max_attempts: int = 3):
+        self._file_path = file_path or os.path.join(config.DATA_CACHE_DIR, "offline_sends.json")
+        self.ttl = ttl
+        self.claim_timeout = claim_timeout
+        self.max_attempts = max_attempts
+        self._claimant = uuid.uuid4().hex  # 本实例的认领标识
+        self._lock = threading.Lock()
+        # [{"id": 记录ID, "emote": 表情字典, "room_id": 房间号, "owner": 账号, "queued_at": 时间戳, "expires_at": 时间戳,
+        #   "attempts": 已失败次数, "claim": {"by": 认领者, "at": 时间戳} 或 None}]
+        self._entries: List[Dict] = []  # 最近一次读写时文件中的记录
+        with self._lock:
+            self._entries = self._read()
+        if self._entries:
+            logger.info(f"离线发送队列已加载: {len(self._entries)} 条")
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _read(self) -> List[Dict]:
+        """读取文件中的全部记录。调用方需持有锁。"""
+        try:
+            if os.path.exists(self._file_path):
+                with open(self._file_path, 'r', encoding='utf-8') as f:
+                    entries = json.load(f)
+                for entry in entries:
+                    entry.setdefault("id", uuid.uuid4().hex)  # 旧版本写入的记录没有ID
+                return entries
+        except Exception as e:
+            logger.error(f"加载离线发送队列失败: {e}")
+        return []
+
+    def _save(self):
+        try:
+            atomic_write(self._file_path, json.dumps(self._entries, ensure_ascii=False))
+        except Exception as e:
+            logger.error(f"保存离线发送队列失败: {e}")
+
+    def put(self, emote_dict: Dict, room_id: int, owner: str = "", now: float = None):
+        """加入一条待发送记录。"""
+        now = time.time() if now is None else now
+        entry = {"id": uuid.uuid4().hex, "emote": emote_dict, "room_id": room_id, "owner": owner,
+                 "queued_at": now, "expires_at": now + self.ttl, "attempts": 0, "claim": None}
+        with self._lock, FileLock.for_path(self._file_path):
+            self._entries = self._read()
+            self._entries.append(entry)
+            self._save()
+
+    def take_ready(self, owner: str = "", now: float = None) -> Optional[Dict]:
+        """
+        认领属于 owner 的最早一条未过期、未被认领的记录，过期的记录直接丢弃。没有可发送的记录时返回None。
+        发送完成后必须调用 ack（成功）或 release（失败）。
+        """
+        now = time.time() if now is None else now
+        with self._lock, FileLock.for_path(self._file_path):
+            entries = self._read()
+            kept, expired, entry = [], 0, None
+            for candidate in entries:
+                claim = candidate.get("claim")
+                claimable = not claim or now - claim["at"] > self.claim_timeout  # 未被认领或认领已失效
+                if candidate["expires_at"] < now:
+                    if claimable:
+                        expired += 1
+                        continue
+                elif entry is None and claimable and candidate.get("owner", "") == owner:
+                    candidate["claim"] = {"by": self._claimant, "at": now}
+                    entry = dict(candidate)
+                kept.append(candidate)
+            self._entries = kept
+            if expired or entry is not None:
+                self._save()
+        if expired:
+            logger.info(f"丢弃 {expired} 条已过期的离线发送记录")
+        return entry
+
+    def ack(self, entry: Dict):
+        """确认认领的记录已发送成功，从队列中删除。"""
+        with self._lock, FileLock.for_path(self._file_path):
+            entries = self._read()
+            self._entries = [e for e in entries if e["id"] != entry["id"]]
+            if len(self._entries) != len(entries):
+                self._save()
+
+    def release(self, entry: Dict, now: float = None):
+        """
+        认领的记录发送失败：放回队列（保留原来的过期时间）等待下次补发；
+        已过期或失败次数达到 max_attempts 时丢弃。
+        """
+        now = time.time() if now is None else now
+        with self._lock, FileLock.for_path(self._file_path):
+            self._entries = self._read()
+            for index, candidate in enumerate(self._entries):
+                if candidate["id"] != entry["id"]:
+                    continue
+                candidate["attempts"] = candidate.get("attempts", 0) + 1
+                candidate["claim"] = None
+                if candidate["expires_at"] < now or candidate["attempts"] >= self.max_attempts:
+                    del self._entries[index]
+                    logger.info(f"离线发送记录补发失败 {candidate['attempts']} 次或已过期，已丢弃")
+                self._save()
+                break
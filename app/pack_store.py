@@ -0,0 +1,193 @@
+# app/pack_store.py
+import os
+import mmap
+import json
+import struct
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+PACK_FILE_NAME = "thumbs.pack"
+PACK_MAGIC = b"EMPK"
+PACK_VERSION = 1
+_HEADER = struct.Struct("<4sBI")  # 魔数, 版本, 索引长度
+PACKED_EXTENSIONS = {".png", ".jpg", ".jpeg", ".bmp"}  # 动态图（GIF/WEBP）仍从单独的文件加载
+
+
+class PackFile:
+    """
+    一个已打开的表情包缩略图打包文件（只读内存映射）。
+    文件格式: 头部(魔数 + 版本 + 索引长度) + JSON索引 {表情ID: [偏移, 长度]} + 连续存放的图片数据
+    """
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, version, index_length = _HEADER.unpack_from(self._mm, 0)
+            if magic != PACK_MAGIC or version != PACK_VERSION:
+                raise ValueError(f"不支持的打包文件格式: {path}")
+            index_start = _HEADER.size
+            self._data_start = index_start + index_length
+            self._index: Dict[str, list] = json.loads(self._mm[index_start:self._data_start].decode("utf-8"))
+        except Exception:
+            self._mm.close()
+            raise
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, emoticon_id: str) -> bool:
+        return emoticon_id in self._index
+
+    def read(self, emoticon_id: str) -> Optional[bytes]:
+        """读取单个表情的图片数据（不存在时返回None）。"""
+        entry = self._index.get(emoticon_id)
+        if entry is None:
+            return None
+        offset, length = entry
+        start = self._data_start + offset
+        return self._mm[start:start + length]
+
+    def close(self):
+        self._mm.close()
+
+
+def _tmp_pack_path(package_dir: str) -> str:
+    # 临时文件名带进程号和线程号，多个实例（或同一实例的多个重建线程）同时重建同一个表情包时不会互相覆盖；
+    # build_pack 和替换文件在同一个线程中完成，两处得到的是同一个路径
+    return os.path.join(package_dir, f"{PACK_FILE_NAME}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+
+def build_pack(package_dir: str, file_suffix: str, valid_ids=None) -> int:
+    """
+    把表情包缓存目录中的单独图片文件打包为一个文件（先写临时文件，再由调用方替换）。
+
+    Args:
+        package_dir: 表情包缓存目录
+        file_suffix: 图片文件名中表情ID之后的部分（"_{包名}"），用于从文件名解析表情ID
+        valid_ids: 可选的有效表情ID集合（映射文件中属于该表情包的ID），为None时不过滤
+
+    Returns:
+        打包的图片数量
+    """
+    entries = []
+    with os.scandir(package_dir) as it:
+        for entry in it:
+            stem, ext = os.path.splitext(entry.name)
+            if ext.lower() not in PACKED_EXTENSIONS or not stem.endswith(file_suffix) or not entry.is_file():
+                continue
+            emoticon_id = stem[:-len(file_suffix)]
+            if valid_ids is None or emoticon_id in valid_ids:
+                entries.append((emoticon_id, entry.path))
+
+    index, blobs, offset = {}, [], 0
+    for emoticon_id, path in entries:
+        with open(path, "rb") as f:
+            data = f.read()
+        if not data:
+            continue
+        index[emoticon_id] = [offset, len(data)]
+        blobs.append(data)
+        offset += len(data)
+
+    index_bytes = json.dumps(index, separators=(",", ":")).encode("utf-8")
+    with open(_tmp_pack_path(package_dir), "wb") as f:
+        f.write(_HEADER.pack(PACK_MAGIC, PACK_VERSION, len(index_bytes)))
+        f.write(index_bytes)
+        for data in blobs:
+            f.write(data)
+    return len(index)
+
+
+class PackStore:
+    """
+    表情包缩略图打包文件管理。
+    - 打开表情包时只需一次 open + mmap，之后每个图标都从内存映射中读取，没有逐文件的系统调用
+    - 下载完成后由 schedule_build() 延迟合并，在后台线程重建该表情包的打包文件
+    - 最多同时保持 max_open 个打包文件映射，按最近使用淘汰
+    """
+    def __init__(self, max_open: int = 8, build_delay: float = 3.0):
+        self.max_open = max_open
+        self._build_delay = build_delay
+        self._lock = threading.Lock()
+        self._open: "OrderedDict[str, Optional[PackFile]]" = OrderedDict()  # {表情包目录: 打包文件（不存在时为None）}
+        self._build_timers: Dict[str, threading.Timer] = {}
+
+    def get(self, package_dir: str) -> Optional[PackFile]:
+        """返回表情包目录对应的打包文件（不存在或无法读取时返回None）。"""
+        with self._lock:
+            if package_dir in self._open:
+                self._open.move_to_end(package_dir)
+                return self._open[package_dir]
+
+            pack = None
+            path = os.path.join(package_dir, PACK_FILE_NAME)
+            if os.path.exists(path):
+                try:
+                    pack = PackFile(path)
+                except Exception as e:
+                    logger.error(f"读取打包文件失败 {path}: {e}")
+            self._open[package_dir] = pack
+            while len(self._open) > self.max_open:
+                _, evicted = self._open.popitem(last=False)
+                if evicted is not None:
+                    evicted.close()
+            return pack
+
+    def read(self, package_dir: str, emoticon_id: str) -> Optional[bytes]:
+        """从打包文件中读取单个表情的图片数据。"""
+        pack = self.get(package_dir)
+        with self._lock:
+            # get() 返回后打包文件可能已被重建或淘汰（映射已关闭），只读取仍在使用中的同一个对象
+            data = pack.read(emoticon_id) if pack is not None and self._open.get(package_dir) is pack else None
+        metrics.CACHE_LOOKUPS.inc(cache="pack", result="hit" if data is not None else "miss")
+        return data
+
+    def schedule_build(self, package_dir: str, file_suffix: str, valid_ids_fn=None):
+        """
+        安排重建表情包的打包文件（同一目录在延迟时间内的多次请求只会重建一次）。
+
+        Args:
+            package_dir: 表情包缓存目录
+            file_suffix: 图片文件名中表情ID之后的部分
+            valid_ids_fn: 可选，构建时调用以获取有效表情ID集合
+        """
+        with self._lock:
+            timer = self._build_timers.get(package_dir)
+            if timer is not None:
+                timer.cancel()
+            timer = threading.Timer(self._build_delay, self._build, args=(package_dir, file_suffix, valid_ids_fn))
+            timer.daemon = True
+            self._build_timers[package_dir] = timer
+            timer.start()
+
+    def _build(self, package_dir: str, file_suffix: str, valid_ids_fn=None):
+        with self._lock:
+            self._build_timers.pop(package_dir, None)
+        try:
+            count = build_pack(package_dir, file_suffix, valid_ids_fn() if valid_ids_fn else None)
+            with self._lock:
+                # 替换前关闭已打开的映射（Windows下被映射的文件无法替换）
+                pack = self._open.pop(package_dir, None)
+                if pack is not None:
+                    pack.close()
+                os.replace(_tmp_pack_path(package_dir), os.path.join(package_dir, PACK_FILE_NAME))
+            logger.debug("打包文件已重建: %s（%d 张图片）", package_dir, count)
+        except Exception as e:
+            logger.error(f"重建打包文件失败 {package_dir}: {e}")
+
+    def shutdown(self):
+        """取消待执行的重建并关闭所有映射。"""
+        with self._lock:
+            for timer in self._build_timers.values():
+                timer.cancel()
+            self._build_timers.clear()
+            for pack in self._open.values():
+                if pack is not None:
+                    pack.close()
+            self._open.clear()
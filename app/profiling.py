@@ -0,0 +1,190 @@
+# app/profiling.py
+import os
+import sys
+import json
+import time
+import logging
+import functools
+import threading
+import traceback
+from typing import Dict, List, Optional
+
+from PyQt5.QtCore import QTimer
+
+from . import config
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# 默认被计时的热点槽函数（类名 -> 方法名列表）
+DEFAULT_HOT_SLOTS = {
+    "MainController": ["display_package_emoticons", "_on_download_completed", "_on_icons_decoded"],
+    "EmoticonPackageWidget": ["_relayout_emoticons"],
+    "MainWindow": ["populate_package_list"],
+}
+
+SLOT_LATENCY = metrics.registry.histogram("ui_slot_seconds", "UI线程热点槽函数耗时（按槽函数）",
+                                          buckets=(0.001, 0.005, 0.016, 0.033, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0))
+STALLS = metrics.registry.counter("ui_stalls_total", "超过阈值的UI线程卡顿次数")
+
+
+class StallWatchdog:
+    """
+    UI线程卡顿看门狗（默认关闭，通过 config.json 的 stall_watchdog 开启）。
+    - 主线程的定时器定期更新心跳时间戳；后台线程发现心跳超过阈值未更新时，
+      抓取主线程当时的Python调用栈
+    - 被 instrument() 包装的槽函数会记录耗时，并在卡顿报告中标出当时正在执行的槽函数
+    - 卡顿结束后把报告追加写入 stalls.jsonl，退出时把槽函数耗时汇总写入 slot_timings.json
+    """
+    def __init__(self, threshold: float = 0.25, report_dir: str = None, heartbeat_interval: float = 0.05):
+        self.threshold = threshold
+        self.report_dir = report_dir or config.DIAGNOSTICS_DIR
+        self.heartbeat_interval = heartbeat_interval
+        self._main_ident = threading.main_thread().ident
+        self._heartbeat = time.perf_counter()
+        self._active_slots: List[tuple] = []  # 主线程中正在执行的槽函数栈 [(名称, 开始时间)]
+        self._slot_stats: Dict[str, Dict] = {}
+        self._stats_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._timer: Optional[QTimer] = None
+
+    def start(self):
+        """启动心跳定时器和后台监视线程（必须在主线程中、QApplication创建之后调用）。"""
+        os.makedirs(self.report_dir, exist_ok=True)
+        self._heartbeat = time.perf_counter()
+        self._timer = QTimer()
+        self._timer.timeout.connect(self._beat)
+        self._timer.start(int(self.heartbeat_interval * 1000))
+        self._thread = threading.Thread(target=self._watch, name="StallWatchdog", daemon=True)
+        self._thread.start()
+        logger.info("UI卡顿看门狗已启动，阈值 %.0fms，报告目录: %s", self.threshold * 1000, self.report_dir)
+
+    def stop(self):
+        """停止监视，并写出槽函数耗时汇总。"""
+        self._stop_event.set()
+        if self._timer is not None:
+            self._timer.stop()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+        self._write_slot_summary()
+
+    def _beat(self):
+        self._heartbeat = time.perf_counter()
+
+    def _watch(self):
+        """后台线程：检测心跳停滞，抓取调用栈，并在卡顿结束后写出报告。"""
+        poll = self.heartbeat_interval
+        pending = None
+        while not self._stop_event.wait(poll):
+            heartbeat = self._heartbeat
+            lag = time.perf_counter() - heartbeat - self.heartbeat_interval
+            if pending is None:
+                if lag >= self.threshold:
+                    pending = self._capture(heartbeat)
+            elif heartbeat != pending["heartbeat"]:
+                # 心跳恢复：卡顿结束，记录总时长
+                pending["duration_ms"] = round((heartbeat - pending.pop("heartbeat") - self.heartbeat_interval) * 1000, 1)
+                self._write_report(pending)
+                pending = None
+
+    def _capture(self, heartbeat: float) -> Dict:
+        frame = sys._current_frames().get(self._main_ident)
+        stack = traceback.format_stack(frame) if frame is not None else []
+        now = time.perf_counter()
+        return {
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "heartbeat": heartbeat,
+            "active_slots": [{"slot": name, "elapsed_ms": round((now - start) * 1000, 1)}
+                             for name, start in list(self._active_slots)],
+            "stack": [line.rstrip() for line in stack]
+        }
+
+    def _write_report(self, report: Dict):
+        STALLS.inc()
+        slots = ", ".join(s["slot"] for s in report["active_slots"]) or "未知"
+        logger.warning("UI线程卡顿 %.0fms（正在执行: %s）", report["duration_ms"], slots)
+        try:
+            with open(os.path.join(self.report_dir, "stalls.jsonl"), "a", encoding="utf-8") as f:
+                f.write(json.dumps(report, ensure_ascii=False) + "\n")
+        except Exception as e:
+            logger.error(f"写入卡顿报告失败: {e}")
+
+    def record_slot(self, name: str, duration: float):
+        """记录一次槽函数调用耗时。"""
+        SLOT_LATENCY.observe(duration, slot=name)
+        with self._stats_lock:
+            stats = self._slot_stats.get(name)
+            if stats is None:
+                stats = self._slot_stats[name] = {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "slow": 0}
+            duration_ms = duration * 1000
+            stats["count"] += 1
+            stats["total_ms"] += duration_ms
+            stats["max_ms"] = max(stats["max_ms"], duration_ms)
+            if duration >= self.threshold:
+                stats["slow"] += 1
+
+    def _write_slot_summary(self):
+        with self._stats_lock:
+            summary = {name: dict(stats, avg_ms=stats["total_ms"] / stats["count"])
+                       for name, stats in self._slot_stats.items()}
+        if not summary:
+            return
+        try:
+            with open(os.path.join(self.report_dir, "slot_timings.json"), "w", encoding="utf-8") as f:
+                json.dump(summary, f, ensure_ascii=False, indent=2)
+        except Exception as e:
+            logger.error(f"写入槽函数耗时汇总失败: {e}")
+
+    def timed(self, name: str, fn):
+        """返回包装后的函数：执行期间登记为活动槽函数，结束后记录耗时。"""
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            self._active_slots.append((name, start))
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self._active_slots.pop()
+                self.record_slot(name, time.perf_counter() - start)
+        return wrapper
+
+
+def instrument(watchdog: StallWatchdog, classes: Dict[str, type], hot_slots: Dict[str, List[str]] = None):
+    """
+    在类级别给热点槽函数加上计时钩子。
+    必须在创建实例、连接信号之前调用，否则已连接的绑定方法不会经过包装。
+
+    Args:
+        watchdog: 看门狗实例
+        classes: {类名: 类}
+        hot_slots: {类名: [方法名]}，默认使用 DEFAULT_HOT_SLOTS
+    """
+    for class_name, method_names in (hot_slots or DEFAULT_HOT_SLOTS).items():
+        cls = classes.get(class_name)
+        if cls is None:
+            logger.warning(f"计时钩子: 未找到类 {class_name}")
+            continue
+        for method_name in method_names:
+            method = getattr(cls, method_name, None)
+            if method is None or hasattr(method, "__wrapped__"):
+                continue
+            setattr(cls, method_name, watchdog.timed(f"{class_name}.{method_name}", method))
+
+
+def load_profiling_options(config_path: str) -> Dict:
+    """
+    从 config.json 中读取卡顿看门狗配置，缺省时返回空字典（即不开启）。
+    支持的键：stall_watchdog, stall_threshold_ms, stall_report_dir
+    """
+    try:
+        with open(config_path, "r") as f:
+            config_data = json.load(f)
+    except Exception:
+        return {}
+    if not config_data.get("stall_watchdog"):
+        return {}
+    options = {"threshold": config_data.get("stall_threshold_ms", 250) / 1000}
+    if config_data.get("stall_report_dir"):
+        options["report_dir"] = config_data["stall_report_dir"]
+    return options
@@ -0,0 +1,294 @@
+# app/resilience.py
+import time
+import random
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Dict, Optional
+
+import requests
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+RETRIES = metrics.registry.counter("bili_api_retries_total", "B站API请求重试次数（按接口）")
+HEDGES = metrics.registry.counter("bili_api_hedges_total", "B站API对冲请求次数（按接口和获胜方）")
+BREAKER_STATE = metrics.registry.gauge("bili_api_circuit_state", "B站API熔断器状态（0=关闭，1=半开，2=打开）")
+
+RETRYABLE_HTTP_STATUS = {429, 500, 502, 503, 504}  # 可以重试的HTTP状态码
+
+
+class FetchFailed(requests.RequestException):
+    """请求失败（区别于"请求成功但结果为空"）。"""
+
+
+class CircuitOpenError(FetchFailed):
+    """接口的熔断器处于打开状态，请求未发出。"""
+
+
+class CircuitBreaker:
+    """
+    单个接口的熔断器。
+    - closed: 正常放行，连续失败达到阈值后打开
+    - open: 直接拒绝请求，等待 reset_timeout 秒后进入半开
+    - half_open: 只放行一个试探请求，成功则关闭，失败则重新打开
+    """
+    CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+    _STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        BREAKER_STATE.set(0, endpoint=name)
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        """是否允许发出请求（半开状态下同一时间只放行一个试探请求）。"""
+        with self._lock:
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self._set_state(self.HALF_OPEN)
+            if self._state == self.HALF_OPEN:
+                if self._trial_in_flight:
+                    return False
+                self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._trial_in_flight = False
+            if self._state != self.CLOSED:
+                logger.info("接口 %s 已恢复，熔断器关闭", self.name)
+                self._set_state(self.CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._state == self.HALF_OPEN or (self._state == self.CLOSED and self._failures >= self.failure_threshold):
+                logger.warning("接口 %s 连续失败，熔断 %.0f 秒", self.name, self.reset_timeout)
+                self._opened_at = time.monotonic()
+                self._set_state(self.OPEN)
+
+    def _set_state(self, state: str):
+        self._state = state
+        BREAKER_STATE.set(self._STATE_VALUES[state], endpoint=self.name)
+
+
+class LatencyWindow:
+    """最近N次成功请求的延迟，用于估计触发对冲请求的分位数。"""
+    def __init__(self, size: int = 100):
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=size)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def add(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def quantile(self, q: float) -> float:
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return 0.0
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+class ResilientClient:
+    """
+    B站API的GET请求容错层（所有接口都是幂等的GET请求）。
+    - 网络错误和 429/5xx 按指数退避 + 随机抖动重试
+    - 每个接口一个熔断器，接口持续失败时直接拒绝请求，避免对故障接口反复请求
+    - 请求耗时超过该接口最近延迟的高分位数时，再发出一个相同的对冲请求，取先返回的结果
+    """
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.25, max_delay: float = 4.0,
+                 failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 hedge_quantile: float = 0.95, hedge_min_samples: int = 20, max_hedge_workers: int = 4,
+                 http_get: Callable = None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+        self._http_get = http_get or requests.get
+        self._lock = threading.Lock()
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._latencies: Dict[str, LatencyWindow] = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_hedge_workers * 2, thread_name_prefix="ApiHedge")
+
+    def breaker(self, endpoint: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(endpoint)
+            if breaker is None:
+                breaker = self._breakers[endpoint] = CircuitBreaker(endpoint, self.failure_threshold, self.reset_timeout)
+                self._latencies[endpoint] = LatencyWindow()
+            return breaker
+
+    def hedge_delay(self, endpoint: str) -> Optional[float]:
+        """返回触发对冲请求的等待时间；样本不足时返回None（不对冲）。"""
+        window = self._latencies.get(endpoint)
+        if window is None or len(window) < self.hedge_min_samples:
+            return None
+        return window.quantile(self.hedge_quantile)
+
+    def backoff(self, attempt: int) -> float:
+        """第 attempt 次重试前的等待时间（full jitter）。"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def get(self, endpoint: str, url: str, **kwargs) -> requests.Response:
+        """
+        发出GET请求，失败时按策略重试。
+
+        Returns:
+            最终的响应（可能是不可重试的4xx响应，由调用方处理）
+
+        Raises:
+            CircuitOpenError: 熔断器打开，请求未发出
+            requests.RequestException: 所有重试都失败时抛出最后一次的异常
+        """
+        breaker = self.breaker(endpoint)
+        last_error: Optional[Exception] = None
+        for attempt in range(self.max_attempts):
+            if not breaker.allow():
+                if last_error is not None:
+                    raise last_error
+                raise CircuitOpenError(f"接口 {endpoint} 已熔断")
+            if attempt:
+                RETRIES.inc(endpoint=endpoint)
+            try:
+                response = self._attempt(endpoint, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                breaker.record_failure()
+                last_error = e
+            else:
+                if response.status_code not in RETRYABLE_HTTP_STATUS:
+                    breaker.record_success()
+                    return response
+                breaker.record_failure()
+                last_error = requests.HTTPError(f"HTTP {response.status_code}", response=response)
+                if attempt == self.max_attempts - 1:
+                    return response
+            if attempt < self.max_attempts - 1:
+                delay = self.backoff(attempt)
+                logger.debug("接口 %s 请求失败（%s），%.2f 秒后重试", endpoint, last_error, delay)
+                time.sleep(delay)
+        raise last_error
+
+    def _timed_get(self, endpoint: str, url: str, **kwargs) -> requests.Response:
+        start = time.perf_counter()
+        response = self._http_get(url, **kwargs)
+        if response.status_code not in RETRYABLE_HTTP_STATUS:
+            self._latencies[endpoint].add(time.perf_counter() - start)
+        return response
+
+    def _attempt(self, endpoint: str, url: str, **kwargs) -> requests.Response:
+        """单次请求；延迟样本足够时，超过分位数延迟仍未返回则发出对冲请求。"""
+        delay = self.hedge_delay(endpoint)
+        if delay is None:
+            return self._timed_get(endpoint, url, **kwargs)
+
+        primary = self._executor.submit(self._timed_get, endpoint, url, **kwargs)
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+
+        hedge = self._executor.submit(self._timed_get, endpoint, url, **kwargs)
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    response = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                HEDGES.inc(endpoint=endpoint, winner="hedge" if future is hedge else "primary")
+                return response
+        HEDGES.inc(endpoint=endpoint, winner="none")
+        raise error
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error: Optional[Exception] = None
+
+
+class SingleFlight:
+    """
+    合并相同键的查询：同一时间只有一个请求在执行，其他并发调用等待并共享它的结果；
+    结果在有效期内直接复用，失败（空）结果只缓存较短时间，避免对同一个失败的查询反复请求。
+    """
+    def __init__(self, ttl: float = 300.0, negative_ttl: float = 30.0):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        self._calls: Dict[object, _Call] = {}
+        self._results: Dict[object, tuple] = {}  # {键: (结果, 过期时间)}
+
+    def do(self, key, fn: Callable, *args):
+        """返回 fn(*args) 的结果；相同键的并发调用和有效期内的重复调用只执行一次。"""
+        with self._lock:
+            cached = self._results.get(key)
+            if cached is not None and cached[1] > time.monotonic():
+                metrics.CACHE_LOOKUPS.inc(cache="single_flight", result="hit")
+                return cached[0]
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            metrics.CACHE_LOOKUPS.inc(cache="single_flight", result="shared")
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        metrics.CACHE_LOOKUPS.inc(cache="single_flight", result="miss")
+        try:
+            call.value = fn(*args)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                if call.error is None:
+                    ttl = self.ttl if call.value else self.negative_ttl
+                    self._results[key] = (call.value, time.monotonic() + ttl)
+            call.event.set()
+        return call.value
+
+    def forget(self, key=None):
+        """丢弃指定键（默认全部）的缓存结果。"""
+        with self._lock:
+            if key is None:
+                self._results.clear()
+            else:
+                self._results.pop(key, None)
@@ -0,0 +1,163 @@
+# app/search_index.py
+import threading
+import logging
+from collections import defaultdict
+from typing import Dict, List, Set, Tuple, Union
+
+from .emote_records import Emote, EmotePackage
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize(text: str) -> str:
+    """统一大小写，便于不区分大小写的匹配。"""
+    return text.casefold()
+
+
+def _grams(text: str) -> Set[str]:
+    """
+    生成文本的1-gram和2-gram集合。
+    中文没有空格分词，因此对所有字符统一使用字符级n-gram。
+    """
+    grams = set(text)
+    grams.update(text[i:i + 2] for i in range(len(text) - 1))
+    return grams
+
+
+class EmoticonSearchIndex:
+    """
+    跨表情包的表情搜索索引。
+    - 对表情名称建立字符级1/2-gram倒排索引，支持前缀/子串匹配（包括中文）
+    - 表情包名称和类型在包级别索引，匹配时展开为该包的全部表情
+    - update() 按表情包增量更新，未变化的包不会重新建立索引
+    - 同级结果按加载顺序（表情包顺序、包内表情顺序）排列，与表情包是否被重新索引无关
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._next_doc_id = 0
+        self._docs: Dict[int, Emote] = {}              # {doc_id: Emote}
+        self._doc_names: Dict[int, str] = {}           # {doc_id: 规范化后的表情名称}
+        self._doc_ranks: Dict[int, Tuple[int, int]] = {}  # {doc_id: (表情包加载顺序, 包内顺序)}
+        self._name_grams: Dict[str, Set[int]] = defaultdict(set)  # 表情名称倒排索引 {gram: {doc_id}}
+        self._packages: Dict[Union[int, str], Dict] = {}  # {pkg_id: {"key": 签名, "name": 规范化包名, "type": 类型, "rank": 加载顺序, "docs": [doc_id]}}
+
+    def __len__(self):
+        return len(self._docs)
+
+    def update(self, emoticons: Dict[Union[int, str], EmotePackage]):
+        """
+        使用最新加载的表情包数据增量更新索引。
+        表情列表未变化的包只会替换表情对象引用，不会重新计算n-gram。
+        """
+        reindexed = 0
+        with self._lock:
+            for pkg_id in [pkg_id for pkg_id in self._packages if pkg_id not in emoticons]:
+                self._remove_package(pkg_id)
+
+            for rank, (pkg_id, package) in enumerate(emoticons.items()):
+                key = tuple((str(e.id), e.name) for e in package.emotes)
+                entry = self._packages.get(pkg_id)
+                if entry is not None and entry["key"] == key:
+                    # 表情未变化：只更新对象引用和包级信息（包括加载顺序）
+                    for index, (doc_id, emote) in enumerate(zip(entry["docs"], package.emotes)):
+                        self._docs[doc_id] = emote
+                        self._doc_ranks[doc_id] = (rank, index)
+                    entry["name"] = _normalize(package.name)
+                    entry["type"] = package.type
+                    entry["rank"] = rank
+                    continue
+
+                if entry is not None:
+                    self._remove_package(pkg_id)
+                self._add_package(pkg_id, package, key, rank)
+                reindexed += 1
+
+        logger.debug("搜索索引已更新: 重新索引 %d 个表情包，共 %d 个表情", reindexed, len(self._docs))
+
+    def _add_package(self, pkg_id, package: EmotePackage, key: tuple, rank: int):
+        doc_ids = []
+        for index, emote in enumerate(package.emotes):
+            doc_id = self._next_doc_id
+            self._next_doc_id += 1
+            name = _normalize(emote.name)
+            self._docs[doc_id] = emote
+            self._doc_names[doc_id] = name
+            self._doc_ranks[doc_id] = (rank, index)
+            for gram in _grams(name):
+                self._name_grams[gram].add(doc_id)
+            doc_ids.append(doc_id)
+        self._packages[pkg_id] = {
+            "key": key,
+            "name": _normalize(package.name),
+            "type": package.type,
+            "rank": rank,
+            "docs": doc_ids
+        }
+
+    def _remove_package(self, pkg_id):
+        entry = self._packages.pop(pkg_id)
+        for doc_id in entry["docs"]:
+            name = self._doc_names.pop(doc_id)
+            del self._docs[doc_id]
+            del self._doc_ranks[doc_id]
+            for gram in _grams(name):
+                postings = self._name_grams.get(gram)
+                if postings is not None:
+                    postings.discard(doc_id)
+                    if not postings:
+                        del self._name_grams[gram]
+
+    def search(self, query: str, limit: int = 500) -> List[Emote]:
+        """
+        搜索表情名称、表情包名称或类型中包含 query 的表情。
+        结果排序：名称前缀匹配 > 名称子串匹配 > 表情包名称/类型匹配，同级按加载顺序。
+        """
+        query = _normalize(query.strip())
+        if not query:
+            return []
+
+        with self._lock:
+            # 1. 表情名称匹配：用最短的n-gram倒排列表求交集，再逐个验证子串
+            grams = [query] if len(query) == 1 else [query[i:i + 2] for i in range(len(query) - 1)]
+            postings = []
+            for gram in set(grams):
+                docs = self._name_grams.get(gram)
+                if not docs:
+                    postings = []
+                    break
+                postings.append(docs)
+
+            prefix_hits, substring_hits = [], []
+            if postings:
+                postings.sort(key=len)
+                candidates = postings[0].intersection(*postings[1:]) if len(postings) > 1 else postings[0]
+                for doc_id in candidates:
+                    name = self._doc_names[doc_id]
+                    if name.startswith(query):
+                        prefix_hits.append(doc_id)
+                    elif query in name:
+                        substring_hits.append(doc_id)
+            # doc_id 只反映建立索引的先后（重新索引的包会排到最后），同级结果按加载顺序排列
+            prefix_hits.sort(key=self._doc_ranks.__getitem__)
+            substring_hits.sort(key=self._doc_ranks.__getitem__)
+
+            matched = prefix_hits + substring_hits
+            if len(matched) < limit:
+                # 2. 表情包名称/类型匹配：展开为整个包的表情
+                seen = set(matched)
+                for entry in sorted(self._packages.values(), key=lambda entry: entry["rank"]):
+                    if query in entry["name"] or query == entry["type"]:
+                        matched.extend(doc_id for doc_id in entry["docs"] if doc_id not in seen)
+                        if len(matched) >= limit:
+                            break
+
+            return [self._docs[doc_id] for doc_id in matched[:limit]]
+
+    def clear(self):
+        """清空索引。"""
+        with self._lock:
+            self._docs.clear()
+            self._doc_names.clear()
+            self._doc_ranks.clear()
+            self._name_grams.clear()
+            self._packages.clear()
@@ -0,0 +1,128 @@
+# app/send_payload.py
+import time
+import json
+import logging
+import threading
+from urllib.parse import urlencode
+from typing import Dict, Optional, Tuple
+
+from .emote_records import Emote
+
+logger = logging.getLogger(__name__)
+
+
+class SendPayloadCache:
+    """
+    发送载荷预处理层。
+    - 按Cookie缓存解析出的CSRF Token和请求头，只在Cookie变化时重新解析
+    - 按 (房间号, 表情) 缓存已经URL编码的请求体片段（不含 rnd），Cookie变化时整体失效
+    发送时只需要把 rnd 拼接到缓存的片段后面。
+    """
+    MAX_FRAGMENTS = 4096  # 缓存的请求体片段上限，超出后整体清空
+
+    def __init__(self, user_agent: str):
+        self._user_agent = user_agent
+        self._lock = threading.Lock()
+        self._cookie = None
+        self._csrf = ""
+        self._headers: Dict[str, str] = {}
+        self._fragments: Dict[Tuple, bytes] = {}
+
+    def _prepare(self, cookie: str):
+        """Cookie变化时重新解析CSRF、构建请求头并清空片段缓存。调用方需持有锁。"""
+        if cookie == self._cookie:
+            return
+        self._cookie = cookie
+        self._csrf = parse_csrf(cookie)
+        self._headers = {
+            "Cookie": cookie,
+            "User-Agent": self._user_agent,
+            "Content-Type": "application/x-www-form-urlencoded"
+        }
+        self._fragments.clear()
+
+    def csrf(self, cookie: str) -> str:
+        with self._lock:
+            self._prepare(cookie)
+            return self._csrf
+
+    def headers(self, cookie: str) -> Dict[str, str]:
+        with self._lock:
+            self._prepare(cookie)
+            return self._headers
+
+    def fragment(self, cookie: str, room_id: int, emote: Emote) -> Optional[bytes]:
+        """
+        返回表情在指定房间的已编码请求体片段（不含 rnd）。
+        如果Cookie中没有CSRF Token则返回 None。
+        """
+        key = (room_id, emote.type, emote.id, emote.name, emote.url)
+        with self._lock:
+            self._prepare(cookie)
+            if not self._csrf:
+                return None
+            fragment = self._fragments.get(key)
+            if fragment is None:
+                if len(self._fragments) >= self.MAX_FRAGMENTS:
+                    self._fragments.clear()
+                fragment = self._fragments[key] = urlencode(build_payload_fields(room_id, emote, self._csrf)).encode('ascii')
+        return fragment
+
+    @staticmethod
+    def fill(fragment: bytes) -> bytes:
+        """把当前时间戳 rnd 拼接到请求体片段后面。"""
+        return b"%s&rnd=%d" % (fragment, int(time.time()))
+
+
+def parse_cookie_value(cookie: str, key: str) -> str:
+    """从Cookie字符串中提取指定字段的值，没有时返回空字符串。"""
+    try:
+        found = ''
+        for pair in cookie.split(';'):
+            name, sep, value = pair.partition('=')
+            if sep and name.strip() == key:
+                found = value
+        return found
+    except Exception as e:
+        logger.error(f"从Cookie中解析 {key} 失败: {e}")
+        return ''
+
+
+def parse_csrf(cookie: str) -> str:
+    """从Cookie字符串中提取bili_jct (csrf_token)。"""
+    return parse_cookie_value(cookie, 'bili_jct')
+
+
+def build_payload_fields(room_id: int, emoticon_data: Emote, csrf_token: str) -> Dict:
+    """构建发送表情弹幕的表单字段（不含随时间变化的 rnd 字段）。"""
+    # 根据表情类型构建消息内容
+    if emoticon_data.type == "upower":
+        msg = emoticon_data.name  # 充电表情直接使用特殊格式的名称
+    elif emoticon_data.type == "live":
+        msg = f"{emoticon_data.id}" # 直播间表情使用ID代码
+    else:
+        msg = f"upower_{emoticon_data.name}" # 普通表情使用文字代码
+
+    payload = {
+        "bubble": 0,
+        "msg": msg,
+        "color": 16777215,
+        "fontsize": 25,
+        "mode": 1,
+        "roomid": room_id,
+        "csrf": csrf_token,
+        "csrf_token": csrf_token
+    }
+
+    # 对于直播间和充电表情，需要额外附加dm_type和emoticonOptions
+    if emoticon_data.type in ['live', 'upower', 'user']:
+        payload['dm_type'] = 1
+        # 构建emoticonOptions的JSON字符串
+        options = {
+            "bulge_display": 0,
+            "emoticon_unique": emoticon_data.id,
+            "url": emoticon_data.url,
+            "is_dynamic": 1
+        }
+        payload['emoticon_options'] = json.dumps(options, ensure_ascii=False)
+    return payload
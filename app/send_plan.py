@@ -0,0 +1,157 @@
+# app/send_plan.py
+import os
+import json
+import logging
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from . import config
+from .emote_records import Emote
+from .file_lock import FileLock, atomic_write
+
+logger = logging.getLogger(__name__)
+
+
+class SendPlan:
+    """
+    发送计划：基于环形缓冲区的发送队列。
+    - 表情按添加顺序保存在列表中，用游标指向下一个要发送的表情
+    - 循环模式下只移动游标（O(1)），不需要在列表头尾搬移元素
+    - 每个表情的发送载荷按 (房间号, Cookie) 预先编译，每次发送只需填入 rnd 后提交
+    """
+    def __init__(self):
+        self._entries: List[Emote] = []
+        self._payloads: List[Optional[bytes]] = []
+        self._cursor = 0
+        self._compiled_key = None  # 已编译载荷对应的 (房间号, Cookie)
+        self._dirty = False  # 是否有尚未编译载荷的表情
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __bool__(self):
+        return bool(self._entries)
+
+    @property
+    def cursor(self) -> int:
+        """下一个要发送的表情在队列中的位置。"""
+        return self._cursor
+
+    @property
+    def entries(self) -> List[Emote]:
+        return list(self._entries)
+
+    def append(self, emote: Emote):
+        """把表情追加到队列末尾。"""
+        self._entries.append(emote)
+        self._payloads.append(None)
+        self._dirty = True
+
+    def replace(self, emotes: List[Emote]):
+        """一次性用新的表情列表替换整个队列（用于载入预设）。"""
+        self._entries = list(emotes)
+        self._payloads = [None] * len(self._entries)
+        self._cursor = 0
+        self._compiled_key = None
+        self._dirty = bool(self._entries)
+
+    def clear(self):
+        self.replace([])
+
+    def compile(self, key, build_payload: Callable[[Emote], Optional[bytes]]):
+        """
+        为队列中所有表情预先构建发送载荷。key 变化（切换房间或Cookie）时重新编译。
+        """
+        if key == self._compiled_key and not self._dirty:
+            return
+        if key != self._compiled_key:
+            self._payloads = [None] * len(self._entries)
+        self._payloads = [payload if payload is not None else build_payload(emote)
+                          for emote, payload in zip(self._entries, self._payloads)]
+        self._compiled_key = key
+        self._dirty = False
+
+    def advance(self, loop: bool) -> Tuple[int, Emote, Optional[bytes]]:
+        """
+        取出下一个要发送的表情及其预编译载荷。
+
+        Returns:
+            (该表情在取出前的位置, 表情, 载荷) 元组
+        """
+        index = self._cursor
+        emote = self._entries[index]
+        payload = self._payloads[index]
+        if loop:
+            # 循环模式：只移动游标
+            self._cursor = (index + 1) % len(self._entries)
+        else:
+            # 普通模式：移除已发送的表情，游标保持在原位置
+            del self._entries[index]
+            del self._payloads[index]
+            if self._cursor >= len(self._entries):
+                self._cursor = 0
+        return index, emote, payload
+
+
+class PresetStore:
+    """
+    发送组合预设的持久化存储。
+    预设保存为 {预设名: [表情字典, ...]}，写入 cache/data/presets.json。
+    多个实例共享这个文件：读取前检查文件修改时间，发现其他实例的修改时重新加载；
+    保存和删除在跨进程文件锁内重新读取文件、只修改对应的预设后原子写回，不会覆盖其他实例保存的预设。
+    """
+    def __init__(self, file_path: str = None):
+        self._file_path = file_path or os.path.join(config.DATA_CACHE_DIR, "presets.json")
+        self._lock = threading.Lock()
+        self._presets: Dict[str, List[Dict]] = {}
+        self._mtime = None  # 最近一次读取/写入时文件的修改时间
+        with self._lock:
+            self._refresh()
+        if self._presets:
+            logger.info(f"发送预设已加载，共 {len(self._presets)} 个")
+
+    def _refresh(self, force: bool = False):
+        """文件被修改过（包括其他实例）时重新加载；force 为 True 时总是重新读取。调用方需持有锁。"""
+        try:
+            mtime = os.stat(self._file_path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self._mtime and not force:
+            return
+        try:
+            with open(self._file_path, 'r', encoding='utf-8') as f:
+                self._presets = json.load(f)
+            self._mtime = mtime
+        except Exception as e:
+            logger.error(f"加载发送预设失败: {e}")
+
+    def _save(self):
+        """原子写回文件。调用方需持有锁和跨进程文件锁。"""
+        try:
+            atomic_write(self._file_path, json.dumps(self._presets, ensure_ascii=False, indent=2))
+            self._mtime = os.stat(self._file_path).st_mtime_ns
+        except Exception as e:
+            logger.error(f"保存发送预设失败: {e}")
+
+    def names(self) -> List[str]:
+        with self._lock:
+            self._refresh()
+            return list(self._presets)
+
+    def get(self, name: str) -> List[Dict]:
+        with self._lock:
+            self._refresh()
+            return list(self._presets.get(name, []))
+
+    def save(self, name: str, emotes: List[Emote]):
+        """保存（或覆盖）一个预设。"""
+        with self._lock, FileLock.for_path(self._file_path):
+            self._refresh(force=True)
+            self._presets[name] = [e.to_dict() for e in emotes]
+            self._save()
+
+    def delete(self, name: str):
+        with self._lock, FileLock.for_path(self._file_path):
+            self._refresh(force=True)
+            if self._presets.pop(name, None) is not None:
+                self._save()
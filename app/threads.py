@@ -3,6 +3,8 @@ import traceback
 import logging
 from PyQt5.QtCore import QObject, pyqtSignal
 
+logger = logging.getLogger(__name__)
+
 class WorkerSignals(QObject):
     """
     定义正在运行的工作线程提供的信号:
@@ -33,7 +35,7 @@ class Worker(QObject):
         try:
             result = self.fn(*self.args, **self.kwargs)
         except Exception as e:
-            logging.error(f"Error in worker thread: {e}")
+            logger.error(f"Error in worker thread: {e}")
             traceback.print_exc()
             exctype, value = type(e), e
             self.signals.error.emit((exctype, value, traceback.format_exc()))
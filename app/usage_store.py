@@ -0,0 +1,182 @@
+# app/usage_store.py
+import os
+import json
+import math
+import time
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from . import config
+from .emote_records import Emote
+from .file_lock import FileLock, atomic_write
+
+logger = logging.getLogger(__name__)
+
+
+def emote_key(emote: Emote) -> str:
+    """表情在收藏/统计中的唯一键：类型+ID（不同类型的表情ID可能重复）。"""
+    return f"{emote.type}:{emote.id}"
+
+
+class UsageStore:
+    """
+    表情收藏与使用频率统计的持久化存储。
+    - record_send / toggle_favorite 只修改内存中的字典，时间复杂度 O(1)
+    - 磁盘写入由定时器线程批量完成，不阻塞发送路径和UI线程
+    - 使用频率按指数衰减计分：score(t) = score(t0) * 0.5 ^ ((t - t0) / 半衰期)
+    - 多个实例共享同一个文件：写入时在跨进程文件锁内重新读取文件，把本实例尚未写入的发送记录和收藏切换
+      合并进去后原子写回，不会覆盖其他实例的统计
+    """
+    HALF_LIFE = 7 * 24 * 3600  # 使用分数半衰期（秒）
+
+    def __init__(self, file_path: str = None, batch_delay: float = 2.0):
+        self._file_path = file_path or os.path.join(config.DATA_CACHE_DIR, "usage.json")
+        self._batch_delay = batch_delay
+        self._lock = threading.Lock()
+        self._batch_timer = None
+        # 尚未写入文件的修改：发送记录 [(key, 表情字典, 房间号, 时间戳)] 和收藏切换后的状态 {key: 表情字典或None}
+        self._pending_sends: List[Tuple[str, Dict, int, float]] = []
+        self._pending_favorites: Dict[str, Optional[Dict]] = {}
+
+        # {key: {"emote": 表情字典, "count": 次数, "last_sent": 时间戳, "rooms": {room_id: 次数}, "score": 分数, "score_time": 时间戳}}
+        self._usage: Dict[str, Dict] = {}
+        # {key: 表情字典}
+        self._favorites: Dict[str, Dict] = {}
+
+        self._load()
+
+    def _load(self):
+        """从文件加载收藏和使用统计。"""
+        try:
+            self._usage, self._favorites = self._read_file()
+            if self._usage or self._favorites:
+                logger.info(f"使用统计已加载: {len(self._usage)} 条使用记录, {len(self._favorites)} 个收藏")
+        except Exception as e:
+            logger.error(f"加载使用统计失败: {e}")
+            self._usage, self._favorites = {}, {}
+
+    def _read_file(self) -> Tuple[Dict[str, Dict], Dict[str, Dict]]:
+        """读取文件中的 (使用统计, 收藏)，文件不存在时返回空字典。"""
+        if not os.path.exists(self._file_path):
+            return {}, {}
+        with open(self._file_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return data.get("usage", {}), data.get("favorites", {})
+
+    def _schedule_batch_write(self):
+        """安排批量写入（已有待执行的写入时不重复安排）。调用方需持有锁。"""
+        if self._batch_timer is not None:
+            return
+        self._batch_timer = threading.Timer(self._batch_delay, self.flush)
+        self._batch_timer.daemon = True
+        self._batch_timer.start()
+
+    def flush(self):
+        """把尚未写入的修改合并到文件中。在应用程序退出前调用此方法。"""
+        with self._lock:
+            if self._batch_timer is not None:
+                self._batch_timer.cancel()
+                self._batch_timer = None
+            if not self._pending_sends and not self._pending_favorites:
+                return
+            sends, self._pending_sends = self._pending_sends, []
+            favorites, self._pending_favorites = self._pending_favorites, {}
+
+        try:
+            with FileLock.for_path(self._file_path):
+                # 以文件中的数据（可能包含其他实例的修改）为准，合并本实例的修改
+                usage, merged_favorites = self._read_file()
+                self._apply_changes(usage, merged_favorites, sends, favorites)
+                atomic_write(self._file_path, json.dumps({"usage": usage, "favorites": merged_favorites}, ensure_ascii=False))
+        except Exception as e:
+            logger.error(f"保存使用统计失败: {e}")
+            with self._lock:
+                # 写入失败：修改放回待写入列表（排在期间新产生的修改之前），下次写入时重试
+                self._pending_sends = sends + self._pending_sends
+                self._pending_favorites = dict(favorites, **self._pending_favorites)
+            return
+
+        with self._lock:
+            # 内存数据换成合并后的结果，再重放写入期间产生的修改
+            self._apply_changes(usage, merged_favorites, self._pending_sends, self._pending_favorites)
+            self._usage, self._favorites = usage, merged_favorites
+        logger.debug(f"使用统计已保存: {len(usage)} 条记录")
+
+    def _apply_changes(self, usage: Dict[str, Dict], favorites: Dict[str, Dict],
+                       sends: List[Tuple[str, Dict, int, float]], favorite_states: Dict[str, Optional[Dict]]):
+        """把发送记录和收藏切换应用到给定的字典上。"""
+        for key, emote_dict, room_id, now in sends:
+            self._apply_send(usage, key, emote_dict, room_id, now)
+        for key, emote_dict in favorite_states.items():
+            if emote_dict is None:
+                favorites.pop(key, None)
+            else:
+                favorites[key] = emote_dict
+
+    def _apply_send(self, usage: Dict[str, Dict], key: str, emote_dict: Dict, room_id: int, now: float):
+        """在使用统计中记录一次发送。"""
+        record = usage.get(key)
+        if record is None:
+            record = usage[key] = {"emote": emote_dict, "count": 0, "last_sent": 0,
+                                   "rooms": {}, "score": 0.0, "score_time": now}
+        room_key = str(room_id)
+        record["count"] += 1
+        record["last_sent"] = max(record["last_sent"], now)
+        record["rooms"][room_key] = record["rooms"].get(room_key, 0) + 1
+        # 衰减计分按记录的计分时间计算；其他实例写入了更晚的计分时间时，本次发送按时间差衰减后再累加
+        score_time = record.get("score_time", now)
+        if now >= score_time:
+            record["score"] = self._decayed_score(record, now) + 1.0
+            record["score_time"] = now
+        else:
+            record["score"] = record.get("score", 0.0) + math.pow(0.5, (score_time - now) / self.HALF_LIFE)
+
+    def _decayed_score(self, record: Dict, now: float) -> float:
+        elapsed = max(0.0, now - record.get("score_time", now))
+        return record.get("score", 0.0) * math.pow(0.5, elapsed / self.HALF_LIFE)
+
+    def record_send(self, emote: Emote, room_id: int, now: Optional[float] = None):
+        """记录一次成功发送。"""
+        now = time.time() if now is None else now
+        key = emote_key(emote)
+        emote_dict = emote.to_dict()
+        with self._lock:
+            self._apply_send(self._usage, key, emote_dict, room_id, now)
+            self._pending_sends.append((key, emote_dict, room_id, now))
+            self._schedule_batch_write()
+
+    def toggle_favorite(self, emote: Emote) -> bool:
+        """切换表情的收藏状态，返回切换后是否为收藏。"""
+        key = emote_key(emote)
+        with self._lock:
+            if key in self._favorites:
+                del self._favorites[key]
+                self._pending_favorites[key] = None
+                is_favorite = False
+            else:
+                self._favorites[key] = self._pending_favorites[key] = emote.to_dict()
+                is_favorite = True
+            self._schedule_batch_write()
+        return is_favorite
+
+    def is_favorite(self, emote: Emote) -> bool:
+        return emote_key(emote) in self._favorites
+
+    def get_favorites(self) -> List[Dict]:
+        """返回收藏的表情字典列表（按收藏顺序）。"""
+        with self._lock:
+            return [dict(e, key=key) for key, e in self._favorites.items()]
+
+    def get_frequent(self, limit: int = 30, now: Optional[float] = None) -> List[Dict]:
+        """返回按衰减频率分数排序的常用表情字典列表。"""
+        now = time.time() if now is None else now
+        with self._lock:
+            ranked = sorted(self._usage.items(), key=lambda item: self._decayed_score(item[1], now), reverse=True)
+            return [dict(record["emote"], key=key) for key, record in ranked[:limit]]
+
+    def get_usage(self, emote: Emote) -> Optional[Dict]:
+        """返回单个表情的使用统计（次数、最后发送时间、各房间次数）。"""
+        with self._lock:
+            record = self._usage.get(emote_key(emote))
+            return dict(record) if record else None
@@ -1,18 +1,25 @@
 # app/views.py
 import sys
 from PyQt5.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-                             QListWidget, QListWidgetItem, QGridLayout, QLineEdit, QPushButton,
+                             QListWidget, QListWidgetItem, QLineEdit, QPushButton,
                              QLabel, QSpinBox, QCheckBox, QScrollArea, QFrame, QMessageBox,
-                             QSizePolicy,QSlider, QComboBox)
-from PyQt5.QtCore import Qt, QSize, pyqtSignal
-from PyQt5.QtGui import QIcon, QPixmap, QFont
-from typing import Dict, List
+                             QSizePolicy,QSlider, QComboBox, QMenu, QInputDialog, QPlainTextEdit,
+                             QDialog, QFileDialog, QLayout, QWidgetItem)
+from PyQt5.QtCore import Qt, QSize, QRect, QTimer, pyqtSignal
+from PyQt5.QtGui import QIcon, QPixmap, QFont, QImage
+from typing import Dict, List, Union
+from collections import defaultdict
 
 # 从同级目录的 config.py 中导入默认值
 from . import config
+from .emote_records import Emote
+from .usage_store import emote_key
+from .animation import AnimatedIconManager
 
 import logging
 
+logger = logging.getLogger(__name__)
+
 class EmoticonButton(QPushButton):
     """
     自定义的表情按钮控件
@@ -21,38 +28,55 @@ class EmoticonButton(QPushButton):
     """
     # 定义自定义信号
     # 信号1: 当按钮被点击时，发射自己的表情数据
-    clicked_with_data = pyqtSignal(dict)
+    clicked_with_data = pyqtSignal(object)
     # 信号2: 当按钮被创建时，请求控制器加载并设置其图标
     request_image_load = pyqtSignal(object, str, str) # 参数: 按钮实例, 图片url, 表情id
+    # 信号3: 当用户在右键菜单中选择收藏/取消收藏时，发射自己的表情数据
+    favorite_toggled = pyqtSignal(object)
 
-    def __init__(self, emoticon_data: dict, initial_size: int, parent=None):
+    def __init__(self, emoticon_data: Emote, initial_size: int, parent=None, animations: AnimatedIconManager = None):
         super().__init__(parent)
         self.emoticon_data = emoticon_data
+        self.animations = animations  # 动态表情管理器（为None时只显示静态图标）
         
         # # 统一设置按钮外观
         # self.setFixedSize(128, 128)
         # self.setIconSize(QSize(112, 112))
         # 【修改】不再硬编码尺寸，而是根据传入的尺寸初始化
         self.update_size(initial_size)
-        self.setToolTip(f"{self.emoticon_data['name']}\n类型: {self.emoticon_data['type']}")
+        self.setToolTip(f"{self.emoticon_data.name}\n类型: {self.emoticon_data.type}")
         
         # 连接内置的 clicked 信号到一个自定义的槽函数
         self.clicked.connect(self._on_click)
 
+        # 右键菜单：收藏/取消收藏
+        self.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.customContextMenuRequested.connect(self._show_context_menu)
+
     def _on_click(self):
         """内部槽函数，当按钮被点击时，发射带有数据的自定义信号。"""
         self.clicked_with_data.emit(self.emoticon_data)
 
-    def set_icon_from_path(self, path: str):
+    def _show_context_menu(self, pos):
+        """显示右键菜单。"""
+        menu = QMenu(self)
+        favorite_action = menu.addAction("⭐ 收藏 / 取消收藏")
+        if menu.exec_(self.mapToGlobal(pos)) is favorite_action:
+            self.favorite_toggled.emit(self.emoticon_data)
+
+    def set_emoticon_data(self, emoticon_data: Emote):
         """
-        由控制器调用的方法，用于在图片加载完成后设置按钮的图标。
+        复用按钮时替换其表情数据（表情类型和ID不变）。
+        图片URL不变时保留已加载的图标；URL变化时清除旧图标并重新请求加载。
         """
-        if path and isinstance(path, str):
-            pixmap = QPixmap(path)
-            self.setIcon(QIcon(pixmap))
-        else:
-            # 如果图片加载失败，显示表情名字的前4个字符作为回退
-            self.setText(self.emoticon_data["name"][:4])
+        url_changed = emoticon_data.url != self.emoticon_data.url
+        self.emoticon_data = emoticon_data
+        self.setToolTip(f"{self.emoticon_data.name}\n类型: {self.emoticon_data.type}")
+        if url_changed:
+            if self.animations is not None:
+                self.animations.unsubscribe(self)
+            self.setIcon(QIcon())
+            self.request_image_load.emit(self, emoticon_data.url, str(emoticon_data.id))
 
     def update_size(self, icon_size: int):
         """根据给定的图标大小更新按钮和图标的尺寸"""
@@ -61,22 +85,138 @@ class EmoticonButton(QPushButton):
         self.setIconSize(QSize(icon_size, icon_size))
 
 
+class EmoticonFlowLayout(QLayout):
+    """
+    固定单元格大小的流式网格布局。
+    根据可用宽度计算列数，再用算术直接算出每个按钮的位置；
+    列数、顺序或单元格大小变化时不需要像 QGridLayout 那样把控件逐个重新插入布局。
+    """
+    def __init__(self, parent=None, spacing: int = 5):
+        super().__init__(parent)
+        self._items: List[QWidgetItem] = []
+        self._spacing = spacing
+        self._cell_size = config.ICON_SIZE + 16
+        self._geometry_key = None  # 上次排列时的参数，未变化时跳过重新定位
+
+    def addItem(self, item):
+        self._items.append(item)
+        self._geometry_key = None
+
+    def count(self) -> int:
+        return len(self._items)
+
+    def itemAt(self, index: int):
+        return self._items[index] if 0 <= index < len(self._items) else None
+
+    def takeAt(self, index: int):
+        if 0 <= index < len(self._items):
+            self._geometry_key = None
+            return self._items.pop(index)
+        return None
+
+    def spacing(self) -> int:
+        return self._spacing
+
+    def expandingDirections(self):
+        return Qt.Orientations(0)
+
+    def set_cell_size(self, size: int):
+        """设置单元格（按钮）边长。"""
+        if size != self._cell_size:
+            self._cell_size = size
+            self._geometry_key = None
+            self.invalidate()
+
+    def set_widgets(self, widgets: list):
+        """
+        按给定顺序一次性替换布局中的控件。
+        已在布局中的控件复用原有布局项，只为新控件创建布局项。
+        """
+        items_by_widget = {item.widget(): item for item in self._items}
+        items, added = [], []
+        for widget in widgets:
+            item = items_by_widget.pop(widget, None)
+            if item is None:
+                self.addChildWidget(widget)
+                item = QWidgetItem(widget)
+                added.append(widget)
+            items.append(item)
+        self._items = items
+        self._geometry_key = None
+        parent = self.parentWidget()
+        if added and parent is not None and parent.isVisible():
+            # addChildWidget 会为每个新控件排队一次显示，而每次显示子控件都会同步激活父布局（遍历全部布局项），
+            # 上千个按钮时是 O(n²)。这里在禁用布局的情况下一次性显示，排队的显示请求随后直接跳过
+            self.setEnabled(False)
+            for widget in added:
+                if not widget.isHidden() or not widget.testAttribute(Qt.WA_WState_ExplicitShowHide):
+                    widget.show()
+            self.setEnabled(True)
+        self.invalidate()
+
+    def columns_for(self, width: int) -> int:
+        """计算给定宽度下的列数（至少一列）。"""
+        left, _, right, _ = self.getContentsMargins()
+        usable = width - left - right
+        return max(1, (usable + self._spacing) // (self._cell_size + self._spacing))
+
+    def hasHeightForWidth(self) -> bool:
+        return True
+
+    def heightForWidth(self, width: int) -> int:
+        _, top, _, bottom = self.getContentsMargins()
+        rows = -(-len(self._items) // self.columns_for(width))
+        return top + bottom + rows * self._cell_size + max(0, rows - 1) * self._spacing
+
+    def minimumSize(self) -> QSize:
+        left, top, right, bottom = self.getContentsMargins()
+        return QSize(self._cell_size + left + right, self._cell_size + top + bottom)
+
+    def sizeHint(self) -> QSize:
+        return self.minimumSize()
+
+    def setGeometry(self, rect: QRect):
+        super().setGeometry(rect)
+        left, top, _, _ = self.getContentsMargins()
+        cols = self.columns_for(rect.width())
+        key = (rect.x(), rect.y(), cols, self._cell_size, len(self._items))
+        if key == self._geometry_key:
+            return  # 列数未变化（例如只是窗口高度变化），按钮位置不变
+        self._geometry_key = key
+
+        step = self._cell_size + self._spacing
+        x0, y0 = rect.x() + left, rect.y() + top
+        for index, item in enumerate(self._items):
+            row, col = divmod(index, cols)
+            # 直接设置控件位置：QWidgetItem.setGeometry 会跳过尚未显示的新按钮
+            item.widget().setGeometry(x0 + col * step, y0 + row * step, self._cell_size, self._cell_size)
+
+
 class EmoticonPackageWidget(QWidget):
     """
     用于网格布局展示一个表情包内所有表情的容器控件。
+    - 按钮位置由 EmoticonFlowLayout 按宽度算术计算，窗口缩放时无需重新插入控件
+    - 图标大小变化和重排请求会合并，每帧（约16ms）最多执行一次
     """
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.layout = QGridLayout()
-        # 设置布局，让按钮之间没有多余的间隙
-        self.layout.setSpacing(5)
-        self.layout.setAlignment(Qt.AlignTop)
+        self.layout = EmoticonFlowLayout(spacing=5)
         self.setLayout(self.layout)
         self.emoticon_buttons = []
+        # 图片URL -> 按钮列表索引（同一张图片可能出现多次，例如"常用"和搜索结果中重复的表情）
+        self._buttons_by_url: Dict[str, List[EmoticonButton]] = {}
 
-        self._current_emoticons = []
-        self._current_cols = 0
         self._current_icon_size = config.ICON_SIZE # 默认图标大小
+        self._applied_icon_size = config.ICON_SIZE # 已应用到按钮上的图标大小
+
+        # 合并重排请求的定时器
+        self._relayout_timer = QTimer(self)
+        self._relayout_timer.setSingleShot(True)
+        self._relayout_timer.setInterval(16)
+        self._relayout_timer.timeout.connect(self._relayout_emoticons)
+
+        # 动态表情：每张图片共享一个解码器
+        self.animations = AnimatedIconManager(self, icon_size=self._current_icon_size)
 
     def minimumSizeHint(self):
         """
@@ -88,74 +228,166 @@ class EmoticonPackageWidget(QWidget):
         # 返回一个宽度为0，高度由父类正常计算的尺寸
         return QSize(0, super().minimumSizeHint().height())
 
-    def resizeEvent(self, event):
-        """当窗口大小改变时，重新计算布局。"""
-        super().resizeEvent(event)
-        #logging.debug(f"当前容器宽度{self.width()}")
-        self._relayout_emoticons()
-
-    def set_emoticons(self, emoticons: list):
+    def set_emoticons(self, emoticons: List[Emote]) -> List[EmoticonButton]:
         """
-        清空并使用新的表情数据填充网格。
+        使用新的表情数据填充网格（按表情的类型和ID增量更新，不同类型的表情ID可能重复）。
+        类型和ID未变化的按钮会被直接复用（图片URL也未变化时保留已加载的图标），只创建新增的按钮、删除消失的按钮。
+
+        Returns:
+            本次新创建的按钮列表，调用方只需要为这些按钮连接信号和加载图片
         """
-        logging.info(f"开始填充新表情包")
-        # 步骤1: 清理旧的按钮
+        logger.debug("开始填充新表情包")
+
+        # 步骤1: 按表情键（类型:ID）索引现有按钮（同一表情可能出现多次，用列表保存）
+        reusable = defaultdict(list)
         for button in self.emoticon_buttons:
-            self.layout.removeWidget(button)
-            button.deleteLater() # 延迟删除，更安全
-        self.emoticon_buttons.clear()
-        
-        # 步骤2: 添加新的按钮
-        # row, col = 0, 0
-        # max_cols = 5  # 每行最多显示5个表情
+            reusable[emote_key(button.emoticon_data)].append(button)
+
+        # 批量修改期间暂停重绘
+        self.setUpdatesEnabled(False)
+        try:
+            # 步骤2: 按新顺序复用或创建按钮
+            old_buttons = self.emoticon_buttons
+            new_buttons = []
+            buttons = []
+            for emoticon in emoticons:
+                candidates = reusable.get(emote_key(emoticon))
+                if candidates:
+                    button = candidates.pop(0)
+                    button.set_emoticon_data(emoticon)
+                else:
+                    button = EmoticonButton(emoticon, self._current_icon_size, self, self.animations)
+                    new_buttons.append(button)
+                buttons.append(button)
+
+            # 步骤3: 清理未被复用的旧按钮（布局项在重排时一并移除）
+            for leftovers in reusable.values():
+                for button in leftovers:
+                    self.animations.unsubscribe(button)
+                    button.hide()
+                    button.deleteLater() # 延迟删除，更安全
+
+            self.emoticon_buttons = buttons
+            self._buttons_by_url = defaultdict(list)
+            for button in buttons:
+                self._buttons_by_url[button.emoticon_data.url].append(button)
+            # 按钮顺序完全一致时（例如重复选择同一个表情包）无需重排
+            if buttons != old_buttons:
+                self._relayout_emoticons(True)
+        finally:
+            self.setUpdatesEnabled(True)
+        return new_buttons
+
+    def set_images(self, images: Dict[str, Union[QImage, str, None]]) -> int:
+        """
+        批量设置后台解码完成的表情图标（UI线程只需要把 QImage 转换为 QPixmap）。
+        值为 (路径, 第一帧) 或路径时是动态图片，交给动画管理器播放（有第一帧时先显示第一帧）；
+        为 None 时（没有图片）显示表情名字作为回退。不在当前网格中的图片直接忽略。
 
-        self._current_emoticons = emoticons
-        
-        for emoticon in emoticons:
-            button = EmoticonButton(emoticon, self._current_icon_size, self)
-            self.emoticon_buttons.append(button)
+        Args:
+            images: {图片URL: QImage | (动态图片路径, 第一帧 QImage) | 动态图片路径 | None}
 
-        self._relayout_emoticons(True)
+        Returns:
+            实际更新的按钮数量
+        """
+        updated = 0
+        for url, image in images.items():
+            buttons = self._buttons_by_url.get(url)
+            if not buttons:
+                continue
+            if isinstance(image, (tuple, str)):
+                path, first_frame = image if isinstance(image, tuple) else (image, None)
+                icon = QIcon(QPixmap.fromImage(first_frame)) if first_frame is not None and not first_frame.isNull() else None
+                for button in buttons:
+                    if icon is not None:
+                        button.setText("")
+                    self.animations.subscribe(button, path, icon)
+            elif image is None:
+                for button in buttons:
+                    if button.icon().isNull():
+                        button.setText(button.emoticon_data.name[:4])
+            else:
+                icon = QIcon(QPixmap.fromImage(image))
+                for button in buttons:
+                    button.setText("")
+                    button.setIcon(icon)
+            updated += len(buttons)
+        return updated
+
+    def icon_size(self) -> int:
+        """当前（可能尚未应用的）目标图标大小。"""
+        return self._current_icon_size
 
     def set_icon_size(self, size: int):
-        """设置所有表情图标的大小并重新布局。"""
+        """
+        设置所有表情图标的大小。
+        拖动滑块时每秒会触发几十次，这里只记录目标大小，实际的按钮尺寸更新和重排合并到下一帧执行。
+        """
         self._current_icon_size = size
-        for button in self.emoticon_buttons:
-            button.update_size(size)
-        #logging.debug(f"当前容器宽度{self.width()}，按钮大小{self._current_icon_size + 16 + self.layout.spacing()}")
-        self._relayout_emoticons()
-
-    def _relayout_emoticons(self,forced_relayout = False):
-        """根据当前控件宽度和图标大小，计算列数并重新排列按钮。"""
-        # logging.debug("已触发重排")
-        if not self.emoticon_buttons:
-            # logging.debug("重排因为没有表情按键而退出")
-            return
+        if not self._relayout_timer.isActive():
+            self._relayout_timer.start()
 
-        container_width = self.width()
-        button_width = self._current_icon_size + 16 + self.layout.spacing()
-        
-        # 至少显示一列
-        new_cols = max(1, container_width // button_width)
-        
-        # 如果列数没有变化，则无需重新布局，以提高性能
-        if new_cols == self._current_cols and not forced_relayout:
-            #logging.debug("重排因为列数没有变化而退出")
+    def _relayout_emoticons(self, forced_relayout = False):
+        """
+        应用待处理的图标大小，并在按钮顺序变化时（forced_relayout）把新顺序交给布局。
+        按钮的具体位置由布局在下一次布局计算时按宽度算术得出。
+        """
+        self._relayout_timer.stop()
+        size_changed = self._applied_icon_size != self._current_icon_size
+        if not size_changed and not forced_relayout:
             return
-            
-        self._current_cols = new_cols
-        
-        # 重新将所有按钮添加到布局中
-        row, col = 0, 0
-        for button in self.emoticon_buttons:
-            # addWidget 会自动移动已存在的 widget
-            self.layout.addWidget(button, row, col)
-            col += 1
-            if col >= self._current_cols:
-                col = 0
-                row += 1
 
-        logging.info(f"重排已完成，当然容器宽度{container_width}，按钮大小{button_width}，布局{new_cols}")
+        self.setUpdatesEnabled(False)
+        try:
+            if size_changed:
+                for button in self.emoticon_buttons:
+                    button.update_size(self._current_icon_size)
+                self._applied_icon_size = self._current_icon_size
+                self.layout.set_cell_size(self._current_icon_size + 16)
+                self.animations.set_icon_size(self._current_icon_size)
+            if forced_relayout:
+                self.layout.set_widgets(self.emoticon_buttons)
+        finally:
+            self.setUpdatesEnabled(True)
+
+        logger.debug("重排已完成，当前容器宽度%d，按钮大小%d，布局%d列",
+                     self.width(), self._current_icon_size + 16, self.layout.columns_for(self.width()))
+
+
+class DiagnosticsDialog(QDialog):
+    """
+    诊断对话框：显示运行指标摘要。
+    只负责显示，刷新和导出由控制器连接按钮信号后处理。
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("运行诊断")
+        self.resize(640, 520)
+
+        layout = QVBoxLayout(self)
+        self.metrics_text = QPlainTextEdit()
+        self.metrics_text.setReadOnly(True)
+        self.metrics_text.setFont(QFont("Consolas", 9))
+        layout.addWidget(self.metrics_text)
+
+        button_layout = QHBoxLayout()
+        self.auto_refresh_check = QCheckBox("自动刷新")
+        self.auto_refresh_check.setChecked(True)
+        button_layout.addWidget(self.auto_refresh_check)
+        button_layout.addStretch()
+        self.refresh_btn = QPushButton("🔄 刷新")
+        button_layout.addWidget(self.refresh_btn)
+        self.export_btn = QPushButton("📤 导出")
+        self.export_btn.setToolTip("导出为JSON快照（.json）或Prometheus文本格式（.prom）")
+        button_layout.addWidget(self.export_btn)
+        layout.addLayout(button_layout)
+
+    def set_text(self, text: str):
+        """更新指标文本，保持当前滚动位置。"""
+        scroll_bar = self.metrics_text.verticalScrollBar()
+        position = scroll_bar.value()
+        self.metrics_text.setPlainText(text)
+        scroll_bar.setValue(position)
 
 
 class MainWindow(QMainWindow):
@@ -167,6 +399,7 @@ class MainWindow(QMainWindow):
         super().__init__()
         self.setWindowTitle("Bilibili直播表情包发送机 (v2.1)")
         self.setGeometry(100, 100, 1200, 800)
+        self._package_items = {}  # 表情包列表项索引 {pkg_id: QListWidgetItem}，用于增量更新
         self.init_ui()
 
     def init_ui(self):
@@ -189,9 +422,20 @@ class MainWindow(QMainWindow):
         # 2. 创建下部的内容区域
         content_widget = self._create_content_widget()
         main_layout.addWidget(content_widget)
+
+        # 3. 日志面板（默认隐藏，由"显示日志"开关控制）
+        self.log_panel = QPlainTextEdit()
+        self.log_panel.setReadOnly(True)
+        self.log_panel.setMaximumBlockCount(1000)  # 只保留最近的1000行，避免无限增长
+        self.log_panel.setFixedHeight(160)
+        self.log_panel.setVisible(False)
+        main_layout.addWidget(self.log_panel)
+        self.show_log_check.toggled.connect(self.log_panel.setVisible)
         
-        # 3. 添加状态栏
+        # 4. 添加状态栏
         self.statusBar().showMessage("准备就绪。请先填写配置并加载表情包。")
+        self.connection_label = QLabel("🟢 在线")
+        self.statusBar().addPermanentWidget(self.connection_label)
         
     def _create_config_widget(self) -> QWidget:
         """创建顶部的配置控件区域。"""
@@ -238,6 +482,14 @@ class MainWindow(QMainWindow):
         self.quick_send_check.setToolTip("勾选后，点击表情包列表中的表情会立即发送，而不是添加到队列")
         row2_layout.addWidget(self.quick_send_check)
         
+        self.offline_check = QCheckBox("离线模式")
+        self.offline_check.setToolTip("只使用本地缓存的表情包；发送的表情会排队，网络恢复后在有效期内补发")
+        row2_layout.addWidget(self.offline_check)
+
+        self.show_log_check = QCheckBox("显示日志")
+        self.show_log_check.setToolTip("在窗口底部显示实时运行日志")
+        row2_layout.addWidget(self.show_log_check)
+
         row2_layout.addStretch() # 添加弹性空间，让按钮靠右
         
         self.start_btn = QPushButton("▶️ 开始发送")
@@ -249,6 +501,10 @@ class MainWindow(QMainWindow):
         
         self.save_config_btn = QPushButton("💾 保存配置")
         row2_layout.addWidget(self.save_config_btn)
+
+        self.diagnostics_btn = QPushButton("📊 诊断")
+        self.diagnostics_btn.setToolTip("查看接口延迟、下载、缓存命中率、发送结果等运行指标")
+        row2_layout.addWidget(self.diagnostics_btn)
         
         config_layout.addLayout(row2_layout)
         return config_widget
@@ -269,8 +525,24 @@ class MainWindow(QMainWindow):
         
         left_layout.addWidget(QLabel("发送队列 (点击表情添加)"))
         self.send_queue_list = QListWidget()
+        # 每项都是单行文字：统一行高后添加上千项时不需要逐项计算大小（控制接口可以连续加入大量表情）
+        self.send_queue_list.setUniformItemSizes(True)
         left_layout.addWidget(self.send_queue_list)
 
+        # 发送组合预设：保存/载入/删除
+        preset_layout = QHBoxLayout()
+        self.preset_combo = QComboBox()
+        self.preset_combo.setPlaceholderText("发送预设")
+        self.preset_combo.setToolTip("已保存的发送组合预设")
+        preset_layout.addWidget(self.preset_combo, 1)
+        self.load_preset_btn = QPushButton("载入")
+        self.save_preset_btn = QPushButton("保存")
+        self.delete_preset_btn = QPushButton("删除")
+        for button in (self.load_preset_btn, self.save_preset_btn, self.delete_preset_btn):
+            button.setFixedWidth(44)
+            preset_layout.addWidget(button)
+        left_layout.addLayout(preset_layout)
+
         # 内容区右侧：表情展示区
         right_frame = QFrame()
         right_layout = QVBoxLayout(right_frame)
@@ -291,7 +563,13 @@ class MainWindow(QMainWindow):
         right_layout.addLayout(size_control_layout)
 
         
-        right_layout.addWidget(QLabel("表情预览"))
+        preview_header_layout = QHBoxLayout()
+        preview_header_layout.addWidget(QLabel("表情预览"))
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText("🔍 搜索所有表情包中的表情（名称/表情包/类型）")
+        self.search_edit.setClearButtonEnabled(True)
+        preview_header_layout.addWidget(self.search_edit)
+        right_layout.addLayout(preview_header_layout)
         self.emoticon_widget = EmoticonPackageWidget()
         
         # 为表情展示区添加滚动条
@@ -324,10 +602,34 @@ class MainWindow(QMainWindow):
         else:
             QMessageBox.information(self, title, message)
             
+    def ask_text(self, title: str, label: str, text: str = "") -> str:
+        """
+        显示一个文本输入对话框，由控制器调用。
+        用户取消时返回空字符串。
+        """
+        value, ok = QInputDialog.getText(self, title, label, text=text)
+        return value.strip() if ok else ""
+
+    def ask_save_path(self, title: str, default_name: str, file_filter: str) -> str:
+        """
+        显示一个保存文件对话框，由控制器调用。
+        用户取消时返回空字符串。
+        """
+        path, _ = QFileDialog.getSaveFileName(self, title, default_name, file_filter)
+        return path
+
     def set_status(self, message: str, timeout: int = 4000):
         """在状态栏显示消息，由控制器调用。"""
         self.statusBar().showMessage(message, timeout)
 
+    def set_connection_state(self, online: bool, pending_sends: int = 0):
+        """在状态栏右侧显示在线/离线状态和离线待发送数量。"""
+        if online:
+            text = "🟢 在线"
+        else:
+            text = "🔴 离线" + (f"（待发送 {pending_sends}）" if pending_sends else "")
+        self.connection_label.setText(text)
+
     def toggle_sending_state(self, is_sending: bool):
         """根据发送状态切换按钮的文本和可用性。"""
         if is_sending:
@@ -340,18 +642,75 @@ class MainWindow(QMainWindow):
             self.load_emoticons_btn.setEnabled(True)
 
     def populate_package_list(self, emoticons: dict):
-        """清空并使用表情包数据填充左侧的列表。"""
-        self.package_list.clear()
+        """
+        使用表情包数据增量更新左侧的列表。
+        以pkg_id为键：名称未变的项原样保留，只插入新增的包、删除消失的包，并保持当前选中项。
+        """
         if not emoticons:
+            self.package_list.clear()
+            self._package_items.clear()
             self.set_status("未能加载到任何表情包。")
             return
-        
-        for pkg_id, pkg_data in emoticons.items():
-            # 在这里创建UI元素是正确的，因为这是视图层
-            item = QListWidgetItem(pkg_data["name"])
-            # Qt.UserRole 用于将非显示的元数据（这里是pkg_id）附加到列表项上
-            item.setData(Qt.UserRole, pkg_id)
-            self.package_list.addItem(item)
+
+        current_item = self.package_list.currentItem()
+        self.package_list.blockSignals(True)
+        try:
+            # 1. 删除已不存在的表情包
+            for pkg_id in [pkg_id for pkg_id in self._package_items if pkg_id not in emoticons]:
+                item = self._package_items.pop(pkg_id)
+                self.package_list.takeItem(self.package_list.row(item))
+
+            # 2. 按新顺序插入新增的项，必要时移动已有项
+            for index, (pkg_id, pkg_data) in enumerate(emoticons.items()):
+                item = self._package_items.get(pkg_id)
+                if item is None:
+                    # 在这里创建UI元素是正确的，因为这是视图层
+                    item = QListWidgetItem(pkg_data.name)
+                    # Qt.UserRole 用于将非显示的元数据（这里是pkg_id）附加到列表项上
+                    item.setData(Qt.UserRole, pkg_id)
+                    self.package_list.insertItem(index, item)
+                    self._package_items[pkg_id] = item
+                    continue
+
+                if item.text() != pkg_data.name:
+                    item.setText(pkg_data.name)
+                if self.package_list.item(index) is not item:
+                    self.package_list.takeItem(self.package_list.row(item))
+                    self.package_list.insertItem(index, item)
+
+            # 恢复选中项（如果它仍然存在）
+            if current_item is not None and self.package_list.row(current_item) >= 0:
+                self.package_list.setCurrentItem(current_item)
+        finally:
+            self.package_list.blockSignals(False)
+
+        # 之前选中的包被删除时，通知控制器当前行已变化
+        if current_item is not None and self.package_list.currentItem() is not current_item:
+            self.package_list.currentRowChanged.emit(self.package_list.currentRow())
+
+    def set_send_queue(self, names: List[str]):
+        """一次性替换发送队列列表的全部内容（用于载入预设）。"""
+        self.send_queue_list.clear()
+        self.send_queue_list.addItems(names)
+
+    def update_preset_combo(self, names: List[str], current: str = ""):
+        """更新发送预设下拉框，并选中指定预设（如果存在）。"""
+        current = current or self.preset_combo.currentText()
+        self.preset_combo.blockSignals(True)
+        self.preset_combo.clear()
+        self.preset_combo.addItems(names)
+        index = self.preset_combo.findText(current)
+        self.preset_combo.setCurrentIndex(index)
+        self.preset_combo.blockSignals(False)
+
+    def append_log_lines(self, lines: List[str]):
+        """把一批日志追加到日志面板（一次调用只触发一次重绘）。"""
+        if lines:
+            self.log_panel.appendPlainText("\n".join(lines))
+
+    def has_package(self, pkg_id) -> bool:
+        """表情包列表中是否存在指定ID的表情包。"""
+        return pkg_id in self._package_items
 
     def _on_icon_size_changed(self, value):
         """处理图标大小滑块变化的事件。"""
@@ -360,22 +719,40 @@ class MainWindow(QMainWindow):
 
     def update_room_combo(self, rooms: List[Dict[str, str]]):
         """
-        更新直播间ID下拉选择框的内容。
+        增量更新直播间ID下拉选择框的内容。
+        以房间号为键：只增删变化的房间，名称变化时只更新显示文本。
 
         Args:
             rooms: 房间信息列表，每个元素包含 room_id 和 name
         """
         current_text = self.room_id_combo.currentText()
-        self.room_id_combo.clear()
-
-        # 添加缓存的房间
-        for room in rooms:
-            display_text = f"{room['name']} ({room['room_id']})"
-            self.room_id_combo.addItem(display_text, room['room_id'])
-
-        # 恢复之前的文本（如果存在）
-        if current_text:
-            self.room_id_combo.setCurrentText(current_text)
+        wanted = {str(room['room_id']): f"{room['name']} ({room['room_id']})" for room in rooms}
+
+        self.room_id_combo.blockSignals(True)
+        try:
+            # 删除已不存在的房间（倒序删除，避免索引偏移）
+            for index in range(self.room_id_combo.count() - 1, -1, -1):
+                if str(self.room_id_combo.itemData(index)) not in wanted:
+                    self.room_id_combo.removeItem(index)
+
+            # 按顺序插入新增的房间，更新名称变化的房间
+            for index, room in enumerate(rooms):
+                room_id = room['room_id']
+                display_text = wanted[str(room_id)]
+                if index < self.room_id_combo.count() and str(self.room_id_combo.itemData(index)) == str(room_id):
+                    if self.room_id_combo.itemText(index) != display_text:
+                        self.room_id_combo.setItemText(index, display_text)
+                    continue
+                existing = self.room_id_combo.findData(room_id)
+                if existing >= 0:
+                    self.room_id_combo.removeItem(existing)
+                self.room_id_combo.insertItem(index, display_text, room_id)
+
+            # 恢复之前的文本（如果存在）
+            if current_text and self.room_id_combo.currentText() != current_text:
+                self.room_id_combo.setCurrentText(current_text)
+        finally:
+            self.room_id_combo.blockSignals(False)
 
     def get_room_id(self) -> str:
         """
@@ -0,0 +1,121 @@
+# benchmarks/bench_animation.py
+"""
+基准测试：网格中300个按钮显示30张不同的动态表情时，播放1秒钟UI线程的耗时。
+对比"每个按钮一个 QMovie"与 AnimatedIconManager（每张图片共享一个解码器、只更新可见按钮）。
+
+运行方式（在项目根目录）:
+    python -m benchmarks.bench_animation
+"""
+import os
+import sys
+import time
+import struct
+import tempfile
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtWidgets import QApplication, QScrollArea
+from PyQt5.QtCore import QSize
+from PyQt5.QtGui import QIcon, QMovie
+
+from app.views import EmoticonPackageWidget
+from app.emote_records import EmotePackage
+
+BUTTONS = 300
+IMAGES = 30
+GIF_SIZE = 64
+FRAMES = 8
+PLAY_SECONDS = 1.0
+
+
+def write_gif(path: str, size: int, frames: int):
+    """生成一个多帧GIF（每帧纯色，LZW 编码时每两个像素清空一次字典，实现简单）。"""
+    palette = bytes(c for i in range(4) for c in (i * 80, 255 - i * 60, i * 40))
+    data = b"GIF89a" + struct.pack("<HHBBB", size, size, 0xF1, 0, 0) + palette
+    data += b"\x21\xFF\x0BNETSCAPE2.0\x03\x01\x00\x00\x00"
+    for frame in range(frames):
+        bits = []
+
+        def put(code):
+            bits.extend((code >> i) & 1 for i in range(3))
+        put(4)
+        for i in range(size * size):
+            put(frame % 4)
+            if i % 2:
+                put(4)
+        put(5)
+        raw = bytes(sum(bit << j for j, bit in enumerate(bits[i:i + 8])) for i in range(0, len(bits), 8))
+        data += b"\x21\xF9\x04\x00\x04\x00\x00\x00" + b"\x2C" + struct.pack("<HHHHB", 0, 0, size, size, 0) + b"\x02"
+        for i in range(0, len(raw), 255):
+            data += bytes([len(raw[i:i + 255])]) + raw[i:i + 255]
+        data += b"\x00"
+    with open(path, "wb") as f:
+        f.write(data + b"\x3B")
+
+
+def play(app: QApplication) -> float:
+    """处理事件循环 PLAY_SECONDS 秒，返回其中实际忙碌的时间（毫秒）。"""
+    busy = 0.0
+    end = time.perf_counter() + PLAY_SECONDS
+    while time.perf_counter() < end:
+        start = time.perf_counter()
+        app.processEvents()
+        busy += time.perf_counter() - start
+        time.sleep(0.002)
+    return busy * 1000
+
+
+def setup(app, paths):
+    scroll = QScrollArea()
+    widget = EmoticonPackageWidget()
+    scroll.setWidget(widget)
+    scroll.setWidgetResizable(True)
+    scroll.resize(900, 600)
+    scroll.show()
+    package = EmotePackage(1, "动态表情", "user")
+    for i in range(BUTTONS):
+        package.add_emote(f"[动态{i}]", f"http://example.invalid/{i}.gif", i)
+    widget.set_emoticons(package.emotes)
+    app.processEvents()
+    return scroll, widget
+
+
+def per_button_movies(app, paths) -> float:
+    scroll, widget = setup(app, paths)
+    movies = []
+    for index, button in enumerate(widget.emoticon_buttons):
+        movie = QMovie(paths[index % IMAGES])
+        movie.setScaledSize(QSize(64, 64))
+        movie.frameChanged.connect(lambda _, b=button, m=movie: b.setIcon(QIcon(m.currentPixmap())))
+        movie.start()
+        movies.append(movie)
+    elapsed = play(app)
+    for movie in movies:
+        movie.stop()
+    scroll.close()
+    return elapsed
+
+
+def shared_decoders(app, paths) -> float:
+    scroll, widget = setup(app, paths)
+    widget.set_images({button.emoticon_data.url: paths[index % IMAGES]
+                       for index, button in enumerate(widget.emoticon_buttons)})
+    elapsed = play(app)
+    scroll.close()
+    return elapsed
+
+
+def main():
+    app = QApplication.instance() or QApplication(sys.argv)
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i in range(IMAGES):
+            path = os.path.join(tmp, f"{i}.gif")
+            write_gif(path, GIF_SIZE, FRAMES)
+            paths.append(path)
+        for label, fn in (("QMovie per button", per_button_movies), ("shared decoders", shared_decoders)):
+            print(f"{label:18s} UI busy {fn(app, paths):7.1f} ms per {PLAY_SECONDS:.0f}s of playback")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+# benchmarks/bench_control_server.py
+"""
+基准测试：本地控制接口（本地模拟B站接口，offscreen Qt）。
+
+trigger to POST: 从触发发送到模拟服务器收到发送请求的延迟（逐条触发200次）
+    gui quick send   快速发送模式下点击表情的流程（UI线程为每次发送创建工作线程）
+    control /send    通过控制接口发送（请求线程直接查询表情索引，使用预热的长连接发送）
+load: 8个客户端（各自一个长连接）在2秒内连续发出同一种命令，统计每秒命令数、延迟和期间UI事件循环的最大延迟
+
+运行方式（在项目根目录）:
+    python -m benchmarks.bench_control_server
+"""
+import os
+import json
+import time
+import logging
+import threading
+import http.client
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtCore import QTimer
+from PyQt5.QtWidgets import QApplication
+
+from benchmarks.stub_server import StubBiliServer
+from benchmarks.run_suite import ROOM_ID, fresh_cache_dir, new_model, new_window, close_window, process_events_until
+
+TRIGGERS = 200
+CLIENTS = 8
+LOAD_SECONDS = 2.0
+
+
+def percentile(samples, fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def report(label: str, samples):
+    print(f"{label:16s} p50 {percentile(samples, 0.5) * 1000:6.2f} ms   p99 {percentile(samples, 0.99) * 1000:6.2f} ms   "
+          f"max {max(samples) * 1000:6.2f} ms")
+
+
+def request(connection, method: str, path: str, body=None):
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    connection.request(method, path, body=data, headers={"Content-Type": "application/json"} if data else {})
+    response = connection.getresponse()
+    return response.status, json.loads(response.read())
+
+
+def gui_trigger_latency(app, server, controller, emotes) -> list:
+    controller.view.quick_send_check.setChecked(True)
+    samples = []
+    for i in range(TRIGGERS):
+        before = server.request_counts().get("/msg/send", 0)
+        start = time.perf_counter()
+        controller.add_to_send_queue(emotes[i % len(emotes)])
+        process_events_until(app, lambda: server.request_counts().get("/msg/send", 0) > before, timeout=10)
+        samples.append(server.last_send_at - start)
+        thread = controller.threadpool[-1][0]
+        process_events_until(app, thread.isFinished, timeout=10)
+    controller.view.quick_send_check.setChecked(False)
+    return samples
+
+
+def control_trigger_latency(port: int, server, emotes) -> list:
+    connection = http.client.HTTPConnection("127.0.0.1", port)
+    samples = []
+    for i in range(TRIGGERS):
+        start = time.perf_counter()
+        status, body = request(connection, "POST", "/send", {"id": emotes[i % len(emotes)].id})
+        assert status == 200 and body["ok"], body
+        samples.append(server.last_send_at - start)
+    connection.close()
+    return samples
+
+
+def load(app, port: int, method: str, path: str, body_fn):
+    """CLIENTS 个客户端线程连续发出命令，UI线程同时处理事件（加入队列等命令在UI线程中执行）。"""
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + LOAD_SECONDS
+
+    def client(index: int):
+        connection = http.client.HTTPConnection("127.0.0.1", port)
+        local, failed, n = [], 0, 0
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            status, _ = request(connection, method, path, body_fn(index, n))
+            local.append(time.perf_counter() - start)
+            failed += status >= 400
+            n += 1
+        connection.close()
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    lags, last = [], [time.perf_counter()]
+
+    def probe():
+        now = time.perf_counter()
+        lags.append(max(0.0, now - last[0] - 0.005))
+        last[0] = now
+
+    probe_timer = QTimer()
+    probe_timer.timeout.connect(probe)
+    probe_timer.start(5)
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(CLIENTS)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    process_events_until(app, lambda: not any(thread.is_alive() for thread in threads), timeout=LOAD_SECONDS + 30)
+    elapsed = time.perf_counter() - start
+    process_events_until(app, lambda: False, timeout=0.1)
+    probe_timer.stop()
+    print(f"load {method:4s} {path:10s} {len(latencies) / elapsed:7.0f} cmd/s   "
+          f"p50 {percentile(latencies, 0.5) * 1000:5.2f} ms   p99 {percentile(latencies, 0.99) * 1000:6.2f} ms   "
+          f"errors {errors[0]}   max loop lag {max(lags) * 1000 if lags else 0.0:5.1f} ms")
+
+
+def main():
+    logging.disable(logging.CRITICAL)
+    app = QApplication.instance() or QApplication([])
+    server = StubBiliServer().start()
+    server.install()
+    try:
+        with fresh_cache_dir():
+            model = new_model()
+            view, controller = new_window(model)
+            controller.loaded_room_id = ROOM_ID
+            model.load_all_emoticons(ROOM_ID)
+            controller._on_emoticons_loaded(model.emoticons)
+            app.processEvents()
+            emotes = [e for package in model.emoticons.values() for e in package.emotes]
+
+            controller.start_control_server(0)
+            port = controller.control_server.address[1]
+            time.sleep(0.2)  # 等待发送连接预热
+
+            report("gui quick send", gui_trigger_latency(app, server, controller, emotes))
+            report("control /send", control_trigger_latency(port, server, emotes))
+
+            load(app, port, "GET", "/packages", lambda client, n: None)
+            load(app, port, "POST", "/queue", lambda client, n: {"id": emotes[(client + n) % len(emotes)].id})
+            controller.clear_send_queue()
+            load(app, port, "POST", "/send", lambda client, n: {"id": emotes[(client + n) % len(emotes)].id})
+            process_events_until(app, lambda: False, timeout=0.5)
+            controller.shutdown()
+            close_window(app, view, model)
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
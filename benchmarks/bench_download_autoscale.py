@@ -0,0 +1,96 @@
+# benchmarks/bench_download_autoscale.py
+"""
+基准测试：下载线程数自动调整（AIMD）在带宽变化的本地模拟CDN上的表现。
+依次经过三个阶段，每个阶段下载一批新图片：
+
+fast:      不限带宽，每张图片50ms延迟（延迟受限，线程越多越快）
+throttled: 所有图片共享 256KB/s 带宽，同时超过6个请求返回429（模拟场馆受限的上行链路）
+fast:      恢复不限带宽
+
+对比固定4线程、固定16线程和自动调整（1-16线程）的吞吐量、失败数、p95延迟和平均线程数。
+
+运行方式（在项目根目录）:
+    python -m benchmarks.bench_download_autoscale
+"""
+import os
+import time
+import logging
+import tempfile
+import threading
+import statistics
+
+from benchmarks.stub_server import StubBiliServer
+
+IMAGE_BYTES = 8192
+PHASES = (
+    ("fast", 600, {"image_bandwidth": None, "image_max_concurrency": None}),
+    ("throttled", 150, {"image_bandwidth": 256 * 1024, "image_max_concurrency": 6}),
+    ("fast", 600, {"image_bandwidth": None, "image_max_concurrency": None}),
+)
+CONFIGS = (("fixed 4", 4, 4), ("fixed 16", 16, 16), ("autoscale", 1, 16))
+
+
+def run_phase(manager, server, cache_dir: str, first_id: int, count: int):
+    samples = []
+    stop = threading.Event()
+
+    def sample_workers():
+        while not stop.wait(0.05):
+            samples.append(len(manager.workers))
+
+    sampler = threading.Thread(target=sample_workers, daemon=True)
+    sampler.start()
+    latencies = []
+    original = manager._record_download
+
+    def record(latency, nbytes, outcome):
+        if outcome == "ok":
+            latencies.append(latency)
+        original(latency, nbytes, outcome)
+
+    manager._record_download = record
+    paths = []
+    start = time.perf_counter()
+    for emote_id in range(first_id, first_id + count):
+        path = os.path.join(cache_dir, f"{emote_id}.png")
+        paths.append(path)
+        manager.add_download_task(path, server.image_url(emote_id), str(emote_id), "bench")
+    manager.task_queue.join()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    sampler.join()
+    manager._record_download = original
+    downloaded = sum(1 for path in paths if os.path.exists(path))
+    latencies.sort()
+    p95 = latencies[int(0.95 * (len(latencies) - 1))] if latencies else 0.0
+    return downloaded / elapsed, count - downloaded, p95, statistics.mean(samples) if samples else 0.0
+
+
+def main():
+    logging.disable(logging.CRITICAL)
+    os.chdir(tempfile.mkdtemp())
+    server = StubBiliServer(image_latency=0.05, image_bytes=IMAGE_BYTES).start()
+    server.install()
+    from app.download_manager import DownloadManager
+    try:
+        for label, min_workers, max_workers in CONFIGS:
+            manager = DownloadManager(None, max_workers, min_workers)
+            cache_dir = tempfile.mkdtemp()
+            first_id = 1
+            for phase, count, params in PHASES:
+                for key, value in params.items():
+                    setattr(server, key, value)
+                rate, failed, p95, workers = run_phase(manager, server, cache_dir, first_id, count)
+                first_id += count
+                print(f"{label:10s} {phase:10s} {rate:6.1f} img/s   failed {failed:4d}   "
+                      f"p95 {p95 * 1000:6.1f} ms   avg workers {workers:5.1f}")
+            decisions = [d for d in manager.scaling_status()["decisions"] if d["action"] != "hold"]
+            if min_workers != max_workers:
+                print("  scaling: " + " ".join(f"{d['from']}->{d['to']}({d['reason']})" for d in decisions))
+            manager.shutdown()
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# benchmarks/bench_download_dispatch.py
+"""
+基准测试：一个含1000个表情的表情包全部下载完成时，UI线程分发下载完成事件的总耗时。
+对比旧的"每个完成事件线性扫描全部按钮、在UI线程加载图片"与新的"按图片URL索引 + 每帧合并批量更新"
+（新实现中图片已由后台线程解码为 QImage，UI线程只需要转换为 QPixmap）。
+
+运行方式（在项目根目录）:
+    python -m benchmarks.bench_download_dispatch
+"""
+import os
+import sys
+import time
+import tempfile
+import statistics
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtWidgets import QApplication
+from PyQt5.QtGui import QIcon, QImage, QPixmap, QColor
+
+from app.views import EmoticonPackageWidget
+from app.emote_records import EmotePackage
+
+EMOTE_COUNT = 1000
+ROUNDS = 5
+FRAME_BATCH = 50  # 假设下载线程每帧（16ms）完成约50个
+
+
+def make_package() -> EmotePackage:
+    package = EmotePackage(1, "大表情包", "user")
+    for i in range(EMOTE_COUNT):
+        package.add_emote(f"[表情{i}]", f"http://example.invalid/{i}.png", 100000 + i)
+    return package
+
+
+def legacy_dispatch(widget: EmoticonPackageWidget, completions: list):
+    """旧实现：每个完成事件都线性扫描按钮并转换ID字符串。"""
+    for url, emoticon_id, local_path in completions:
+        for button in widget.emoticon_buttons:
+            if str(button.emoticon_data.id) == emoticon_id:
+                button.setIcon(QIcon(QPixmap(local_path)))
+                break
+
+
+def batched_dispatch(widget: EmoticonPackageWidget, completions: list):
+    """新实现：完成事件合并为每帧一批，按图片URL索引更新（图片已在后台解码，见 completions 中的 QImage）。"""
+    for start in range(0, len(completions), FRAME_BATCH):
+        widget.set_images({url: image for url, _, image in completions[start:start + FRAME_BATCH]})
+
+
+def run(dispatch_fn, app: QApplication, image_path: str) -> list:
+    widget = EmoticonPackageWidget()
+    widget.resize(1000, 800)
+    package = make_package()
+    if dispatch_fn is batched_dispatch:
+        image = QImage(image_path)
+        completions = [(e.url, str(e.id), image) for e in package.emotes]
+    else:
+        completions = [(e.url, str(e.id), image_path) for e in package.emotes]
+    samples = []
+    for _ in range(ROUNDS):
+        widget.set_emoticons([])
+        widget.set_emoticons(package.emotes)
+        app.processEvents()
+        start = time.perf_counter()
+        dispatch_fn(widget, completions)
+        samples.append((time.perf_counter() - start) * 1000)
+    widget.deleteLater()
+    app.processEvents()
+    return samples
+
+
+def main():
+    app = QApplication.instance() or QApplication(sys.argv)
+    with tempfile.TemporaryDirectory() as tmp:
+        image_path = os.path.join(tmp, "icon.png")
+        pixmap = QPixmap(64, 64)
+        pixmap.fill(QColor("orange"))
+        pixmap.save(image_path)
+        for label, fn in (("legacy (linear scan)", legacy_dispatch), ("indexed + coalesced", batched_dispatch)):
+            samples = run(fn, app, image_path)
+            print(f"{label:22s} {EMOTE_COUNT} completions: median {statistics.median(samples):8.2f} ms  "
+                  f"max {max(samples):8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# benchmarks/bench_download_fairness.py
+"""
+基准测试：下载队列的公平调度（本地模拟CDN，每张图片20ms延迟，固定4个下载线程）。
+一个500个表情的表情包在后台预取，同时打开一个只有10个表情的小表情包，分两种先后顺序：
+small after big:  预取已经排队后再打开小表情包
+small before big: 打开小表情包后预取才开始排队
+对比单一优先级队列（旧方式，同优先级任务的出队顺序取决于堆的结构）与按表情包轮流出队时，
+小表情包全部下载完成的等待时间。
+
+运行方式（在项目根目录）:
+    python -m benchmarks.bench_download_fairness
+"""
+import os
+import time
+import queue
+import logging
+import tempfile
+import statistics
+
+from benchmarks.stub_server import StubBiliServer
+
+BIG_PACKAGE = 500
+SMALL_PACKAGE = 10
+ROUNDS = 3
+
+
+class LegacyPriorityQueue(queue.PriorityQueue):
+    """旧的单一优先级队列。shutdown() 会关闭队列；这里任务已全部完成，空闲线程按超时退出即可。"""
+    def close(self):
+        pass
+
+
+def run(server, fair: bool, small_first: bool):
+    from app.download_manager import DownloadManager
+    manager = DownloadManager(None, 4, 4)
+    if not fair:
+        manager.task_queue = LegacyPriorityQueue()
+    cache_dir = tempfile.mkdtemp()
+
+    def enqueue(package_name, first_id, count):
+        paths = []
+        for emote_id in range(first_id, first_id + count):
+            path = os.path.join(cache_dir, f"{emote_id}.png")
+            paths.append(path)
+            manager.add_download_task(path, server.image_url(emote_id), str(emote_id), package_name)
+        return paths
+
+    start = time.perf_counter()
+    if not small_first:
+        enqueue("big", 1, BIG_PACKAGE)
+        time.sleep(0.1)
+    opened = time.perf_counter()
+    small_paths = enqueue("small", 100000, SMALL_PACKAGE)
+    if small_first:
+        enqueue("big", 1, BIG_PACKAGE)
+    while not all(os.path.exists(path) for path in small_paths):
+        time.sleep(0.002)
+    small_wait = time.perf_counter() - opened
+    manager.task_queue.join()
+    total = time.perf_counter() - start
+    manager.shutdown()
+    return small_wait, total
+
+
+def main():
+    logging.disable(logging.CRITICAL)
+    os.chdir(tempfile.mkdtemp())
+    server = StubBiliServer(image_latency=0.02).start()
+    server.install()
+    try:
+        for order, small_first in (("small after big", False), ("small before big", True)):
+            for label, fair in (("single queue", False), ("fair queue", True)):
+                results = [run(server, fair, small_first) for _ in range(ROUNDS)]
+                small = statistics.median(r[0] for r in results)
+                total = statistics.median(r[1] for r in results)
+                print(f"{order:16s} {label:13s} small package done after {small * 1000:7.1f} ms   "
+                      f"all {BIG_PACKAGE + SMALL_PACKAGE} images {total * 1000:7.1f} ms")
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
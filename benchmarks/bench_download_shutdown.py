@@ -0,0 +1,67 @@
+# benchmarks/bench_download_shutdown.py
+"""
+基准测试：下载进行中关闭下载管理器（本地模拟CDN）。
+为300张图片排队下载（8个线程），0.5秒后关闭，分别在图片请求延迟50ms（正常）和3秒（上行链路卡住）时测量：
+
+shutdown: shutdown() 的耗时和关闭时仍未完成的任务数
+resume:   用同一个下载日志新建下载管理器，resume() 恢复的任务数、耗时，以及全部下载完成后是否有遗漏
+
+运行方式（在项目根目录）:
+    python -m benchmarks.bench_download_shutdown
+"""
+import os
+import time
+import logging
+import tempfile
+
+from benchmarks.stub_server import StubBiliServer
+
+IMAGES = 300
+WORKERS = 8
+
+
+def run(server, image_latency: float):
+    from app.download_manager import DownloadManager
+    from app.download_journal import DownloadJournal
+    server.image_latency = image_latency
+    cache_dir = tempfile.mkdtemp()
+    journal_path = os.path.join(cache_dir, "download_journal.jsonl")
+    paths = []
+
+    manager = DownloadManager(None, WORKERS, WORKERS, journal=DownloadJournal(journal_path))
+    for emote_id in range(1, IMAGES + 1):
+        path = os.path.join(cache_dir, f"{emote_id}.png")
+        paths.append(path)
+        manager.add_download_task(path, server.image_url(emote_id), str(emote_id), "bench")
+    time.sleep(0.5)
+    start = time.perf_counter()
+    manager.shutdown()
+    shutdown = time.perf_counter() - start
+    remaining = sum(1 for path in paths if not os.path.exists(path))
+
+    server.image_latency = 0.05
+    manager = DownloadManager(None, WORKERS, WORKERS, journal=DownloadJournal(journal_path))
+    start = time.perf_counter()
+    resumed = len(manager.resume())
+    resume = time.perf_counter() - start
+    manager.task_queue.join()
+    missing = sum(1 for path in paths if not os.path.exists(path))
+    manager.shutdown()
+    print(f"image latency {image_latency * 1000:5.0f} ms   shutdown {shutdown * 1000:7.1f} ms   "
+          f"unfinished {remaining:3d}   resumed {resumed:3d} in {resume * 1000:5.1f} ms   missing after resume {missing}")
+
+
+def main():
+    logging.disable(logging.CRITICAL)
+    os.chdir(tempfile.mkdtemp())
+    server = StubBiliServer().start()
+    server.install()
+    try:
+        for image_latency in (0.05, 3.0):
+            run(server, image_latency)
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# benchmarks/bench_emote_records.py
+"""
+基准测试：表情数据的内存占用和点击表情包时的准备耗时。
+对比旧的"每个表情一个dict、点击时复制两次"方式与 Emote/EmotePackage 紧凑记录。
+
+运行方式（在项目根目录）:
+    python -m benchmarks.bench_emote_records
+"""
+import time
+import tracemalloc
+import statistics
+
+from app.emote_records import EmotePackage
+
+PACKAGE_COUNT = 300
+EMOTES_PER_PACKAGE = 60
+CLICK_ROUNDS = 2000
+
+
+def make_api_packages() -> list:
+    """模拟表情包详情接口返回的原始数据。"""
+    return [
+        {
+            "id": pkg_index,
+            "text": f"表情包{pkg_index % 50}",  # 包名在不同包之间存在重复
+            "emote": [{"text": f"[表情{pkg_index}_{i}]", "url": f"https://i0.hdslb.com/bfs/emote/{pkg_index}_{i}.png",
+                       "id": pkg_index * 1000 + i} for i in range(EMOTES_PER_PACKAGE)]
+        }
+        for pkg_index in range(PACKAGE_COUNT)
+    ]
+
+
+def build_legacy(api_packages: list) -> dict:
+    return {
+        pkg["id"]: {
+            "name": pkg["text"],
+            "type": "user",
+            "emotes": [{"name": e["text"], "url": e["url"], "id": e["id"]} for e in pkg["emote"]]
+        }
+        for pkg in api_packages
+    }
+
+
+def build_records(api_packages: list) -> dict:
+    emoticons = {}
+    for pkg in api_packages:
+        package = EmotePackage(pkg["id"], pkg["text"], "user")
+        for e in pkg["emote"]:
+            package.add_emote(e["text"], e["url"], e["id"])
+        emoticons[pkg["id"]] = package
+    return emoticons
+
+
+def click_legacy(emoticons: dict, pkg_id):
+    pkg_data = emoticons[pkg_id]
+    emotes_with_package = [dict(e, package_name=pkg_data["name"]) for e in pkg_data["emotes"]]
+    return [dict(e, type=pkg_data["type"]) for e in emotes_with_package]
+
+
+def click_records(emoticons: dict, pkg_id):
+    return emoticons[pkg_id].emotes
+
+
+def measure_memory(build_fn, api_packages: list) -> int:
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    emoticons = build_fn(api_packages)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    del emoticons
+    return size
+
+
+def measure_clicks(build_fn, click_fn, api_packages: list) -> list:
+    emoticons = build_fn(api_packages)
+    pkg_ids = list(emoticons)
+    samples = []
+    for i in range(CLICK_ROUNDS):
+        start = time.perf_counter()
+        click_fn(emoticons, pkg_ids[i % len(pkg_ids)])
+        samples.append((time.perf_counter() - start) * 1e6)
+    return samples
+
+
+def main():
+    api_packages = make_api_packages()
+    print(f"{PACKAGE_COUNT} packages x {EMOTES_PER_PACKAGE} emotes")
+    for label, build_fn, click_fn in (("legacy dicts", build_legacy, click_legacy),
+                                      ("slotted records", build_records, click_records)):
+        memory = measure_memory(build_fn, api_packages)
+        clicks = measure_clicks(build_fn, click_fn, api_packages)
+        print(f"{label:16s} memory {memory / 1024 / 1024:7.2f} MiB  "
+              f"click median {statistics.median(clicks):8.2f} us")
+
+
+if __name__ == "__main__":
+    main()
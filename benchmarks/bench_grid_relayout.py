@@ -0,0 +1,130 @@
+# benchmarks/bench_grid_relayout.py
+"""
+基准测试：拖动图标大小滑块和窗口边缘时，表情网格每帧在UI线程上的耗时。
+对比旧的"每个事件都更新全部按钮并把控件重新插入 QGridLayout"
+与新的"合并到每帧一次 + 流式布局算术定位"。
+
+模拟方式：每帧产生 EVENTS_PER_FRAME 个滑块 valueChanged / resize 事件，然后处理一次事件循环。
+
+运行方式（在项目根目录）:
+    python -m benchmarks.bench_grid_relayout
+"""
+import os
+import sys
+import time
+import statistics
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtWidgets import QApplication, QWidget, QGridLayout, QScrollArea
+from PyQt5.QtCore import Qt, QSize
+
+from app import config
+from app.views import EmoticonPackageWidget, EmoticonButton
+from app.emote_records import EmotePackage
+
+EMOTE_COUNT = 300
+EVENTS_PER_FRAME = 4
+FRAMES = 30
+FRAME_SECONDS = 0.017
+
+
+class LegacyPackageWidget(QWidget):
+    """旧实现（QGridLayout，每个事件都立即重排）。"""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.layout = QGridLayout()
+        self.layout.setSpacing(5)
+        self.layout.setAlignment(Qt.AlignTop)
+        self.setLayout(self.layout)
+        self.emoticon_buttons = []
+        self._current_cols = 0
+        self._current_icon_size = config.ICON_SIZE
+
+    def minimumSizeHint(self):
+        return QSize(0, super().minimumSizeHint().height())
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self._relayout_emoticons()
+
+    def set_emoticons(self, emoticons):
+        self.emoticon_buttons = [EmoticonButton(e, self._current_icon_size, self) for e in emoticons]
+        self._relayout_emoticons(True)
+
+    def set_icon_size(self, size):
+        self._current_icon_size = size
+        for button in self.emoticon_buttons:
+            button.update_size(size)
+        self._relayout_emoticons()
+
+    def _relayout_emoticons(self, forced_relayout=False):
+        if not self.emoticon_buttons:
+            return
+        button_width = self._current_icon_size + 16 + self.layout.spacing()
+        new_cols = max(1, self.width() // button_width)
+        if new_cols == self._current_cols and not forced_relayout:
+            return
+        self._current_cols = new_cols
+        row, col = 0, 0
+        for button in self.emoticon_buttons:
+            self.layout.addWidget(button, row, col)
+            col += 1
+            if col >= self._current_cols:
+                col, row = 0, row + 1
+
+
+def make_emotes():
+    package = EmotePackage(1, "表情包", "user")
+    for i in range(EMOTE_COUNT):
+        package.add_emote(f"[表情{i}]", f"http://example.invalid/{i}.png", i)
+    return package.emotes
+
+
+def measure(widget_cls, app, drive) -> list:
+    scroll = QScrollArea()
+    widget = widget_cls()
+    scroll.setWidget(widget)
+    scroll.setWidgetResizable(True)
+    scroll.resize(900, 700)
+    scroll.show()
+    widget.set_emoticons(make_emotes())
+    app.processEvents()
+
+    samples = []
+    for frame in range(FRAMES):
+        frame_start = start = time.perf_counter()
+        for event in range(EVENTS_PER_FRAME):
+            drive(scroll, widget, frame * EVENTS_PER_FRAME + event)
+        busy = time.perf_counter() - start
+        # 等到帧末尾再处理事件循环，让合并的定时器有机会触发（等待时间不计入）
+        time.sleep(max(0.0, FRAME_SECONDS - busy - (time.perf_counter() - frame_start - busy)))
+        start = time.perf_counter()
+        app.processEvents()
+        busy += time.perf_counter() - start
+        samples.append(busy * 1000)
+    scroll.close()
+    scroll.deleteLater()
+    app.processEvents()
+    return samples
+
+
+def slider_drag(scroll, widget, step):
+    widget.set_icon_size(48 + step % 80)
+
+
+def window_drag(scroll, widget, step):
+    scroll.resize(600 + step * 5, 700)
+
+
+def main():
+    app = QApplication.instance() or QApplication(sys.argv)
+    for scenario, drive in (("slider drag", slider_drag), ("window drag", window_drag)):
+        for label, cls in (("legacy grid", LegacyPackageWidget), ("coalesced flow", EmoticonPackageWidget)):
+            samples = measure(cls, app, drive)
+            print(f"{scenario:12s} {label:15s} frame median {statistics.median(samples):7.2f} ms  "
+                  f"max {max(samples):7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+# benchmarks/bench_icon_decode.py
+"""
+基准测试：打开一个已缓存的1000个表情的表情包时UI线程的负担（本地模拟接口，图片为200x200的PNG，offscreen Qt）。
+先下载全部图片并等待打包文件生成，再切换到其他表情包后重新打开它，分别测量从打包文件和从图片缓存文件加载：
+
+main thread cpu: 从切换表情包到所有按钮显示图标期间UI线程占用的CPU时间
+until icons:     所有按钮显示图标的总耗时
+max loop lag:    期间事件循环的最大延迟（5ms探测定时器）
+
+运行方式（在项目根目录）:
+    python -m benchmarks.bench_icon_decode
+"""
+import os
+import time
+import logging
+import statistics
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtWidgets import QApplication
+
+from benchmarks.stub_server import StubBiliServer
+from benchmarks.run_suite import (ROOM_ID, fresh_cache_dir, new_model, new_window, close_window,
+                                  process_events_until)
+
+EMOTES = 1000
+ROUNDS = 3
+
+
+def icons_ready(view) -> bool:
+    buttons = view.emoticon_widget.emoticon_buttons
+    return bool(buttons) and all(not button.icon().isNull() for button in buttons)
+
+
+def icons_ready_checker(view):
+    """逐步检查的 icons_ready：已显示图标的按钮不再重复检查，避免检查本身占用UI线程。"""
+    checked = [0]
+
+    def ready() -> bool:
+        buttons = view.emoticon_widget.emoticon_buttons
+        while checked[0] < len(buttons) and not buttons[checked[0]].icon().isNull():
+            checked[0] += 1
+        return bool(buttons) and checked[0] == len(buttons)
+    return ready
+
+
+def open_package(app, view, row: int, other_row: int):
+    view.package_list.setCurrentRow(other_row)
+    process_events_until(app, lambda: False, timeout=0.2)
+    lags, last = [], [time.perf_counter()]
+
+    def probe():
+        now = time.perf_counter()
+        lags.append(max(0.0, now - last[0] - 0.005))
+        last[0] = now
+
+    probe_timer = QTimer()
+    probe_timer.timeout.connect(probe)
+    probe_timer.start(5)
+    cpu_start, start = time.thread_time(), time.perf_counter()
+    view.package_list.setCurrentRow(row)
+    process_events_until(app, icons_ready_checker(view), timeout=30)
+    wall = time.perf_counter() - start
+    cpu = time.thread_time() - cpu_start
+    probe_timer.stop()
+    # 同步完成时探测定时器可能一次都没有触发：把最后一次探测到结束的时间也算作阻塞
+    probe()
+    return cpu, wall, max(lags) if lags else 0.0
+
+
+def main():
+    logging.disable(logging.CRITICAL)
+    app = QApplication.instance() or QApplication([])
+    server = StubBiliServer(user_package_sizes=(EMOTES,), live_package_sizes=(20,), charge_package_sizes=(10,),
+                            image_bytes=0, image_pixels=200).start()
+    server.install()
+    try:
+        with fresh_cache_dir():
+            model = new_model()
+            view, controller = new_window(model)
+            model.load_all_emoticons(ROOM_ID)
+            controller._on_emoticons_loaded(model.emoticons)
+            app.processEvents()
+            rows = {view.package_list.item(i).data(Qt.UserRole): i for i in range(view.package_list.count())}
+            big_id = max(model.emoticons, key=lambda pkg_id: len(model.emoticons[pkg_id].emotes))
+            other_id = next(pkg_id for pkg_id in model.emoticons if pkg_id != big_id)
+            emotes = model.emoticons[big_id].emotes
+
+            # 预热：下载全部图片并等待打包文件生成
+            view.package_list.setCurrentRow(rows[big_id])
+            process_events_until(app, lambda: icons_ready(view), timeout=60)
+            process_events_until(app, lambda: all(model.get_packed_icon(e) is not None for e in emotes), timeout=30)
+
+            for label, packed in (("packed", True), ("image files", False)):
+                model.pack_enabled = packed
+                results = [open_package(app, view, rows[big_id], rows[other_id]) for _ in range(ROUNDS)]
+                cpu = statistics.median(r[0] for r in results)
+                wall = statistics.median(r[1] for r in results)
+                lag = statistics.median(r[2] for r in results)
+                print(f"{label:12s} main thread cpu {cpu * 1000:7.1f} ms   until icons {wall * 1000:7.1f} ms   "
+                      f"max loop lag {lag * 1000:6.1f} ms")
+            close_window(app, view, model)
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+# benchmarks/bench_logging.py
+"""
+基准测试：日志突发时调用线程（例如UI线程）在每条日志上花费的时间。
+对比旧的同步 FileHandler + StreamHandler 与队列化的后台写入管线。
+
+运行方式（在项目根目录）:
+    python -m benchmarks.bench_logging > /dev/null
+结果输出到 stderr。
+"""
+import os
+import sys
+import time
+import logging
+import tempfile
+import statistics
+
+from app import logger_setup
+
+BURST = 5000
+
+
+def burst(logger: logging.Logger) -> list:
+    samples = []
+    for i in range(BURST):
+        start = time.perf_counter()
+        logger.info("图片已下载并缓存至: %s", f"cache/images/pkg/{i}.png")
+        samples.append((time.perf_counter() - start) * 1e6)
+    return samples
+
+
+def report(label: str, samples: list):
+    print(f"{label:22s} median {statistics.median(samples):7.2f} us  "
+          f"p99 {sorted(samples)[int(len(samples) * 0.99)]:8.2f} us  total {sum(samples) / 1000:7.1f} ms",
+          file=sys.stderr)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        root = logging.getLogger()
+        logger = logging.getLogger("bench")
+
+        # 旧实现：同步写文件和控制台
+        handlers = [logging.FileHandler(os.path.join(tmp, "sync.log"), encoding='utf-8'), logging.StreamHandler(sys.stdout)]
+        for handler in handlers:
+            handler.setFormatter(logging.Formatter(logger_setup.LOG_FORMAT))
+            root.addHandler(handler)
+        root.setLevel(logging.INFO)
+        report("sync handlers", burst(logger))
+        for handler in handlers:
+            root.removeHandler(handler)
+            handler.close()
+
+        # 新实现：队列 + 后台写线程
+        logger_setup.setup_logger(log_file=os.path.join(tmp, "queued.log"))
+        report("queued pipeline", burst(logger))
+        logger_setup.shutdown_logger()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# benchmarks/bench_pack_files.py
+"""
+基准测试：打开一个含300个已缓存表情的表情包时，读取并解码全部图标的耗时。
+对比单独文件布局（每个表情检查映射文件 + stat + open）与打包文件（一次 open + mmap）。
+
+cold: 每轮使用新的模型/打包文件管理器（打包文件需要重新打开和映射）
+warm: 同一个管理器中重复打开同一个表情包
+注意：两种情况下文件内容都已在操作系统页缓存中，未测量磁盘冷启动。
+
+运行方式（在项目根目录）:
+    python -m benchmarks.bench_pack_files
+"""
+import os
+import sys
+import json
+import time
+import tempfile
+import statistics
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtWidgets import QApplication
+from PyQt5.QtGui import QImage, QColor, QPixmap
+
+EMOTE_COUNT = 300
+ROUNDS = 10
+
+
+def populate_cache(model, package):
+    """在缓存目录中生成单独的图片文件和映射文件。"""
+    package_dir = model._get_package_cache_dir(package.name)
+    os.makedirs(package_dir, exist_ok=True)
+    image = QImage(84, 84, QImage.Format_ARGB32)
+    mappings = {}
+    for emote in package.emotes:
+        image.fill(QColor((emote.id * 37) % 255, 120, 200))
+        image.save(os.path.join(package_dir, f"{emote.id}_{package.name}.png"))
+        mappings[str(emote.id)] = package.name
+    with open(model._get_mapping_file_path(package.name), "w", encoding="utf-8") as f:
+        json.dump(mappings, f)
+
+
+def open_loose(model, package):
+    for emote in package.emotes:
+        QPixmap(model.get_emoticon_image(emote.url, emote.id, emote.package_name))
+
+
+def open_packed(model, package):
+    pixmap = QPixmap()
+    for emote in package.emotes:
+        pixmap.loadFromData(model.get_packed_icon(emote))
+
+
+def main():
+    app = QApplication.instance() or QApplication(sys.argv)
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        from app.models import EmoticonManager
+        from app.emote_records import EmotePackage
+
+        package = EmotePackage(1, "测试表情包", "user")
+        for i in range(EMOTE_COUNT):
+            package.add_emote(f"[表情{i}]", f"http://example.invalid/{i}.png", 1000 + i)
+
+        model = EmoticonManager()
+        populate_cache(model, package)
+        model.pack_enabled = True
+        model._schedule_pack_build(package.name)
+        model.pack_store._build_timers[model._get_package_cache_dir(package.name)].join()
+
+        for label, fn, pack_enabled in (("loose files", open_loose, False), ("pack file", open_packed, True)):
+            cold, warm = [], []
+            for _ in range(ROUNDS):
+                model = EmoticonManager()
+                model.pack_enabled = pack_enabled
+                start = time.perf_counter()
+                fn(model, package)
+                cold.append((time.perf_counter() - start) * 1000)
+                start = time.perf_counter()
+                fn(model, package)
+                warm.append((time.perf_counter() - start) * 1000)
+                model.shutdown()
+                app.processEvents()  # 处理模型关闭时投递的事件，不计入下一轮的耗时
+            print(f"{label:12s} cold median {statistics.median(cold):7.2f} ms   warm median {statistics.median(warm):7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
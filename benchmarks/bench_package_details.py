@@ -0,0 +1,70 @@
+# benchmarks/bench_package_details.py
+"""
+基准测试：账号有300个用户表情包时获取用户表情包详情（本地模拟接口，每个表情包给详情接口增加2ms延迟）。
+对比一次请求所有ID（旧方式）与分块并行获取（每块20个，最多4块同时请求）。
+
+latency: 第一批表情包可以显示的时间和全部获取完成的时间
+errors:  接口有一半概率返回HTTP 500时，10次获取平均得到的表情包数量（容错层的重试对两种方式都生效）
+
+运行方式（在项目根目录）:
+    python -m benchmarks.bench_package_details
+"""
+import os
+import time
+import logging
+import tempfile
+import statistics
+
+from benchmarks.stub_server import StubBiliServer
+
+PACKAGES = 300
+ROUNDS = 5
+ERROR_ROUNDS = 10
+
+
+def fetch(model, chunk_size: int):
+    model.package_chunk_size = chunk_size
+    first = []
+    start = time.perf_counter()
+
+    def on_partial(packages):
+        if not first:
+            first.append(time.perf_counter() - start)
+
+    packages, _ = model._fetch_user_packages(on_partial)
+    return (first[0] if first else float("nan")), time.perf_counter() - start, len(packages or {})
+
+
+def main():
+    logging.disable(logging.CRITICAL)
+    os.chdir(tempfile.mkdtemp())
+    server = StubBiliServer(latency=0.02, detail_latency_per_package=0.002,
+                            user_package_sizes=[5] * PACKAGES).start()
+    server.install()
+    from app.models import EmoticonManager
+    try:
+        for label, chunk_size in (("single request", 10 ** 6), ("chunked", 20)):
+            model = EmoticonManager()
+            firsts, totals = [], []
+            for _ in range(ROUNDS):
+                first, total, _ = fetch(model, chunk_size)
+                firsts.append(first * 1000)
+                totals.append(total * 1000)
+            model.shutdown()
+            print(f"latency {label:15s} first packages {statistics.median(firsts):7.1f} ms   "
+                  f"all packages {statistics.median(totals):7.1f} ms")
+
+        server.error_rate = 0.5
+        for label, chunk_size in (("single request", 10 ** 6), ("chunked", 20)):
+            model = EmoticonManager()
+            model.api.failure_threshold = 10 ** 9  # 只比较重试效果，不让熔断器打开
+            counts = [fetch(model, chunk_size)[2] for _ in range(ERROR_ROUNDS)]
+            model.shutdown()
+            print(f"errors  {label:15s} packages loaded avg {statistics.mean(counts):6.1f} / {PACKAGES}   "
+                  f"min {min(counts)}")
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
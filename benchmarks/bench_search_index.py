@@ -0,0 +1,64 @@
+# benchmarks/bench_search_index.py
+"""
+基准测试：在合成的2万个表情语料上构建、增量更新和查询搜索索引。
+
+运行方式（在项目根目录）:
+    python -m benchmarks.bench_search_index
+"""
+import random
+import time
+import statistics
+
+from app.emote_records import EmotePackage
+from app.search_index import EmoticonSearchIndex
+
+PACKAGE_COUNT = 400
+EMOTES_PER_PACKAGE = 50  # 共 20,000 个表情
+QUERY_ROUNDS = 200
+CJK_WORDS = ["哈哈", "打call", "晚安", "比心", "吃瓜", "疑惑", "探头", "生气", "大笑", "加油",
+             "好耶", "草", "awsl", "doge", "喝茶", "冲鸭", "点赞", "害怕", "哭哭", "开心"]
+TYPES = ["user", "live", "upower"]
+
+
+def make_corpus(seed: int = 42, version: int = 0) -> dict:
+    rng = random.Random(seed)
+    emoticons = {}
+    for pkg_index in range(PACKAGE_COUNT):
+        suffix = f"v{version}" if pkg_index == 0 else ""
+        package = EmotePackage(pkg_index, f"主播{pkg_index % 80}的表情包{suffix}", TYPES[pkg_index % 3])
+        for i in range(EMOTES_PER_PACKAGE):
+            word = rng.choice(CJK_WORDS) + rng.choice(CJK_WORDS)
+            package.add_emote(f"[{word}_{pkg_index}_{i}{suffix}]", f"https://i0.hdslb.com/{pkg_index}/{i}.png",
+                              f"{pkg_index}_{i}")
+        emoticons[pkg_index] = package
+    return emoticons
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def main():
+    corpus = make_corpus()
+    total = sum(len(p.emotes) for p in corpus.values())
+    index = EmoticonSearchIndex()
+    _, build_ms = timed(index.update, corpus)
+    _, noop_ms = timed(index.update, make_corpus())
+    _, incremental_ms = timed(index.update, make_corpus(version=1))
+    print(f"corpus {total} emotes: build {build_ms:.1f} ms, "
+          f"reload unchanged {noop_ms:.1f} ms, reload with 1 changed package {incremental_ms:.1f} ms")
+
+    queries = ["哈", "打call", "晚安比心", "doge", "awsl_12", "主播7", "upower", "不存在的表情", "[好耶"]
+    for query in queries:
+        samples = []
+        for _ in range(QUERY_ROUNDS):
+            results, elapsed = timed(index.search, query)
+            samples.append(elapsed)
+        print(f"query {query!r:16s} hits {len(results):4d}  median {statistics.median(samples):6.3f} ms  "
+              f"max {max(samples):6.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# benchmarks/bench_ui_diff.py
+"""
+基准测试：重新加载一个含50个表情包、其中只有1个包发生变化的直播间时，UI线程的耗时。
+对比旧的"清空后全部重建"方式与新的按键增量更新方式。
+
+运行方式（在项目根目录）:
+    QT_QPA_PLATFORM=offscreen python -m benchmarks.bench_ui_diff
+"""
+import os
+import sys
+import time
+import statistics
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtWidgets import QApplication, QListWidgetItem
+from PyQt5.QtCore import Qt
+
+from app.views import MainWindow, EmoticonButton
+from app.emote_records import EmotePackage
+
+PACKAGE_COUNT = 50
+EMOTES_PER_PACKAGE = 40
+ROOM_COUNT = 30
+ROUNDS = 20
+
+
+def make_emoticons(version: int = 0) -> dict:
+    """生成合成表情包数据，version变化时只改变第一个表情包。"""
+    emoticons = {}
+    for pkg_index in range(PACKAGE_COUNT):
+        suffix = f"_v{version}" if pkg_index == 0 else ""
+        package = EmotePackage(pkg_index, f"表情包{pkg_index}{suffix}", "user")
+        for i in range(EMOTES_PER_PACKAGE):
+            package.add_emote(f"[表情{pkg_index}_{i}{suffix}]", f"http://example.invalid/{pkg_index}/{i}.png",
+                              f"{pkg_index}_{i}{suffix}")
+        emoticons[pkg_index] = package
+    return emoticons
+
+
+def make_rooms() -> list:
+    return [{"room_id": str(1000 + i), "name": f"主播{i}"} for i in range(ROOM_COUNT)]
+
+
+def grid_emotes(emoticons: dict, pkg_id) -> list:
+    return emoticons[pkg_id].emotes
+
+
+def legacy_reload(window: MainWindow, emoticons: dict, rooms: list, pkg_id):
+    """旧实现：清空并重建列表、下拉框和网格中的全部控件。"""
+    window.package_list.clear()
+    for key, pkg_data in emoticons.items():
+        item = QListWidgetItem(pkg_data.name)
+        item.setData(Qt.UserRole, key)
+        window.package_list.addItem(item)
+
+    window.room_id_combo.clear()
+    for room in rooms:
+        window.room_id_combo.addItem(f"{room['name']} ({room['room_id']})", room['room_id'])
+
+    grid = window.emoticon_widget
+    for button in grid.emoticon_buttons:
+        grid.layout.removeWidget(button)
+        button.deleteLater()
+    grid.emoticon_buttons = [EmoticonButton(e, grid._current_icon_size, grid) for e in grid_emotes(emoticons, pkg_id)]
+    grid._relayout_emoticons(True)
+
+
+def diff_reload(window: MainWindow, emoticons: dict, rooms: list, pkg_id):
+    """新实现：按键增量更新。"""
+    window.populate_package_list(emoticons)
+    window.update_room_combo(rooms)
+    window.emoticon_widget.set_emoticons(grid_emotes(emoticons, pkg_id))
+
+
+def run(reload_fn, app: QApplication) -> list:
+    window = MainWindow()
+    window.resize(1200, 800)
+    window.show()
+    rooms = make_rooms()
+    # 预热：先完整加载一次，选中一个未变化的包
+    base = make_emoticons(0)
+    diff_reload(window, base, rooms, 1)
+    app.processEvents()
+
+    samples = []
+    for round_index in range(1, ROUNDS + 1):
+        emoticons = make_emoticons(round_index)
+        start = time.perf_counter()
+        reload_fn(window, emoticons, rooms, 1)
+        app.processEvents()  # 计入deleteLater和重绘的开销
+        samples.append((time.perf_counter() - start) * 1000)
+    window.close()
+    window.deleteLater()
+    app.processEvents()
+    return samples
+
+
+def main():
+    app = QApplication.instance() or QApplication(sys.argv)
+    for label, fn in (("legacy (clear + rebuild)", legacy_reload), ("diff (keyed update)", diff_reload)):
+        samples = run(fn, app)
+        print(f"{label:26s} median {statistics.median(samples):7.2f} ms  "
+              f"p95 {sorted(samples)[int(len(samples) * 0.95) - 1]:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+# benchmarks/run_suite.py
+"""
+端到端基准测试套件：在本地模拟的B站API和图片CDN（stub_server）上运行可重复的场景，
+结果写入JSON文件，便于在不同提交之间对比。
+
+场景:
+    cold_room_load   新的缓存目录中首次加载直播间的全部表情包
+    warm_room_load   同一个模型再次加载同一直播间（房间信息已缓存）
+    switch_rooms     加载直播间A，切换到直播间B，再切换回A
+    open_1k_package  在主窗口中打开一个含1000个表情的表情包：界面构建耗时、全部图标下载完成耗时、再次打开耗时
+    loop_send        循环模式下以最快速度（定时器间隔0）发送表情，统计发送速率和事件循环延迟
+    prefetch_room    把直播间全部表情图片加入下载队列，统计全部下载完成的耗时和吞吐
+
+GUI场景使用 offscreen Qt 平台，不需要显示器。
+
+运行方式（在项目根目录）:
+    python -m benchmarks.run_suite                                  # 全部场景，结果写入 benchmarks/results/<提交>.json
+    python -m benchmarks.run_suite -s cold_room_load -s loop_send   # 只运行部分场景
+    python -m benchmarks.run_suite --latency 0.03 --image-latency 0.01 --error-rate 0.02
+    python -m benchmarks.run_suite --compare benchmarks/results/abc1234.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+from contextlib import contextmanager
+from typing import Callable, Dict, List
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtWidgets import QApplication
+
+from benchmarks.stub_server import StubBiliServer
+
+ROOM_ID = 4242
+COOKIE = "SESSDATA=bench; bili_jct=benchcsrf"
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS: Dict[str, Callable] = {}
+
+
+def scenario(fn):
+    SCENARIOS[fn.__name__] = fn
+    return fn
+
+
+@contextmanager
+def fresh_cache_dir():
+    """在新的临时目录中运行（缓存目录和config.json都是相对当前目录的路径）。"""
+    previous = os.getcwd()
+    path = tempfile.mkdtemp(prefix="emoticon_bench_")
+    os.chdir(path)
+    try:
+        yield path
+    finally:
+        os.chdir(previous)
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def process_events_until(app: QApplication, done: Callable[[], bool], timeout: float = 120.0) -> bool:
+    deadline = time.perf_counter() + timeout
+    while not done():
+        if time.perf_counter() > deadline:
+            return False
+        app.processEvents()
+        time.sleep(0.001)
+    return True
+
+
+def downloads_idle(model) -> bool:
+    manager = model.download_manager
+    return manager is None or manager.task_queue.unfinished_tasks == 0
+
+
+def new_model():
+    from app.models import EmoticonManager
+    model = EmoticonManager()
+    model.set_cookie(COOKIE)
+    return model
+
+
+def new_window(model):
+    from app.views import MainWindow
+    from app.controllers import MainController
+    view = MainWindow()
+    controller = MainController(view, model)
+    view.room_id_combo.setEditText(str(ROOM_ID))
+    view.cookie_edit.setText(COOKIE)
+    view.show()
+    return view, controller
+
+
+def close_window(app: QApplication, view, model):
+    view.hide()
+    model.shutdown()
+    view.deleteLater()
+    app.processEvents()
+
+
+# --- 场景 ---
+
+@scenario
+def cold_room_load(app, server) -> Dict:
+    with fresh_cache_dir():
+        model = new_model()
+        start = time.perf_counter()
+        packages = model.load_all_emoticons(ROOM_ID)
+        elapsed = time.perf_counter() - start
+        model.shutdown()
+    return {"seconds": elapsed, "packages": len(packages), "emotes": sum(len(p.emotes) for p in packages.values())}
+
+
+@scenario
+def warm_room_load(app, server) -> Dict:
+    with fresh_cache_dir():
+        model = new_model()
+        model.load_all_emoticons(ROOM_ID)
+        before = sum(server.request_counts().values())
+        start = time.perf_counter()
+        packages = model.load_all_emoticons(ROOM_ID)
+        elapsed = time.perf_counter() - start
+        requests_sent = sum(server.request_counts().values()) - before
+        model.shutdown()
+    return {"seconds": elapsed, "packages": len(packages), "requests": requests_sent}
+
+
+@scenario
+def switch_rooms(app, server) -> Dict:
+    """加载直播间A，切换到直播间B，再切换回A。"""
+    with fresh_cache_dir():
+        model = new_model()
+        result = {}
+        for label, room_id in (("first", ROOM_ID), ("other_room", ROOM_ID + 1), ("back", ROOM_ID)):
+            before = sum(server.request_counts().values())
+            start = time.perf_counter()
+            model.load_all_emoticons(room_id)
+            result[f"{label}_seconds"] = time.perf_counter() - start
+            result[f"{label}_requests"] = sum(server.request_counts().values()) - before
+        model.shutdown()
+    return result
+
+
+@scenario
+def open_1k_package(app, server) -> Dict:
+    with fresh_cache_dir():
+        model = new_model()
+        view, controller = new_window(model)
+        model.load_all_emoticons(ROOM_ID)
+        controller._on_emoticons_loaded(model.emoticons)
+        app.processEvents()
+
+        rows = {view.package_list.item(i).data(Qt.UserRole): i for i in range(view.package_list.count())}
+        big_id = max(model.emoticons, key=lambda pkg_id: len(model.emoticons[pkg_id].emotes))
+        other_id = next(pkg_id for pkg_id in model.emoticons if pkg_id != big_id)
+
+        start = time.perf_counter()
+        view.package_list.setCurrentRow(rows[big_id])
+        app.processEvents()
+        build = time.perf_counter() - start
+        process_events_until(app, lambda: downloads_idle(model))
+        # 等待最后一批下载完成事件合并刷新到按钮上
+        QTimer.singleShot(50, lambda: None)
+        process_events_until(app, lambda: False, timeout=0.1)
+        icons_ready = time.perf_counter() - start
+
+        view.package_list.setCurrentRow(rows[other_id])
+        app.processEvents()
+        start = time.perf_counter()
+        view.package_list.setCurrentRow(rows[big_id])
+        app.processEvents()
+        reopen = time.perf_counter() - start
+
+        emotes = len(model.emoticons[big_id].emotes)
+        close_window(app, view, model)
+    return {"build_seconds": build, "icons_ready_seconds": icons_ready, "reopen_seconds": reopen, "emotes": emotes}
+
+
+@scenario
+def loop_send(app, server, duration: float = 3.0) -> Dict:
+    with fresh_cache_dir():
+        model = new_model()
+        view, controller = new_window(model)
+        model.load_all_emoticons(ROOM_ID)
+        for emote in next(iter(model.emoticons.values())).emotes[:20]:
+            controller.add_to_send_queue(emote)
+        view.loop_check.setChecked(True)
+
+        lags = []
+        last = [time.perf_counter()]
+
+        def probe():
+            now = time.perf_counter()
+            lags.append(max(0.0, now - last[0] - 0.01))
+            last[0] = now
+
+        probe_timer = QTimer()
+        probe_timer.timeout.connect(probe)
+        probe_timer.start(10)
+
+        before = server.request_counts().get("/msg/send", 0)
+        controller.toggle_sending()
+        controller.sending_timer.setInterval(0)
+        start = time.perf_counter()
+        process_events_until(app, lambda: time.perf_counter() - start >= duration, timeout=duration + 1)
+        controller.toggle_sending()
+        elapsed = time.perf_counter() - start
+        process_events_until(app, lambda: not controller.threadpool, timeout=10)
+        probe_timer.stop()
+        sent = server.request_counts().get("/msg/send", 0) - before
+        close_window(app, view, model)
+
+    lags.sort()
+    return {
+        "sends": sent,
+        "sends_per_second": sent / elapsed,
+        "loop_lag_p50_ms": lags[len(lags) // 2] * 1000 if lags else 0.0,
+        "loop_lag_max_ms": lags[-1] * 1000 if lags else 0.0,
+    }
+
+
+@scenario
+def prefetch_room(app, server) -> Dict:
+    with fresh_cache_dir():
+        model = new_model()
+        model.init_download_manager()
+        model.load_all_emoticons(ROOM_ID)
+        emotes = [e for pkg in model.emoticons.values() for e in pkg.emotes]
+        before = server.request_counts().get("/img/", 0)
+        start = time.perf_counter()
+        for emote in emotes:
+            model.get_emoticon_image(emote.url, emote.id, emote.package_name)
+        enqueue = time.perf_counter() - start
+        model.download_manager.task_queue.join()
+        elapsed = time.perf_counter() - start
+        downloaded = server.request_counts().get("/img/", 0) - before
+        model.shutdown()
+    return {"seconds": elapsed, "enqueue_seconds": enqueue, "images": downloaded,
+            "images_per_second": downloaded / elapsed if elapsed else 0.0}
+
+
+# --- 运行与输出 ---
+
+def summarize(runs: List[Dict]) -> Dict:
+    """数值字段取中位数，同时保留每一轮的原始结果。"""
+    summary = {}
+    for key in runs[0]:
+        values = [run[key] for run in runs]
+        summary[key] = statistics.median(values) if isinstance(values[0], (int, float)) else values[0]
+    return {"median": summary, "runs": runs}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def compare(results: Dict, baseline_path: str):
+    """打印与基准结果文件的对比（中位数的变化百分比）。"""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    print(f"\n与 {baseline.get('commit', baseline_path)} 对比:")
+    for name, result in results["scenarios"].items():
+        old = baseline.get("scenarios", {}).get(name)
+        if old is None:
+            continue
+        for key, value in result["median"].items():
+            old_value = old["median"].get(key)
+            if isinstance(value, (int, float)) and isinstance(old_value, (int, float)) and old_value:
+                print(f"  {name}.{key:22s} {old_value:12.4f} -> {value:12.4f}  ({(value - old_value) / old_value * 100:+6.1f}%)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="表情包工具端到端基准测试")
+    parser.add_argument("-s", "--scenario", action="append", choices=sorted(SCENARIOS), help="要运行的场景（可重复，默认全部）")
+    parser.add_argument("-n", "--repeat", type=int, default=3, help="每个场景重复次数（结果取中位数）")
+    parser.add_argument("-o", "--output", help="结果文件路径（默认 benchmarks/results/<提交>.json）")
+    parser.add_argument("--compare", help="与之前的结果文件对比")
+    parser.add_argument("--latency", type=float, default=0.02, help="模拟API延迟（秒）")
+    parser.add_argument("--image-latency", type=float, default=0.005, help="模拟图片请求延迟（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="模拟请求失败（HTTP 500）的概率")
+    parser.add_argument("--api-rate-limit", type=float, help="GET接口每秒允许的请求数")
+    parser.add_argument("--send-rate-limit", type=float, help="发送接口每秒允许的请求数")
+    parser.add_argument("--image-bytes", type=int, default=4096, help="每张模拟图片的大小")
+    args = parser.parse_args(argv)
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    server = StubBiliServer(latency=args.latency, image_latency=args.image_latency, error_rate=args.error_rate,
+                            api_rate_limit=args.api_rate_limit, send_rate_limit=args.send_rate_limit,
+                            user_package_sizes=(1000, 60, 60), live_package_sizes=(30, 30),
+                            charge_package_sizes=(40,), image_bytes=args.image_bytes).start()
+    server.install()
+
+    results = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "qt_platform": os.environ.get("QT_QPA_PLATFORM"),
+        "server": server.params(),
+        "repeat": args.repeat,
+        "scenarios": {},
+    }
+    try:
+        for name in args.scenario or list(SCENARIOS):
+            runs = [SCENARIOS[name](app, server) for _ in range(args.repeat)]
+            results["scenarios"][name] = summarize(runs)
+            median = ", ".join(f"{k}={v:.4g}" if isinstance(v, float) else f"{k}={v}"
+                               for k, v in results["scenarios"][name]["median"].items())
+            print(f"{name:16s} {median}")
+    finally:
+        server.stop()
+
+    output = args.output or os.path.join(PROJECT_ROOT, "benchmarks", "results", f"{results['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"结果已写入 {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,367 @@
+# benchmarks/stub_server.py
+"""
+本地模拟的B站API和图片CDN，供基准测试使用（只依赖标准库，不需要Qt）。
+
+模拟 app/config.py 中的所有接口，返回结构与真实接口一致的合成数据：
+- 用户表情包列表 / 表情包详情 / 直播间表情包 / 充电表情包
+- 直播间信息（主播UID）/ 主播信息（名称）
+- 发送弹幕（POST）
+- 表情图片（/img/...，返回指定大小的有效PNG）
+
+可配置接口延迟、错误率（HTTP 500）和频率限制（超出时GET返回HTTP 412，发送返回业务码10030）。
+
+用法:
+    server = StubBiliServer(latency=0.02, user_package_sizes=(1000, 50))
+    server.start()
+    server.install()   # 把 app.config 中的接口地址指向本地服务器
+    ...
+    server.stop()
+"""
+import json
+import time
+import zlib
+import struct
+import random
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Sequence
+from urllib.parse import urlparse, parse_qs
+
+# 接口路径（与 app/config.py 中的地址一一对应）
+ENDPOINT_PATHS = {
+    "GET_USER_EMOTICON_API": "/x/emote/user/panel/web",
+    "GET_EMOTICON_PACKAGE_API": "/x/emote/package",
+    "GET_LIVE_EMOTICON_API": "/xlive/web-ucenter/v2/emoticon/GetEmoticons",
+    "SEND_DANMU_API": "/msg/send",
+    "GET_CHARGE_EMOTICON_API": "/x/upowerv2/gw/rights/index",
+    "GET_LIVE_INFORMATION": "/room/v1/Room/get_info",
+    "GET_UP_INFORMATION": "/live_user/v1/Master/info",
+    "CONNECTIVITY_PROBE_URL": "/",
+}
+
+UP_UID = 777
+UP_NAME = "测试主播"
+
+
+def make_png(size_bytes: int, seed: int = 0, pixels: int = 8) -> bytes:
+    """
+    生成一张 pixels x pixels 的有效PNG，并用tEXt块填充到大约 size_bytes 字节。
+    pixels 大于8时用4x4色块的随机图案填充，解码开销接近真实的表情图片。
+    """
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff)
+
+    if pixels <= 8:
+        color = bytes(((seed * 37) % 256, (seed * 91) % 256, 200, 255))
+        raw = b"".join(b"\x00" + color * pixels for _ in range(pixels))
+    else:
+        rng = random.Random(seed)
+        rows = []
+        for _ in range((pixels + 3) // 4):
+            row = b"".join(bytes((rng.randrange(256), rng.randrange(256), rng.randrange(256), 255)) * 4
+                           for _ in range((pixels + 3) // 4))[:pixels * 4]
+            rows.extend([b"\x00" + row] * 4)
+        raw = b"".join(rows[:pixels])
+    png = (b"\x89PNG\r\n\x1a\n"
+           + chunk(b"IHDR", struct.pack(">IIBBBBB", pixels, pixels, 8, 6, 0, 0, 0))
+           + chunk(b"IDAT", zlib.compress(raw)))
+    padding = max(0, size_bytes - len(png) - 12 - 12 - 8)
+    if padding:
+        png += chunk(b"tEXt", b"pad\x00" + b"x" * padding)
+    return png + chunk(b"IEND", b"")
+
+
+class _RateLimiter:
+    """令牌桶：rate 为每秒允许的请求数，None 表示不限制。"""
+    def __init__(self, rate: Optional[float]):
+        self.rate = rate
+        self._tokens = rate or 0
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        if self.rate is None:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.rate, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+
+class _BandwidthLimiter:
+    """共享带宽：所有图片响应排队占用一条 rate 字节/秒的链路，None 表示不限制。"""
+    def __init__(self, rate: Optional[float]):
+        self.rate = rate
+        self._next_free = time.monotonic()
+        self._lock = threading.Lock()
+
+    def transfer(self, nbytes: int):
+        """阻塞到这次传输在共享链路上完成。"""
+        if not self.rate:
+            return
+        with self._lock:
+            start = max(time.monotonic(), self._next_free)
+            self._next_free = start + nbytes / self.rate
+            done = self._next_free
+        time.sleep(max(0.0, done - time.monotonic()))
+
+
+class StubBiliServer:
+    """
+    模拟B站API的本地HTTP服务器。
+
+    Args:
+        latency: API接口的额外延迟（秒）
+        image_latency: 图片请求的额外延迟（秒）
+        error_rate: 请求返回HTTP 500的概率
+        api_rate_limit: GET接口每秒允许的请求数（None不限制）
+        send_rate_limit: 发送接口每秒允许的请求数（None不限制）
+        user_package_sizes: 每个用户表情包的表情数量
+        live_package_sizes: 每个直播间表情包的表情数量
+        charge_package_sizes: 每个充电档位表情包的表情数量
+        image_bytes: 每张表情图片的大小
+        image_pixels: 每张表情图片的边长（像素）
+        seed: 随机数种子（错误注入可重复）
+        detail_latency_per_package: 表情包详情接口每个表情包增加的延迟（秒），模拟响应越大越慢
+        image_bandwidth: 所有图片请求共享的带宽（字节/秒，None不限制），运行中可修改
+        image_max_concurrency: 同时处理的图片请求上限，超过时返回HTTP 429（None不限制），运行中可修改
+    """
+    def __init__(self, latency: float = 0.0, image_latency: float = 0.0, error_rate: float = 0.0,
+                 api_rate_limit: Optional[float] = None, send_rate_limit: Optional[float] = None,
+                 user_package_sizes: Sequence[int] = (50, 50, 50), live_package_sizes: Sequence[int] = (20, 20),
+                 charge_package_sizes: Sequence[int] = (30,), image_bytes: int = 4096, image_pixels: int = 8, seed: int = 0,
+                 detail_latency_per_package: float = 0.0, image_bandwidth: Optional[float] = None,
+                 image_max_concurrency: Optional[int] = None, host: str = "127.0.0.1", port: int = 0):
+        self.latency = latency
+        self.image_latency = image_latency
+        self.error_rate = error_rate
+        self.detail_latency_per_package = detail_latency_per_package
+        self.image_max_concurrency = image_max_concurrency
+        self.user_package_sizes = tuple(user_package_sizes)
+        self.live_package_sizes = tuple(live_package_sizes)
+        self.charge_package_sizes = tuple(charge_package_sizes)
+        self.image_bytes = image_bytes
+        self.image_pixels = image_pixels
+        self.seed = seed
+        self.requests = Counter()  # {路径: 请求次数}
+        self.last_send_at = 0.0  # 最近一次收到发送请求的时间（time.perf_counter，同一进程内可与触发时间比较）
+        self._requests_lock = threading.Lock()
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self._api_limiter = _RateLimiter(api_rate_limit)
+        self._send_limiter = _RateLimiter(send_rate_limit)
+        self._bandwidth = _BandwidthLimiter(image_bandwidth)
+        self._active_images = 0
+        self._active_lock = threading.Lock()
+        self._images: Dict[int, bytes] = {}
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+        self._saved_config: Dict[str, str] = {}
+
+    @property
+    def image_bandwidth(self) -> Optional[float]:
+        return self._bandwidth.rate
+
+    @image_bandwidth.setter
+    def image_bandwidth(self, rate: Optional[float]):
+        self._bandwidth.rate = rate
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def params(self) -> Dict:
+        """服务器参数（写入基准测试结果，便于对比）。"""
+        return {
+            "latency": self.latency, "image_latency": self.image_latency, "error_rate": self.error_rate,
+            "api_rate_limit": self._api_limiter.rate, "send_rate_limit": self._send_limiter.rate,
+            "user_package_sizes": list(self.user_package_sizes), "live_package_sizes": list(self.live_package_sizes),
+            "charge_package_sizes": list(self.charge_package_sizes), "image_bytes": self.image_bytes,
+            "image_pixels": self.image_pixels, "seed": self.seed,
+            "image_bandwidth": self.image_bandwidth, "image_max_concurrency": self.image_max_concurrency,
+            "detail_latency_per_package": self.detail_latency_per_package,
+        }
+
+    def start(self) -> "StubBiliServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="StubBiliServer", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.uninstall()
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def install(self):
+        """把 app.config 中的接口地址替换为本地服务器地址。"""
+        from app import config
+        for name, path in ENDPOINT_PATHS.items():
+            self._saved_config.setdefault(name, getattr(config, name))
+            setattr(config, name, self.base_url + path)
+
+    def uninstall(self):
+        from app import config
+        for name, value in self._saved_config.items():
+            setattr(config, name, value)
+        self._saved_config.clear()
+
+    # --- 合成数据 ---
+
+    def image_url(self, emote_id: int) -> str:
+        return f"{self.base_url}/img/{emote_id}.png"
+
+    def _emotes(self, first_id: int, count: int, prefix: str):
+        return [(first_id + i, f"[{prefix}_{i}]") for i in range(count)]
+
+    def user_packages(self):
+        return [{"id": 1000 + i, "text": f"用户表情包{i}", "size": size} for i, size in enumerate(self.user_package_sizes)]
+
+    def user_package_detail(self, pkg_id: int) -> Dict:
+        index = pkg_id - 1000
+        size = self.user_package_sizes[index]
+        return {"id": pkg_id, "emote": [{"id": emote_id, "text": text, "url": self.image_url(emote_id)}
+                                        for emote_id, text in self._emotes(100000 * (index + 1), size, f"u{index}")]}
+
+    def live_packages(self):
+        return [{"pkg_id": 2000 + i, "pkg_name": f"房间表情包{i}",
+                 "emoticons": [{"emoji": text, "url": self.image_url(emote_id), "emoticon_unique": f"room_{emote_id}"}
+                               for emote_id, text in self._emotes(5000000 + 100000 * i, size, f"l{i}")]}
+                for i, size in enumerate(self.live_package_sizes)]
+
+    def charge_data(self) -> Dict:
+        tabs, rights = [], {}
+        for i, size in enumerate(self.charge_package_sizes):
+            level = str(i + 1)
+            tabs.append({"privilege_type": i + 1, "privilege_name": f"档位{level}", "locked": False})
+            rights[level] = {"emote": {"locked": False, "emojis": [
+                {"id": emote_id, "name": text.strip("[]"), "icon": self.image_url(emote_id)}
+                for emote_id, text in self._emotes(9000000 + 100000 * i, size, f"c{i}")]}}
+        return {"up": {"name": UP_NAME, "tabs": tabs}, "privilege_rights": rights}
+
+    def image(self, emote_id: int) -> bytes:
+        data = self._images.get(emote_id)
+        if data is None:
+            data = self._images[emote_id] = make_png(self.image_bytes, emote_id, self.image_pixels)
+        return data
+
+    # --- 请求处理 ---
+
+    def _count(self, key: str):
+        with self._requests_lock:
+            self.requests[key] += 1
+
+    def request_counts(self) -> Dict[str, int]:
+        with self._requests_lock:
+            return dict(self.requests)
+
+    def _fail_randomly(self) -> bool:
+        if not self.error_rate:
+            return False
+        with self._random_lock:
+            return self._random.random() < self.error_rate
+
+    def _handle_get(self, path: str, query: Dict[str, list]):
+        """返回 (状态码, 内容类型, 响应体)。"""
+        if path.startswith("/img/"):
+            return self._handle_image(path)
+
+        time.sleep(self.latency)
+        if not self._api_limiter.allow():
+            return 412, "text/plain", b"rate limited"
+        if self._fail_randomly():
+            return 500, "text/plain", b"error"
+
+        if path == ENDPOINT_PATHS["GET_USER_EMOTICON_API"]:
+            data = {"packages": [{"id": p["id"], "text": p["text"]} for p in self.user_packages()]}
+        elif path == ENDPOINT_PATHS["GET_EMOTICON_PACKAGE_API"]:
+            ids = [int(i) for i in query.get("ids", [""])[0].split(",") if i]
+            time.sleep(self.detail_latency_per_package * len(ids))
+            data = {"packages": [self.user_package_detail(i) for i in ids if 0 <= i - 1000 < len(self.user_package_sizes)]}
+        elif path == ENDPOINT_PATHS["GET_LIVE_EMOTICON_API"]:
+            data = {"data": self.live_packages()}
+        elif path == ENDPOINT_PATHS["GET_LIVE_INFORMATION"]:
+            data = {"uid": UP_UID, "room_id": int(query.get("room_id", ["0"])[0])}
+        elif path == ENDPOINT_PATHS["GET_UP_INFORMATION"]:
+            data = {"info": {"uid": UP_UID, "uname": UP_NAME}}
+        elif path == ENDPOINT_PATHS["GET_CHARGE_EMOTICON_API"]:
+            data = self.charge_data()
+        elif path == "/":
+            return 200, "text/plain", b""
+        else:
+            return 404, "text/plain", b"not found"
+        return 200, "application/json", json.dumps({"code": 0, "message": "0", "data": data}).encode("utf-8")
+
+    def _handle_image(self, path: str):
+        with self._active_lock:
+            if self.image_max_concurrency is not None and self._active_images >= self.image_max_concurrency:
+                return 429, "text/plain", b"too many requests"
+            self._active_images += 1
+        try:
+            time.sleep(self.image_latency)
+            if self._fail_randomly():
+                return 500, "text/plain", b"error"
+            data = self.image(int(path[5:].split(".")[0]))
+            self._bandwidth.transfer(len(data))
+            return 200, "image/png", data
+        finally:
+            with self._active_lock:
+                self._active_images -= 1
+
+    def _handle_post(self, path: str):
+        if path != ENDPOINT_PATHS["SEND_DANMU_API"]:
+            return 404, "text/plain", b"not found"
+        self.last_send_at = time.perf_counter()
+        time.sleep(self.latency)
+        if self._fail_randomly():
+            return 500, "text/plain", b"error"
+        if not self._send_limiter.allow():
+            body = {"code": 10030, "message": "您发送弹幕的频率过快"}
+        else:
+            body = {"code": 0, "message": "", "data": {}}
+        return 200, "application/json", json.dumps(body, ensure_ascii=False).encode("utf-8")
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True  # 避免响应头和响应体分两次写出时等待延迟确认（约40ms）
+
+            def _reply(self, status: int, content_type: str, body: bytes, send_body: bool = True):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if send_body:
+                    try:
+                        self.wfile.write(body)
+                    except (BrokenPipeError, ConnectionResetError):
+                        pass  # 客户端已断开（例如关闭下载管理器时中止了请求）
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                server._count(url.path if not url.path.startswith("/img/") else "/img/")
+                self._reply(*server._handle_get(url.path, parse_qs(url.query)))
+
+            def do_HEAD(self):
+                server._count("HEAD " + urlparse(self.path).path)
+                self._reply(200, "text/plain", b"", send_body=False)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                self.rfile.read(length)
+                path = urlparse(self.path).path
+                server._count(path)
+                self._reply(*server._handle_post(path))
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -5,10 +5,11 @@ import qtmodern.styles
 import qtmodern.windows
 from PyQt5 import sip
 
-from app.views import MainWindow
+from app.views import MainWindow, EmoticonPackageWidget
 from app.models import EmoticonManager
 from app.controllers import MainController
-from app.logger_setup import setup_logger
+from app.logger_setup import setup_logger, load_logging_options
+from app.profiling import StallWatchdog, instrument, load_profiling_options
 
 import os
 
@@ -31,15 +32,26 @@ def main():
 
     # 确保 config.json 能被正确找到
     config_path = get_resource_path('config.json')
-    setup_logger()
+    setup_logger(**load_logging_options(config_path))
     
     app = QApplication(sys.argv)
     qtmodern.styles.dark(app)
+
+    # 可选的UI卡顿看门狗：必须在创建MVC组件之前给热点槽函数加上计时钩子
+    profiling_options = load_profiling_options(config_path)
+    if profiling_options:
+        watchdog = StallWatchdog(**profiling_options)
+        instrument(watchdog, {"MainController": MainController, "MainWindow": MainWindow,
+                              "EmoticonPackageWidget": EmoticonPackageWidget})
+        watchdog.start()
+        app.aboutToQuit.connect(watchdog.stop)
     
     # Initialize MVC components
     view = MainWindow()
     model = EmoticonManager()
     controller = MainController(view=view, model=model)
+    app.aboutToQuit.connect(controller.shutdown)
+    app.aboutToQuit.connect(model.shutdown)
     
     # Show the main window
     modern_window = qtmodern.windows.ModernWindow(view)
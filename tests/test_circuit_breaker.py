@@ -0,0 +1,83 @@
+# tests/test_circuit_breaker.py
+"""
+熔断器状态转换的测试（用 monkeypatch 控制 time.monotonic）。
+
+运行方式（在项目根目录）:
+    python -m pytest tests
+"""
+import pytest
+
+from app import resilience
+from app.resilience import CircuitBreaker
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(resilience.time, "monotonic", fake)
+    return fake
+
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker("test_open", failure_threshold=3, reset_timeout=10.0)
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+
+def test_success_resets_failure_count(clock):
+    breaker = CircuitBreaker("test_reset", failure_threshold=3, reset_timeout=10.0)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_allows_a_single_trial(clock):
+    breaker = CircuitBreaker("test_trial", failure_threshold=1, reset_timeout=10.0)
+    breaker.record_failure()
+    clock.now += 9.9
+    assert not breaker.allow()
+    clock.now += 0.1
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()  # 试探请求尚未完成
+
+
+def test_successful_trial_closes(clock):
+    breaker = CircuitBreaker("test_close", failure_threshold=1, reset_timeout=10.0)
+    breaker.record_failure()
+    clock.now += 10.0
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+    assert breaker.allow()
+
+
+def test_failed_trial_reopens_for_a_full_timeout(clock):
+    breaker = CircuitBreaker("test_reopen", failure_threshold=3, reset_timeout=10.0)
+    for _ in range(3):
+        breaker.record_failure()
+    clock.now += 10.0
+    assert breaker.allow()
+    breaker.record_failure()  # 半开状态下一次失败就重新打开，不需要再达到阈值
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now += 9.9
+    assert not breaker.allow()
+    clock.now += 0.1
+    assert breaker.allow()
@@ -0,0 +1,105 @@
+# tests/test_download_journal.py
+"""
+下载队列持久化日志的测试：重放、压缩、写了一半的行和多个实例共享日志。
+
+运行方式（在项目根目录）:
+    python -m pytest tests
+"""
+import json
+
+import pytest
+
+from app.download_manager import DownloadTask
+from app.download_journal import DownloadJournal
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache(tmp_path, monkeypatch):
+    # 跨进程文件锁位于相对路径 cache/locks 下
+    monkeypatch.chdir(tmp_path)
+
+
+def task(index: int, package_name: str = "pkg") -> DownloadTask:
+    return DownloadTask(f"images/{package_name}/{index}.png", f"http://example.invalid/{package_name}/{index}.png",
+                        str(index), package_name, priority=index % 3)
+
+
+def journal_at(tmp_path, **kwargs) -> DownloadJournal:
+    return DownloadJournal(str(tmp_path / "journal.jsonl"), batch_delay=60.0, **kwargs)
+
+
+def ids(entries) -> list:
+    return [entry["emoticon_id"] for entry in entries]
+
+
+def test_replay_keeps_unfinished_tasks_in_order(tmp_path):
+    journal = journal_at(tmp_path)
+    for i in range(5):
+        journal.record_added(task(i))
+    journal.record_finished(task(1))
+    journal.record_finished(task(3))
+    journal.flush()
+
+    entries = journal_at(tmp_path).compact()
+    assert ids(entries) == ["0", "2", "4"]
+    assert entries[2]["local_path"] == "images/pkg/4.png"
+    assert [entry["priority"] for entry in entries] == [0, 2, 1]
+
+
+def test_compact_includes_unflushed_records(tmp_path):
+    journal = journal_at(tmp_path)
+    journal.record_added(task(0))
+    journal.flush()
+    journal.record_added(task(1))
+    journal.record_finished(task(0))  # 仍在缓冲中
+    assert ids(journal.compact()) == ["1"]
+
+
+def test_compact_rewrites_only_outstanding_tasks(tmp_path):
+    journal = journal_at(tmp_path)
+    for i in range(10):
+        journal.record_added(task(i))
+        if i != 7:
+            journal.record_finished(task(i))
+    journal.compact()
+    lines = (tmp_path / "journal.jsonl").read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line)["emoticon_id"] for line in lines] == ["7"]
+    assert all(json.loads(line)["op"] == "add" for line in lines)
+
+
+def test_flush_compacts_after_threshold(tmp_path):
+    journal = journal_at(tmp_path, compact_threshold=6)
+    for i in range(3):
+        journal.record_added(task(i))
+        journal.record_finished(task(i))
+    journal.flush()
+    assert (tmp_path / "journal.jsonl").read_text(encoding="utf-8") == ""
+
+
+def test_task_added_again_after_done_is_outstanding(tmp_path):
+    journal = journal_at(tmp_path)
+    journal.record_added(task(0))
+    journal.record_finished(task(0))
+    journal.record_added(task(0))
+    assert ids(journal.compact()) == ["0"]
+
+
+def test_torn_last_line_is_ignored(tmp_path):
+    journal = journal_at(tmp_path)
+    journal.record_added(task(0))
+    journal.record_added(task(1))
+    journal.flush()
+    with open(tmp_path / "journal.jsonl", "a", encoding="utf-8") as f:
+        f.write('{"op": "done", "key": "http://exa')  # 崩溃时写了一半
+    assert ids(journal_at(tmp_path).compact()) == ["0", "1"]
+
+
+def test_instances_sharing_a_journal_keep_each_others_tasks(tmp_path):
+    first, second = journal_at(tmp_path), journal_at(tmp_path)
+    first.record_added(task(0, "a"))
+    second.record_added(task(0, "b"))
+    first.flush()
+    second.flush()
+    first.record_finished(task(0, "a"))
+    first.compact()
+    assert [entry["package_name"] for entry in second.compact()] == ["b"]
@@ -0,0 +1,79 @@
+# tests/test_fair_task_queue.py
+"""
+公平调度下载队列的测试：优先级、同一优先级内按表情包轮转、移除和关闭。
+
+运行方式（在项目根目录）:
+    python -m pytest tests
+"""
+import threading
+
+from app.download_manager import DownloadTask, FairTaskQueue
+
+
+def task(package_name: str, index: int) -> DownloadTask:
+    return DownloadTask(f"/tmp/{package_name}_{index}.png", f"http://example.invalid/{package_name}/{index}.png",
+                        str(index), package_name)
+
+
+def drain(q: FairTaskQueue) -> list:
+    order = []
+    while not q.empty():
+        _, t = q.get_nowait()
+        order.append((t.package_name, t.emoticon_id))
+        q.task_done()
+    return order
+
+
+def test_round_robin_across_packages():
+    q = FairTaskQueue()
+    for i in range(3):
+        q.put((1, task("big", i)))
+    q.put((1, task("small", 0)))
+    assert drain(q) == [("big", "0"), ("small", "0"), ("big", "1"), ("big", "2")]
+
+
+def test_package_keeps_its_turn_in_rotation():
+    """出队后仍有任务的表情包排到队尾，其他表情包按加入顺序轮到。"""
+    q = FairTaskQueue()
+    for name in ("a", "b", "c"):
+        for i in range(2):
+            q.put((1, task(name, i)))
+    assert [name for name, _ in drain(q)] == ["a", "b", "c", "a", "b", "c"]
+
+
+def test_lower_priority_value_first():
+    q = FairTaskQueue()
+    q.put((1, task("prefetch", 0)))
+    q.put((1, task("prefetch", 1)))
+    q.put((0, task("visible", 0)))
+    assert drain(q) == [("visible", "0"), ("prefetch", "0"), ("prefetch", "1")]
+
+
+def test_remove_counts_as_done():
+    q = FairTaskQueue()
+    for i in range(4):
+        q.put((1, task("a" if i % 2 else "b", i)))
+    removed = q.remove(lambda item: item[1].package_name == "a")
+    assert [t.emoticon_id for _, t in removed] == ["1", "3"]
+    assert q.qsize() == 2
+    assert drain(q) == [("b", "0"), ("b", "2")]
+    q.join()  # 被移除的任务不再计入未完成任务，join() 立即返回
+
+
+def test_close_drops_remaining_tasks():
+    q = FairTaskQueue()
+    q.put((1, task("a", 0)))
+    q.close()
+    assert q.get(timeout=1) is None  # 关闭后剩余任务不再出队
+
+
+def test_close_wakes_waiting_getters():
+    q = FairTaskQueue()
+    results = []
+    waiters = [threading.Thread(target=lambda: results.append(q.get(timeout=5))) for _ in range(3)]
+    for waiter in waiters:
+        waiter.start()
+    q.close()
+    for waiter in waiters:
+        waiter.join(5)
+    assert results == [None, None, None]
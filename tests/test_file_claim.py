@@ -0,0 +1,60 @@
+# tests/test_file_claim.py
+"""
+单文件认领（<path>.part）的测试：互斥、释放、失效认领的接管。
+
+运行方式（在项目根目录）:
+    python -m pytest tests
+"""
+import os
+
+from app.file_lock import FileClaim
+
+
+def make_stale(claim: FileClaim):
+    os.utime(claim.part_path, (0, 0))
+
+
+def test_claim_is_exclusive_until_released(tmp_path):
+    target = str(tmp_path / "a.png")
+    first, second = FileClaim(target), FileClaim(target)
+    assert first.try_acquire()
+    assert os.path.exists(first.part_path)
+    assert not second.try_acquire()
+    first.release()
+    assert not os.path.exists(first.part_path)
+    assert second.try_acquire()
+    second.release()
+
+
+def test_release_without_claim_does_nothing(tmp_path):
+    target = str(tmp_path / "a.png")
+    holder, other = FileClaim(target), FileClaim(target)
+    assert holder.try_acquire()
+    other.release()
+    assert os.path.exists(holder.part_path)
+    holder.release()
+    holder.release()  # 重复释放无影响
+
+
+def test_stale_claim_is_taken_over(tmp_path):
+    target = str(tmp_path / "a.png")
+    crashed, second = FileClaim(target, stale_after=60.0), FileClaim(target, stale_after=60.0)
+    assert crashed.try_acquire()
+    assert not second.try_acquire()
+    make_stale(crashed)
+    assert second.try_acquire()
+    second.release()
+
+
+def test_old_holder_does_not_release_new_claim(tmp_path):
+    """失效认领被接管后，原认领者的 release 不能删除新认领者的 .part（即使文件系统复用了同一个inode号）。"""
+    target = str(tmp_path / "a.png")
+    slow, second, third = FileClaim(target), FileClaim(target), FileClaim(target)
+    assert slow.try_acquire()
+    make_stale(slow)
+    assert second.try_acquire()
+    slow.release()
+    assert os.path.exists(second.part_path)
+    assert not third.try_acquire()
+    second.release()
+    assert not os.path.exists(second.part_path)
@@ -0,0 +1,41 @@
+# tests/test_search_index.py
+"""
+表情搜索索引的排序测试。
+
+运行方式（在项目根目录）:
+    python -m pytest tests
+"""
+from app.emote_records import EmotePackage
+from app.search_index import EmoticonSearchIndex
+
+
+def make_package(pkg_id: int, name: str, emote_names) -> EmotePackage:
+    package = EmotePackage(pkg_id, name, "user")
+    for i, emote_name in enumerate(emote_names):
+        package.add_emote(emote_name, f"http://example.invalid/{pkg_id}/{i}.png", pkg_id * 100 + i)
+    return package
+
+
+def test_ties_keep_load_order_after_reindex():
+    """重新索引排在前面的表情包后，同级结果仍按表情包的加载顺序排列。"""
+    index = EmoticonSearchIndex()
+    first = make_package(1, "甲", ["[狗头]", "[狗头笑]"])
+    second = make_package(2, "乙", ["[狗头哭]"])
+    index.update({1: first, 2: second})
+    assert [e.id for e in index.search("[狗头")] == [100, 101, 200]
+
+    # 第一个表情包新增了表情：它被重新索引，但加载顺序仍在第二个表情包之前
+    first = make_package(1, "甲", ["[狗头]", "[狗头笑]", "[狗头怒]"])
+    index.update({1: first, 2: second})
+    assert [e.id for e in index.search("[狗头")] == [100, 101, 102, 200]
+    assert [e.id for e in index.search("狗头")] == [100, 101, 102, 200]
+
+
+def test_package_name_matches_follow_load_order():
+    """表情包名称匹配展开的表情也按加载顺序排列。"""
+    index = EmoticonSearchIndex()
+    first = make_package(1, "小电视", ["[a]"])
+    second = make_package(2, "小电视二", ["[b]"])
+    index.update({1: first, 2: second})
+    index.update({1: make_package(1, "小电视", ["[a]", "[c]"]), 2: second})
+    assert [e.id for e in index.search("小电视")] == [100, 101, 200]
@@ -0,0 +1,62 @@
+# tests/test_send_plan.py
+"""
+发送计划（环形缓冲区游标）的测试。
+
+运行方式（在项目根目录）:
+    python -m pytest tests
+"""
+from app.emote_records import EmotePackage
+from app.send_plan import SendPlan
+
+
+def make_plan(count: int):
+    package = EmotePackage(1, "测试", "user")
+    plan = SendPlan()
+    for i in range(count):
+        plan.append(package.add_emote(f"[e{i}]", f"http://example.invalid/{i}.png", i))
+    return plan
+
+
+def test_loop_mode_wraps_cursor_around():
+    """循环模式只移动游标，发送到末尾后回到第一个表情，队列内容不变。"""
+    plan = make_plan(3)
+    sent = [plan.advance(loop=True)[:2] for _ in range(7)]
+    assert [(index, emote.id) for index, emote in sent] == [(0, 0), (1, 1), (2, 2), (0, 0), (1, 1), (2, 2), (0, 0)]
+    assert plan.cursor == 1
+    assert len(plan) == 3
+
+
+def test_normal_mode_removes_sent_emotes():
+    """普通模式移除已发送的表情，游标停在原位置。"""
+    plan = make_plan(3)
+    assert [plan.advance(loop=False)[1].id for _ in range(3)] == [0, 1, 2]
+    assert not plan
+    assert plan.cursor == 0
+
+
+def test_switching_from_loop_to_normal_mid_queue():
+    """循环到队列中间后切换为普通模式：从游标处继续发送，到末尾后回到开头。"""
+    plan = make_plan(3)
+    plan.advance(loop=True)
+    plan.advance(loop=True)
+    assert plan.cursor == 2
+    assert [plan.advance(loop=False)[1].id for _ in range(3)] == [2, 0, 1]
+    assert not plan
+
+
+def test_compiled_payloads_follow_their_emotes():
+    """预编译的载荷与表情一一对应；追加的表情在下次编译时补齐，切换房间时全部重新编译。"""
+    plan = make_plan(2)
+    built = []
+
+    def build(emote):
+        built.append(emote.id)
+        return f"{emote.id}".encode()
+
+    plan.compile(("room", "cookie"), build)
+    plan.append(plan.entries[0].package.add_emote("[e2]", "http://example.invalid/2.png", 2))
+    plan.compile(("room", "cookie"), build)
+    assert built == [0, 1, 2]
+    plan.compile(("other room", "cookie"), build)
+    assert built == [0, 1, 2, 0, 1, 2]
+    assert [plan.advance(loop=True)[2] for _ in range(4)] == [b"0", b"1", b"2", b"0"]